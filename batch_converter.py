@@ -0,0 +1,188 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""Batch converter for many MLP exports
+
+Input:  CSV files, directories containing CSV files or glob patterns.
+Output: One converted CSV file per input file or one merged CSV file.
+
+The files are spread over a pool of worker processes. A file that cannot be
+converted is reported in the summary and does not stop the other files.
+"""
+
+import argparse
+import glob
+import os
+import shutil
+import sys
+import tempfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from diagnostics import Diagnostics
+from mlp_to_portfolio_performance_converter import (
+    convert_file,
+    open_output,
+    print_message,
+    strip_compression,
+)
+
+FileResult = namedtuple(
+    "FileResult", "input_file output_file status rows warnings error"
+)
+
+
+def output_file_for(input_file):
+    """Default name of the converted file of an input file"""
+    return f"{os.path.splitext(strip_compression(input_file))[0]}_converted.csv"
+
+
+def is_export(name):
+    """Check if a file name is that of an MLP export, also a compressed one
+
+    Results of an earlier conversion are no exports.
+    """
+    name = strip_compression(name)
+    return name.lower().endswith(".csv") and not name.endswith("_converted.csv")
+
+
+def collect_input_files(patterns):
+    """Expand files, directories and glob patterns to a sorted list of files
+
+    Directories contribute the exports directly inside them (see is_export).
+    """
+    input_files = set()
+    for pattern in patterns:
+        paths = glob.glob(pattern) if glob.has_magic(pattern) else [pattern]
+        for path in paths:
+            if os.path.isdir(path):
+                input_files.update(
+                    os.path.join(path, name)
+                    for name in os.listdir(path)
+                    if is_export(name)
+                )
+            else:
+                input_files.add(path)
+    return sorted(input_files)
+
+
+def file_signature(path):
+    """Modification time and size of a file, None if it does not exist"""
+    try:
+        stat_result = os.stat(path)
+    except OSError:
+        return None
+    return stat_result.st_mtime_ns, stat_result.st_size
+
+
+def convert_one(input_file, output_file):
+    """Convert a single file and report the outcome as a FileResult
+
+    Any error is reported as a failure, so one malformed file does not stop
+    the others. The partial output of a failed conversion is removed.
+    """
+    diagnostics = Diagnostics()
+    signature = file_signature(output_file)
+    try:
+        rows = convert_file(input_file, output_file, diagnostics)
+    except Exception as error:
+        if file_signature(output_file) not in (None, signature):
+            os.remove(output_file)
+        return FileResult(input_file, output_file, "failure", 0, 0, str(error))
+    status = "warning" if diagnostics else "success"
+    return FileResult(input_file, output_file, status, rows, len(diagnostics), "")
+
+
+def merge_outputs(results, merged_output):
+    """Concatenate the converted files of successful results into one file"""
+    with open_output(merged_output) as merged:
+        header_written = False
+        for result in results:
+            if result.status == "failure":
+                continue
+            with open(result.output_file, newline="") as converted:
+                header = converted.readline()
+                if not header_written:
+                    merged.write(header)
+                    header_written = True
+                shutil.copyfileobj(converted, merged)
+
+
+def convert_files(input_files, jobs=None, merged_output=None):
+    """Convert many files in parallel
+
+    `jobs` is the number of worker processes, by default one per CPU. With
+    `merged_output` the transactions of all files are written to that file in
+    the order of `input_files`, otherwise each file gets its own output file.
+    Returns one FileResult per input file, in the order of `input_files`.
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        if merged_output:
+            output_files = [
+                os.path.join(temp_dir, f"{index}.csv")
+                for index in range(len(input_files))
+            ]
+        else:
+            output_files = [output_file_for(name) for name in input_files]
+
+        if jobs == 1 or len(input_files) <= 1:
+            results = list(map(convert_one, input_files, output_files))
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                results = list(executor.map(convert_one, input_files, output_files))
+
+        if merged_output:
+            merge_outputs(results, merged_output)
+            results = [result._replace(output_file=merged_output) for result in results]
+    return results
+
+
+def print_summary(results):
+    """Print one colored line per file and the totals"""
+    colors = {"success": 32, "warning": 33, "failure": 31}
+    for result in results:
+        if result.status == "failure":
+            details = result.error
+        else:
+            details = f"{result.rows} transactions, {result.warnings} warnings"
+        print_message(
+            f"{result.status.capitalize()}: {result.input_file} ({details})",
+            colors[result.status],
+        )
+    counts = {status: 0 for status in colors}
+    for result in results:
+        counts[result.status] += 1
+    print_message(
+        f"Info: {len(results)} files, {counts['success']} succeeded, "
+        f"{counts['warning']} with warnings, {counts['failure']} failed",
+        0,
+    )
+
+
+def main():
+    """Main function"""
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument(
+        "inputs", nargs="+", help="Input CSV files, directories or glob patterns"
+    )
+    arg_parser.add_argument(
+        "-j", "--jobs", type=int, help="Number of worker processes (default: CPUs)"
+    )
+    arg_parser.add_argument(
+        "-o", "--outfile", help="Merge all transactions into this CSV file"
+    )
+    command_args = arg_parser.parse_args()
+
+    input_files = collect_input_files(command_args.inputs)
+    if not input_files:
+        print_message("Error: No input files found", 31)
+        sys.exit(1)
+
+    results = convert_files(input_files, command_args.jobs, command_args.outfile)
+    print_summary(results)
+    if any(result.status == "failure" for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
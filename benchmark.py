@@ -0,0 +1,484 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""Benchmarks of the converter on synthetic MLP exports
+
+Generates deterministic exports with every transaction type that
+MemoProcessor.process handles, in old and new memo layouts, and measures the
+throughput and peak memory of the conversion stages.
+
+Usage: python benchmark.py [--sizes 1000 100000 1000000] [--seed 0]
+       python benchmark.py --startup [--runs 10]
+"""
+
+import argparse
+import csv
+import itertools
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+import mlp_to_portfolio_performance_converter as mppc
+from build_zipapp import build_zipapp
+from memo_processor import MemoProcessor
+
+HEADER = [
+    "Buchungstag",
+    "Valuta",
+    "Auftraggeber/Zahlungsempfänger",
+    "Verwendungszweck",
+    "Kundenreferenz",
+    "Betrag",
+    "Währung",
+]
+PREAMBLE = [
+    '"Umsatzanzeige";"MLP Financepilot Banking"',
+    '"Konto";"8507908370"',
+    '"Zeitraum";"01.01.2014 - 31.12.2024"',
+    "",
+]
+SECURITIES = [
+    ("A0M430", "LU0323578657", "FLOSSB.V.STORCH-MUL.OPP.R"),
+    ("A1J3M4", "LU0728929174", "ASSCVI-WLD   SM.COMP. AAEO"),
+    ("A0LHCM", "LU0278152516", "ACATIS F.V.M.VERMOEG.1 A"),
+    ("A12GPB", "IE00BQ3D6V05", "COMGEST GROWTH ASIA DLAC"),
+    ("A0M8HD", "DE000A0M8HD2", "FRANKF.AKTIENFO.F.STIFT.T"),
+    ("A0RPWH", "IE00B4L5Y983", "ISHSIII-CORE MSCI WLD DLA"),
+]
+
+# Memo templates per transaction type: sign of the amount and the memo. The
+# placeholders are filled in by generate_transactions.
+TEMPLATES = {
+    "deposit": (
+        1,
+        "LASTSCHRIFTEINR.                   SPARPLAN {ref}       " "EREF: SPARSP {ref}",
+    ),
+    "tax_refund": (1, "GUTSCHRIFT:\nSTEUERAUSGLEICH\nKAP.STEUER {tax} EURO"),
+    "advance_lump_sum": (
+        -1,
+        "VORABPAUSCHALEINVESTMENTFONDSWKN   {wkn} / {isin}{name}        "
+        "DEPOTNR.:         8507908370MENGE {pieces}KAPST        {tax}SOLZ 0,"
+        "11KIST                  0,16ABRECHN.NR. {ref}",
+    ),
+    "sell": (
+        1,
+        "WERTPAPIERABRECHNUNG VERKAUF WKN   {wkn} / {isin} {name} "
+        "DEPOTNR.: 8507908370 HANDELSTAG {day}              MENGE {pieces} "
+        "KURS {price}                      AUFTRAGSNR. {ref}",
+    ),
+    "sell_old": (
+        1,
+        "\nDEPOT    8505581964 \nWERTPAPIERABRECHNUNG \nDEPOT-NR       8505581964 "
+        "\n{name} \nWKN {wkn} / {isin} \nHANDELSTAG       {day}\n"
+        "MENGE                {pieces}\nKURS            {price}\n"
+        "ZAST/KAPST            {tax} \nSOLZ            0,01 \n"
+        "AUFTR.-NR.  {ref}\n",
+    ),
+    "buy": (
+        -1,
+        "\nEFFEKTEN\nWERTPAPIERABRECHNUNG\nKAUF\nWKN {wkn} / {isin}\n{name}\n"
+        "DEPOTNR.:      8505581964\nHANDELSTAG {day}\nMENGE              {pieces}\n"
+        "KURS       {price}\nAUFTRAGSNR.      {ref}\n",
+    ),
+    "buy_old": (
+        -1,
+        "DEPOT    8505581964                WERTPAPIERABRECHNUNG               "
+        "DEPOT-NR       8505581964          {name}          WKN {wkn} / {isin}"
+        "          HANDELSTAG       {day}        MENGE                {pieces}"
+        "        KURS            {price}        AUFTR.-NR.  {ref}",
+    ),
+    "dividend": (
+        1,
+        "WP- ERTRÄGNISGUTSCHRIFT             INVESTMENTFONDS WKN {wkn} /       "
+        "{isin}                       {name}          DEPOTNR.: 8507908370 "
+        "MENGE         {pieces} KAPST {tax} SOLZ 0,35 ABRECHN.NR. {ref}",
+    ),
+    "dividend_old": (
+        1,
+        "DEPOT     8505581964               WP-ERTRÄGNISGUTSCHRIFT             "
+        "DEPOT-NR       8505581964          {name}          WKN {wkn} / {isin}"
+        "          ABRECHNUNGSTAG   {day}        MENGE                {pieces}"
+        "        AUFTR.-NR.  {ref}",
+    ),
+    "depot_fee": (
+        -1,
+        "0008 DEPOTENTGELT {ref} Q1/2021 DEPOT 8507908370 UST-ID            "
+        "DE143449956 NETTO 12,24EUR 19%     UST. 2,33EUR",
+    ),
+    "collection": (-1, "EINZUGSERMAECHTIGUNG {ref} VERSICHERUNG"),
+    "credit": (
+        1,
+        "\nGUTSCHRIFT\n0060 ERSTATTUNG VERTRIEBSFO\nLGEPROVISION/BESTANDSPROVIS\n"
+        "ION {ref} Q1/2024 DEPOT\n8507908370 EREF: VFP 2024 Q\nUARTAL I\n",
+    ),
+    "tax_charge": (
+        -1,
+        "Steuerbelastung Kap.Steuer         Rückzahlung Bestandsprovisionen",
+    ),
+    "church_tax": (-1, "KIRCHENSTEUER {day}"),
+    "soli_tax": (-1, "SOLIDARITAETSZUSCHLAG {day}"),
+    "capital_gain_tax": (-1, "KAPITALERTRAGSTEUER {day}"),
+    "transfer": (-1, "UEBERWEISUNG                       MIETE {ref}"),
+}
+
+# Default share of each transaction type, roughly that of a savings plan
+# account: mostly deposits and buys, a few dividends, fees and taxes
+DEFAULT_MIX = {
+    "deposit": 30,
+    "tax_refund": 2,
+    "advance_lump_sum": 3,
+    "sell": 4,
+    "sell_old": 1,
+    "buy": 30,
+    "buy_old": 5,
+    "dividend": 8,
+    "dividend_old": 2,
+    "depot_fee": 4,
+    "collection": 2,
+    "credit": 3,
+    "tax_charge": 1,
+    "church_tax": 1,
+    "soli_tax": 1,
+    "capital_gain_tax": 1,
+    "transfer": 2,
+}
+
+BENCHMARKS = [
+    "search_header",
+    "convert_to_german_number",
+    "convert_amounts",
+    "MemoProcessor.process",
+    "process_transactions",
+]
+
+# Number of distinct generated items the micro benchmarks cycle through
+POOL_SIZE = 10000
+# Number of processes the startup benchmark starts per command
+STARTUP_RUNS = 10
+# Number of transactions of the export the startup benchmark converts
+STARTUP_ROWS = 10
+# Modules that importing the converter must not load, as only some conversions
+# need them
+DEFERRED_MODULES = (
+    "argparse",
+    "concurrent.futures",
+    "conversion_stats",
+    "diagnostics",
+    "hashlib",
+    "heapq",
+    "json",
+    "mmap",
+    "numpy",
+    "tempfile",
+    "transaction_index",
+)
+# Directory of the converter modules
+CONVERTER_DIR = os.path.dirname(os.path.abspath(mppc.__file__))
+
+
+def generate_transactions(rows, seed=0, mix=None):
+    """Generate rows of a synthetic MLP export, newest first
+
+    Yields dicts keyed by HEADER. `mix` maps transaction types of TEMPLATES to
+    their relative frequency. The same seed always gives the same rows.
+    """
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    types = list(mix)
+    weights = [mix[name] for name in types]
+    day = date(2024, 12, 31)
+    for _ in range(rows):
+        if rng.random() < 0.3:
+            day -= timedelta(days=1)
+        sign, template = TEMPLATES[rng.choices(types, weights)[0]]
+        wkn, isin, name = rng.choice(SECURITIES)
+        day_str = day.strftime("%d.%m.%Y")
+        memo = template.format(
+            wkn=wkn,
+            isin=isin,
+            name=name,
+            day=day_str,
+            ref=rng.randrange(10**9, 10**10),
+            pieces=f"{rng.uniform(0.1, 100):.4f}".replace(".", ","),
+            price=f"{rng.uniform(10, 500):.8f}".replace(".", ","),
+            tax=f"{rng.uniform(0.01, 50):.2f}".replace(".", ","),
+        )
+        yield {
+            "Buchungstag": day_str,
+            "Valuta": day_str,
+            "Auftraggeber/Zahlungsempfänger": "MLP Banking AG",
+            "Verwendungszweck": memo,
+            "Kundenreferenz": "",
+            "Betrag": f"{sign * rng.uniform(1, 5000):,.2f}",
+            "Währung": "EUR",
+        }
+
+
+def generate_export(rows, seed=0, mix=None):
+    """Generate the lines of a synthetic MLP export
+
+    The export has a preamble before the header and saldo lines around the
+    transactions, like the real ones.
+    """
+    for line in PREAMBLE:
+        yield line + "\r\n"
+    lines = _CsvLines()
+    writer = csv.DictWriter(lines, HEADER, delimiter=";", quoting=csv.QUOTE_ALL)
+    writer.writeheader()
+    saldo = dict.fromkeys(HEADER, "")
+    writer.writerow(dict(saldo, Kundenreferenz="Endsaldo", Betrag="12,345.67"))
+    yield from lines.flush()
+    for row in generate_transactions(rows, seed, mix):
+        writer.writerow(row)
+        yield from lines.flush()
+    writer.writerow(dict(saldo, Kundenreferenz="Anfangssaldo", Betrag="0.00"))
+    yield from lines.flush()
+
+
+class _CsvLines:
+    """File-like sink that hands the lines written by a csv.writer back"""
+
+    def __init__(self):
+        self.lines = []
+
+    def write(self, text):
+        self.lines.append(text)
+
+    def flush(self):
+        lines, self.lines = self.lines, []
+        return lines
+
+
+def write_export(path, rows, seed=0, mix=None):
+    """Write a synthetic MLP export to a file"""
+    with open(path, "w", newline="", encoding=mppc.INPUT_ENCODING) as file:
+        file.writelines(generate_export(rows, seed, mix))
+
+
+def measure(function, *args):
+    """Run a function twice: once for the time, once for the peak memory
+
+    Returns the wall time in seconds and the peak of traced memory in bytes.
+    """
+    start = time.perf_counter()
+    function(*args)
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    try:
+        function(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return seconds, peak
+
+
+def bench_search_header(size, seed, export_file):
+    head = list(itertools.islice(generate_export(0, seed), len(PREAMBLE) + 1))
+
+    def run():
+        for _ in range(size):
+            mppc.search_header(iter(head))
+
+    return measure(run)
+
+
+def bench_convert_to_german_number(size, seed, export_file):
+    pool = [row["Betrag"] for row in generate_transactions(min(size, POOL_SIZE), seed)]
+
+    def run():
+        for number in itertools.islice(itertools.cycle(pool), size):
+            mppc.convert_to_german_number(number)
+
+    return measure(run)
+
+
+def bench_convert_amounts(size, seed, export_file):
+    pool = [row["Betrag"] for row in generate_transactions(min(size, POOL_SIZE), seed)]
+
+    def run():
+        numbers = itertools.islice(itertools.cycle(pool), size)
+        while True:
+            chunk = list(itertools.islice(numbers, mppc.CHUNK_SIZE))
+            if not chunk:
+                break
+            mppc.convert_amounts(chunk)
+
+    return measure(run)
+
+
+def bench_memo_processor(size, seed, export_file):
+    pool = [
+        (row["Verwendungszweck"], not row["Betrag"].startswith("-"))
+        for row in generate_transactions(min(size, POOL_SIZE), seed)
+    ]
+
+    def run():
+        for line_no, (memo, is_credit) in enumerate(
+            itertools.islice(itertools.cycle(pool), size)
+        ):
+            MemoProcessor(memo, line_no, is_credit).process()
+
+    return measure(run)
+
+
+def bench_process_transactions(size, seed, export_file):
+    def run():
+        with mppc.opening_hook_csv(export_file, "r") as csv_input, open(
+            os.devnull, "w", newline=""
+        ) as csv_output:
+            transaction_reader, header_offset = mppc.read_transactions(csv_input)
+            transaction_writer = csv.writer(csv_output, delimiter=";")
+            transaction_writer.writerow(mppc.FIELD_NAMES)
+            mppc.process_transactions(
+                transaction_reader, transaction_writer, header_offset
+            )
+
+    return measure(run)
+
+
+BENCHMARK_FUNCTIONS = {
+    "search_header": bench_search_header,
+    "convert_to_german_number": bench_convert_to_german_number,
+    "convert_amounts": bench_convert_amounts,
+    "MemoProcessor.process": bench_memo_processor,
+    "process_transactions": bench_process_transactions,
+}
+
+
+def run_benchmarks(sizes, seed=0, benchmarks=BENCHMARKS):
+    """Run the benchmarks for every size
+
+    Yields one (benchmark, size, seconds, items per second, peak bytes) tuple
+    per benchmark and size.
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for size in sizes:
+            export_file = os.path.join(temp_dir, f"export_{size}.csv")
+            write_export(export_file, size, seed)
+            for name in benchmarks:
+                seconds, peak = BENCHMARK_FUNCTIONS[name](size, seed, export_file)
+                yield name, size, seconds, size / seconds, peak
+
+
+def startup_commands(export_file, output_file, zipapp_file):
+    """Return the commands of the startup benchmark by name
+
+    The bare interpreter is the lower bound of the converter commands. The
+    commands run in CONVERTER_DIR.
+    """
+    convert_args = [export_file, "-o", output_file]
+    return {
+        "python": [sys.executable, "-c", "pass"],
+        "import": [sys.executable, "-c", f"import {mppc.__name__}"],
+        "script": [sys.executable, os.path.abspath(mppc.__file__)] + convert_args,
+        "zipapp": [sys.executable, zipapp_file] + convert_args,
+    }
+
+
+def eager_imports():
+    """Return the DEFERRED_MODULES that importing the converter loads
+
+    The converter is imported in a fresh process.
+    """
+    code = f"import sys, {mppc.__name__}; print(*sys.modules)"
+    loaded = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=CONVERTER_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.split()
+    return [module for module in DEFERRED_MODULES if module in loaded]
+
+
+def run_startup_benchmark(runs=STARTUP_RUNS, seed=0):
+    """Time fresh processes converting a tiny export
+
+    Yields one (command, median seconds, fastest seconds) tuple per command of
+    startup_commands. Raises RuntimeError if importing the converter loads any
+    of DEFERRED_MODULES, which would slow down every conversion.
+    """
+    eager = eager_imports()
+    if eager:
+        raise RuntimeError(
+            f"Importing the converter loads {', '.join(eager)}, which only some "
+            f"conversions need"
+        )
+    with tempfile.TemporaryDirectory() as temp_dir:
+        export_file = os.path.join(temp_dir, "export.csv")
+        write_export(export_file, STARTUP_ROWS, seed)
+        zipapp_file = build_zipapp(os.path.join(temp_dir, "converter.pyz"))
+        output_file = os.path.join(temp_dir, "export_converted.csv")
+        commands = startup_commands(export_file, output_file, zipapp_file)
+        for name, command in commands.items():
+            times = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                subprocess.run(
+                    command, cwd=CONVERTER_DIR, stdout=subprocess.DEVNULL, check=True
+                )
+                times.append(time.perf_counter() - start)
+            yield name, statistics.median(times), min(times)
+
+
+def main():
+    """Main function"""
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[1000, 100000, 1000000],
+        help="Numbers of rows to benchmark",
+    )
+    arg_parser.add_argument(
+        "--seed", type=int, default=0, help="Seed of the export generator"
+    )
+    arg_parser.add_argument(
+        "--only", choices=BENCHMARKS, nargs="+", help="Benchmarks to run"
+    )
+    arg_parser.add_argument(
+        "--startup",
+        action="store_true",
+        help="Time the startup of converter processes on a tiny export instead",
+    )
+    arg_parser.add_argument(
+        "--runs",
+        type=int,
+        default=STARTUP_RUNS,
+        help="Number of processes per command of the startup benchmark",
+    )
+    command_args = arg_parser.parse_args()
+
+    if command_args.startup:
+        mppc.print_message(f"{'Command':<26}{'Median ms':>10}{'Min ms':>10}", 1)
+        results = run_startup_benchmark(command_args.runs, command_args.seed)
+        try:
+            for name, median, fastest in results:
+                print(f"{name:<26}{median * 1000:>10.1f}{fastest * 1000:>10.1f}")
+        except RuntimeError as error:
+            mppc.print_message(f"Error: {error}", 31)
+            sys.exit(1)
+        return
+
+    mppc.print_message(
+        f"{'Benchmark':<26}{'Rows':>9}{'Seconds':>10}{'Rows/s':>12}{'Peak MiB':>10}",
+        1,
+    )
+    results = run_benchmarks(
+        command_args.sizes, command_args.seed, command_args.only or BENCHMARKS
+    )
+    for name, size, seconds, rate, peak in results:
+        print(
+            f"{name:<26}{size:>9}{seconds:>10.3f}{rate:>12.0f}" f"{peak / 2**20:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
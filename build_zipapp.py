@@ -0,0 +1,83 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""Build the converter as a single-file zipapp
+
+Input:  The modules of the converter.
+Output: An executable zip archive, run with `python mlp_converter.pyz Umsaetze.csv`.
+
+A script run directly is compiled from source on every start. The archive holds
+the modules precompiled next to their sources, so the converter starts from
+bytecode. The patterns of its regexes are still compiled by re at import. An
+interpreter of another Python version falls back to the sources.
+
+Usage: python build_zipapp.py [-o mlp_converter.pyz]
+"""
+
+import argparse
+import os
+import py_compile
+import shutil
+import tempfile
+import zipapp
+
+from mlp_to_portfolio_performance_converter import print_message
+
+# Modules the converter needs at runtime
+MODULES = [
+    "mlp_to_portfolio_performance_converter",
+    "memo_processor",
+    "diagnostics",
+    "conversion_stats",
+    "transaction_index",
+    "records",
+    "money",
+    "pipeline",
+    "securities",
+    "ledger",
+]
+MAIN = "mlp_to_portfolio_performance_converter:main"
+DEFAULT_TARGET = "mlp_converter.pyz"
+
+
+def build_zipapp(target=DEFAULT_TARGET, source_dir=None):
+    """Build the zipapp of the converter and return its path"""
+    source_dir = source_dir or os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as staging_dir:
+        for module in MODULES:
+            source = os.path.join(staging_dir, module + ".py")
+            shutil.copyfile(os.path.join(source_dir, module + ".py"), source)
+            # zipimport loads a module.pyc next to module.py. Unchecked hash
+            # based bytecode stays valid whatever time stamps the archive has.
+            py_compile.compile(
+                source,
+                cfile=os.path.join(staging_dir, module + ".pyc"),
+                doraise=True,
+                invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH,
+            )
+        zipapp.create_archive(
+            staging_dir,
+            target,
+            interpreter="/usr/bin/env python3",
+            main=MAIN,
+            compressed=True,
+        )
+    return target
+
+
+def main():
+    """Main function"""
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument(
+        "-o",
+        "--outfile",
+        default=DEFAULT_TARGET,
+        help="Name of the zipapp (default: %(default)s)",
+    )
+    command_args = arg_parser.parse_args()
+    target = build_zipapp(command_args.outfile)
+    print_message(f"Info: Zipapp written to {target}", 0)
+
+
+if __name__ == "__main__":
+    main()
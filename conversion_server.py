@@ -0,0 +1,351 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""Conversion server for MLP exports
+
+Input:  HTTP POST requests to /convert with an MLP export as body.
+Output: The Portfolio Performance CSV file as response body.
+
+The server keeps the converter loaded in a pool of worker processes, so a
+conversion does not pay for starting Python. At most `jobs` conversions run at
+once and at most `max_queue` requests wait for a worker, counting those whose
+body is still being received; further requests are rejected with 503 before
+their body is read until the queue drains. GET /stats reports the request
+latencies and the queue depth.
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import multiprocessing
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+from http import HTTPStatus
+
+from diagnostics import Diagnostics
+from memo_processor import MemoCache
+from mlp_to_portfolio_performance_converter import (
+    convert_stream,
+    print_message,
+    write_records,
+)
+
+DEFAULT_PORT = 8765
+# Number of requests that may wait for a worker
+MAX_QUEUE = 16
+# Largest accepted export in bytes
+MAX_BODY = 64 * 1024 * 1024
+# Number of latest requests the latency percentiles are computed from
+LATENCY_WINDOW = 1000
+
+# Memo cache of a worker process, kept warm across its conversions
+_memo_cache = None
+
+
+def convert_upload(data, columnar=False):
+    """Convert an export to the bytes of a Portfolio Performance CSV file
+
+    Returns the CSV file, the number of transactions and the number of
+    warnings. Raises ConversionError if the export cannot be converted.
+    """
+    global _memo_cache
+    if _memo_cache is None:
+        _memo_cache = MemoCache()
+    diagnostics = Diagnostics()
+    csv_output = io.StringIO(newline="")
+    records = convert_stream(
+        [data], diagnostics=diagnostics, memo_cache=_memo_cache, columnar=columnar
+    )
+    row_cnt = write_records(records, csv_output)
+    return csv_output.getvalue().encode("utf-8"), row_cnt, len(diagnostics)
+
+
+def warm_up():
+    """Load the converter in a worker process"""
+    return os.getpid()
+
+
+def percentile(sorted_values, fraction):
+    """Return the value below which a fraction of sorted values lie"""
+    if not sorted_values:
+        return None
+    index = min(int(fraction * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+class ConversionServer:
+    """HTTP server converting exports in a pool of worker processes
+
+    Create it within a running event loop.
+    """
+
+    def __init__(
+        self,
+        jobs=None,
+        max_queue=MAX_QUEUE,
+        max_body=MAX_BODY,
+        columnar=False,
+        log_requests=False,
+    ):
+        self.jobs = jobs or os.cpu_count() or 1
+        self.executor = self.start_workers()
+        self.slots = asyncio.Semaphore(self.jobs)
+        self.max_queue = max_queue
+        self.max_body = max_body
+        self.columnar = columnar
+        self.log_requests = log_requests
+        self.waiting = 0
+        self.max_waiting = 0
+        self.running = 0
+        self.statuses = Counter()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def start_workers(self):
+        """Start a pool of worker processes"""
+        # Forked workers would inherit the sockets of open connections, which
+        # then stay open until the worker exits
+        start_method = (
+            "forkserver"
+            if "forkserver" in multiprocessing.get_all_start_methods()
+            else "spawn"
+        )
+        return ProcessPoolExecutor(
+            max_workers=self.jobs, mp_context=multiprocessing.get_context(start_method)
+        )
+
+    async def handle(self, reader, writer):
+        """Answer one HTTP request of a connection
+
+        Every request gets an answer and its connection is closed, whatever
+        goes wrong.
+        """
+        start = time.perf_counter()
+        request = ""
+        try:
+            try:
+                request = (await reader.readline()).decode("latin-1").strip()
+                method, target, _ = request.split(" ", 2)
+                status, headers, body = await self.respond(method, target, reader)
+            except (ValueError, asyncio.IncompleteReadError):
+                status, headers, body = HTTPStatus.BAD_REQUEST, {}, b""
+            except ConnectionError:
+                return
+            except Exception:
+                status, headers, body = HTTPStatus.INTERNAL_SERVER_ERROR, {}, b""
+            latency = time.perf_counter() - start
+            self.statuses[status] += 1
+            self.latencies.append(latency)
+            headers["X-Latency-Seconds"] = f"{latency:.6f}"
+            headers["X-Queue-Depth"] = str(self.waiting)
+            await self.send(writer, status, headers, body)
+        finally:
+            writer.close()
+        if self.log_requests:
+            print_message(
+                f"Info: {request} {status.value} in {latency * 1000:.1f} ms, "
+                f"queue depth {self.waiting}",
+                0,
+            )
+
+    async def respond(self, method, target, reader):
+        """Read the headers and body of a request and answer it
+
+        Returns the status, headers and body of the answer.
+        """
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if target == "/stats" and method == "GET":
+            return HTTPStatus.OK, {"Content-Type": "application/json"}, self.to_json()
+        if target != "/convert":
+            return HTTPStatus.NOT_FOUND, {}, b""
+        if method != "POST":
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"Allow": "POST"}, b""
+        length = int(headers.get("content-length", 0))
+        if length > self.max_body:
+            await self.discard(reader, length)
+            return HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {}, b""
+        # The place in the queue is taken before the body is read, so at most
+        # jobs + max_queue bodies are held at once
+        if self.waiting + self.running >= self.jobs + self.max_queue:
+            return HTTPStatus.SERVICE_UNAVAILABLE, {"Retry-After": "1"}, b""
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            data = await reader.readexactly(length)
+        except BaseException:
+            self.waiting -= 1
+            raise
+        return await self.convert(data)
+
+    async def convert(self, data):
+        """Convert an export in a worker process once one is free
+
+        The request has to hold a place in the queue, which is given up once
+        the conversion starts. An export the converter fails on is answered with
+        422 and the error. If a worker process died, the answer is 500 and the
+        pool is restarted.
+        """
+        try:
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        loop = asyncio.get_running_loop()
+        executor = self.executor
+        try:
+            csv_data, row_cnt, warning_cnt = await loop.run_in_executor(
+                executor, convert_upload, data, self.columnar
+            )
+        except BrokenExecutor as error:
+            if self.executor is executor:
+                self.executor = self.start_workers()
+                executor.shutdown(wait=False)
+            return self.error_response(HTTPStatus.INTERNAL_SERVER_ERROR, error)
+        except Exception as error:
+            return self.error_response(HTTPStatus.UNPROCESSABLE_ENTITY, error)
+        finally:
+            self.running -= 1
+            self.slots.release()
+        headers = {
+            "Content-Type": "text/csv; charset=utf-8",
+            "X-Transactions": str(row_cnt),
+            "X-Warnings": str(warning_cnt),
+        }
+        return HTTPStatus.OK, headers, csv_data
+
+    @staticmethod
+    def error_response(status, error):
+        """Return an answer with the error message as JSON"""
+        body = json.dumps({"error": str(error) or type(error).__name__})
+        return status, {"Content-Type": "application/json"}, body.encode("utf-8")
+
+    @staticmethod
+    async def discard(reader, length):
+        """Skip the body of a rejected request without keeping it"""
+        while length > 0:
+            chunk = await reader.read(min(length, 65536))
+            if not chunk:
+                break
+            length -= len(chunk)
+
+    @staticmethod
+    async def send(writer, status, headers, body):
+        head = [f"HTTP/1.1 {status.value} {status.phrase}"]
+        head += [f"{name}: {value}" for name, value in headers.items()]
+        head += [f"Content-Length: {len(body)}", "Connection: close", "", ""]
+        writer.write("\r\n".join(head).encode("latin-1") + body)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+    def stats(self):
+        """Return the request counts, latencies and queue depth as a dict"""
+        latencies = sorted(self.latencies)
+        return {
+            "requests": sum(self.statuses.values()),
+            "statuses": {
+                str(status.value): count for status, count in self.statuses.items()
+            },
+            "running": self.running,
+            "queue_depth": self.waiting,
+            "max_queue_depth": self.max_waiting,
+            "latency_seconds": {
+                "p50": percentile(latencies, 0.5),
+                "p95": percentile(latencies, 0.95),
+                "p99": percentile(latencies, 0.99),
+                "max": latencies[-1] if latencies else None,
+            },
+        }
+
+    def to_json(self):
+        return json.dumps(self.stats(), indent=2).encode("utf-8")
+
+    async def serve(self, host="127.0.0.1", port=DEFAULT_PORT, unix_socket=None):
+        """Start the server on a TCP port or a Unix socket
+
+        The worker processes are started first. Returns the asyncio server.
+        """
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(
+            *(loop.run_in_executor(self.executor, warm_up) for _ in range(self.jobs))
+        )
+        if unix_socket:
+            return await asyncio.start_unix_server(self.handle, unix_socket)
+        return await asyncio.start_server(self.handle, host, port)
+
+    def close(self):
+        self.executor.shutdown()
+
+
+async def run_server(command_args):
+    server = ConversionServer(
+        command_args.jobs or None,
+        command_args.max_queue,
+        columnar=command_args.columnar,
+        log_requests=True,
+    )
+    listener = await server.serve(
+        command_args.host, command_args.port, command_args.unix_socket
+    )
+    address = command_args.unix_socket or f"{command_args.host}:{command_args.port}"
+    print_message(f"Info: Listening on {address}", 0)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+def main():
+    """Main function"""
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="Address to listen on (default: %(default)s)",
+    )
+    arg_parser.add_argument(
+        "--port", type=int, default=DEFAULT_PORT, help="Port to listen on"
+    )
+    arg_parser.add_argument(
+        "--unix-socket", help="Listen on this Unix socket instead of a TCP port"
+    )
+    arg_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=0,
+        help="Number of conversions that run at once (0: one per CPU)",
+    )
+    arg_parser.add_argument(
+        "--max-queue",
+        type=int,
+        default=MAX_QUEUE,
+        help="Number of requests that may wait for a conversion before new ones "
+        "are rejected",
+    )
+    arg_parser.add_argument(
+        "--columnar",
+        action="store_true",
+        help="Convert the amounts a chunk at a time, with NumPy if it is installed",
+    )
+    command_args = arg_parser.parse_args()
+    try:
+        asyncio.run(run_server(command_args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Stage timing and statistics of a conversion
+
+A ConversionStats object is handed to the converter functions, which then time
+their stages and count the results. Without one the converter runs
+uninstrumented.
+"""
+
+import heapq
+import json
+import time
+from collections import Counter
+
+# Stages of a conversion in pipeline order
+STAGES = ("header", "read", "format", "classify", "write")
+# Number of slowest memos to report
+SLOWEST_MEMOS = 5
+# Number of characters of a memo to show in reports
+MEMO_EXCERPT = 60
+
+
+class ConversionStats:
+    def __init__(self, slowest_memos=SLOWEST_MEMOS):
+        self.stage_seconds = dict.fromkeys(STAGES, 0.0)
+        self.rows = 0
+        self.types = Counter()
+        self.rules = Counter()
+        self.slowest_memos = slowest_memos
+        # Min-heap of (seconds, line number, memo excerpt)
+        self.slowest = []
+        self.started = time.perf_counter()
+        self.wall_seconds = 0.0
+
+    def time_iter(self, stage, iterable):
+        """Yield the items of an iterable, adding the time to get them to a stage"""
+        iterator = iter(iterable)
+        clock = time.perf_counter
+        stage_seconds = self.stage_seconds
+        while True:
+            start = clock()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                stage_seconds[stage] += clock() - start
+                return
+            stage_seconds[stage] += clock() - start
+            yield item
+
+    def time_call(self, stage, function):
+        """Wrap a function so that the time spent in it is added to a stage"""
+        clock = time.perf_counter
+        stage_seconds = self.stage_seconds
+
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                stage_seconds[stage] += clock() - start
+
+        return timed
+
+    def time_process(self, process):
+        """Wrap a memo processing function like process_memo
+
+        Besides the time of the classify stage, the rule hits and the slowest
+        memos are recorded. A securities master has to be bound to `process`
+        beforehand.
+        """
+        clock = time.perf_counter
+
+        def timed(memo, line_no="0", is_credit=False):
+            start = clock()
+            result = process(memo, line_no, is_credit)
+            seconds = clock() - start
+            self.stage_seconds["classify"] += seconds
+            self.rules[result.rule or "unknown"] += 1
+            self._add_slow_memo(seconds, int(line_no), result.note[:MEMO_EXCERPT])
+            return result
+
+        return timed
+
+    def _add_slow_memo(self, seconds, line_no, excerpt):
+        entry = (seconds, line_no, excerpt)
+        if len(self.slowest) < self.slowest_memos:
+            heapq.heappush(self.slowest, entry)
+        elif entry > self.slowest[0]:
+            heapq.heapreplace(self.slowest, entry)
+
+    def count(self, record):
+        """Count a converted record"""
+        self.rows += 1
+        self.types[record["Typ"]] += 1
+
+    def finish(self):
+        """Stop the wall clock of the conversion"""
+        self.wall_seconds = time.perf_counter() - self.started
+
+    def merge(self, other):
+        """Add the stage times and counts of another ConversionStats"""
+        for stage, seconds in other.stage_seconds.items():
+            self.stage_seconds[stage] += seconds
+        self.rows += other.rows
+        self.types.update(other.types)
+        self.rules.update(other.rules)
+        for entry in other.slowest:
+            self._add_slow_memo(*entry)
+
+    def as_dict(self):
+        """Return the statistics as a JSON serializable dict"""
+        return {
+            "wall_seconds": self.wall_seconds,
+            "rows": self.rows,
+            "rows_per_second": (
+                self.rows / self.wall_seconds if self.wall_seconds else None
+            ),
+            "stage_seconds": self.stage_seconds,
+            "types": dict(self.types.most_common()),
+            "rules": dict(self.rules.most_common()),
+            "slowest_memos": [
+                {"seconds": seconds, "line": line_no, "memo": excerpt}
+                for seconds, line_no, excerpt in sorted(self.slowest, reverse=True)
+            ],
+        }
+
+    def to_json(self):
+        """Return the statistics as JSON text"""
+        return json.dumps(self.as_dict(), ensure_ascii=False, indent=2)
+
+    def to_text(self):
+        """Return the statistics as human-readable text"""
+        stats = self.as_dict()
+        rate = stats["rows_per_second"]
+        lines = [
+            f"Rows: {self.rows} in {self.wall_seconds:.3f} s"
+            + (f" ({rate:.0f} rows/s)" if rate else ""),
+            "Stages:",
+        ]
+        lines += [
+            f"  {stage:<10}{seconds:>10.3f} s"
+            for stage, seconds in self.stage_seconds.items()
+        ]
+        lines.append("Types:")
+        lines += [f"  {name:<22}{count:>8}" for name, count in stats["types"].items()]
+        lines.append("Rules:")
+        lines += [f"  {name:<22}{count:>8}" for name, count in stats["rules"].items()]
+        lines.append("Slowest memos:")
+        lines += [
+            f"  {memo['seconds'] * 1000:>8.3f} ms  line {memo['line']}: {memo['memo']}"
+            for memo in stats["slowest_memos"]
+        ]
+        return "\n".join(lines)
@@ -0,0 +1,106 @@
+"""Structured warnings about the transactions of a conversion
+
+A Diagnostics collector gathers the warnings of a conversion instead of
+printing them one by one. Warnings of the same kind about the same memo are
+merged into one record that lists all lines they occurred in. The records are
+emitted in bulk as text or JSON when the conversion is done.
+"""
+
+from collections import Counter, namedtuple
+
+# Messages of the kinds of diagnostics
+MESSAGES = {
+    "unknown_type": "Unknown transaction type",
+    "missing_field": "Could not find {field}",
+}
+# Names of the security fields in messages
+FIELD_LABELS = {
+    "pieces": "number of pieces",
+    "wkn": "WKN",
+    "isin": "ISIN",
+    "name": "the stock name",
+}
+# Number of characters of a memo to keep in a diagnostic
+MEMO_EXCERPT = 60
+# Number of line numbers to show per diagnostic in text reports
+TEXT_LINES = 10
+
+Diagnostic = namedtuple(
+    "Diagnostic", "kind rule field memo lines file", defaults=[None]
+)
+
+
+def message(kind, field=None):
+    """Return the message of a kind of diagnostic about a field"""
+    return MESSAGES[kind].format(field=FIELD_LABELS.get(field, field))
+
+
+class Diagnostics:
+    def __init__(self):
+        self.counts = Counter()
+        # Line numbers by (kind, rule, field, memo excerpt, input file), in order
+        # of the first occurrence
+        self._lines = {}
+
+    def add(self, kind, line_no, rule=None, field=None, memo=""):
+        """Record a diagnostic of a kind about a line"""
+        self.counts[kind] += 1
+        key = (kind, rule, field, memo[:MEMO_EXCERPT], None)
+        lines = self._lines.get(key)
+        if lines is None:
+            lines = self._lines[key] = []
+        lines.append(int(line_no))
+
+    def merge(self, other, file=None):
+        """Add the diagnostics of another Diagnostics collector
+
+        With `file` the added diagnostics are about that input file.
+        """
+        self.counts.update(other.counts)
+        for key, lines in other._lines.items():
+            if file is not None:
+                key = key[:-1] + (file,)
+            self._lines.setdefault(key, []).extend(lines)
+
+    def __len__(self):
+        return sum(self.counts.values())
+
+    def records(self):
+        """Return the deduplicated diagnostics as Diagnostic records"""
+        return [
+            Diagnostic(kind, rule, field, memo, lines, file)
+            for (kind, rule, field, memo, file), lines in self._lines.items()
+        ]
+
+    def as_dict(self):
+        """Return the diagnostics as a JSON serializable dict"""
+        return {
+            "total": len(self),
+            "counts": dict(self.counts.most_common()),
+            "diagnostics": [
+                dict(record._asdict(), message=message(record.kind, record.field))
+                for record in self.records()
+            ],
+        }
+
+    def to_json(self):
+        """Return the diagnostics as JSON text"""
+        import json
+
+        return json.dumps(self.as_dict(), ensure_ascii=False, indent=2)
+
+    def to_text(self):
+        """Return the diagnostics as one warning line per record"""
+        lines = []
+        for record in self.records():
+            line_list = ", ".join(str(line_no) for line_no in record.lines[:TEXT_LINES])
+            if len(record.lines) > TEXT_LINES:
+                line_list += f" and {len(record.lines) - TEXT_LINES} more"
+            text = f"Warning: {message(record.kind, record.field)} in line"
+            text += f"s {line_list}" if len(record.lines) > 1 else f" {line_list}"
+            if record.file:
+                text += f" of {record.file}"
+            if record.memo:
+                text += f": {record.memo}"
+            lines.append(text)
+        return "\n".join(lines)
@@ -0,0 +1,189 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""SQLite ledger of converted transactions
+
+Input:  A ledger filled by the converter with --ledger.
+Output: A Portfolio Performance CSV file of a date range or account of the
+        ledger.
+
+The ledger keeps the converted transactions, so Portfolio Performance files for
+other date windows are exported from it without converting the MLP exports
+again. Transactions of overlapping exports are stored only once.
+
+Usage: python ledger.py ledger.db export.csv [--from 01.01.2024] [--to 31.12.2024]
+"""
+
+import argparse
+import csv
+import hashlib
+import os
+import sqlite3
+import sys
+from collections import Counter
+from datetime import datetime
+
+from mlp_to_portfolio_performance_converter import print_message
+from records import FIELD_NAMES, Transaction
+
+# Number of transactions inserted in one database transaction
+LEDGER_BATCH_SIZE = 5000
+
+COLUMNS = Transaction._fields
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    fingerprint TEXT NOT NULL UNIQUE,
+    account TEXT NOT NULL,
+    iso_date TEXT NOT NULL,
+    {", ".join(f"{column} TEXT NOT NULL" for column in COLUMNS)}
+);
+CREATE INDEX IF NOT EXISTS transactions_date ON transactions (iso_date);
+CREATE INDEX IF NOT EXISTS transactions_isin ON transactions (isin);
+CREATE INDEX IF NOT EXISTS transactions_type ON transactions (type);
+"""
+INSERT = (
+    f"INSERT OR IGNORE INTO transactions "
+    f"(fingerprint, account, iso_date, {', '.join(COLUMNS)}) "
+    f"VALUES ({', '.join('?' * (len(COLUMNS) + 3))})"
+)
+
+
+def iso_date(german_date):
+    """Convert a date like 05.03.2024 to 2024-03-05, which sorts by date"""
+    return f"{german_date[6:10]}-{german_date[3:5]}-{german_date[0:2]}"
+
+
+def parse_date(german_date):
+    """Validate a date like 05.03.2024 and return it as ISO date
+
+    Raises ValueError if it is no such date.
+    """
+    return datetime.strptime(german_date, "%d.%m.%Y").date().isoformat()
+
+
+def fingerprint(account, record, occurrence):
+    """Return a hash of a record, its account and how often it occurred before
+
+    Identical transactions within one export (e.g. two equal savings plan
+    debits on the same day) get different fingerprints, while a transaction
+    that shows up again in an overlapping export gets the same one. The stock
+    name is left out, as it depends on the securities master.
+    """
+    key = "\x1f".join((account, str(occurrence)) + record[:9] + record[10:])
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class Ledger:
+    """Transactions stored in an SQLite file, indexed by date, ISIN and type"""
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+
+    def add(self, records, account="", batch_size=LEDGER_BATCH_SIZE):
+        """Store the records of one export, skipping those already stored
+
+        Yields the records while they are stored, so the ledger can be filled
+        alongside the CSV file. The records are inserted batch_size at a time,
+        each batch in one database transaction. `inserted` is the number of
+        new transactions afterwards.
+        """
+        self.inserted = 0
+        occurrences = Counter()
+        batch = []
+        for record in records:
+            occurrences[record] += 1
+            batch.append(
+                (
+                    fingerprint(account, record, occurrences[record]),
+                    account,
+                    iso_date(record[0]),
+                )
+                + tuple(record)
+            )
+            if len(batch) == batch_size:
+                self._insert(batch)
+                batch = []
+            yield record
+        self._insert(batch)
+
+    def _insert(self, batch):
+        changes = self.connection.total_changes
+        with self.connection:
+            self.connection.executemany(INSERT, batch)
+        self.inserted += self.connection.total_changes - changes
+
+    def transactions(self, start=None, end=None, account=None):
+        """Yield the stored transactions of a date range and account by date
+
+        `start` and `end` are ISO dates and included in the range.
+        """
+        conditions = []
+        parameters = []
+        if start is not None:
+            conditions.append("iso_date >= ?")
+            parameters.append(start)
+        if end is not None:
+            conditions.append("iso_date <= ?")
+            parameters.append(end)
+        if account is not None:
+            conditions.append("account = ?")
+            parameters.append(account)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        cursor = self.connection.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM transactions {where} "
+            f"ORDER BY iso_date, id",
+            parameters,
+        )
+        return map(Transaction._make, cursor)
+
+    def export(self, csv_output, start=None, end=None, account=None):
+        """Write stored transactions as Portfolio Performance CSV file
+
+        Returns the number of transactions.
+        """
+        transaction_writer = csv.writer(csv_output, delimiter=";")
+        transaction_writer.writerow(FIELD_NAMES)
+        row_cnt = 0
+        for record in self.transactions(start, end, account):
+            transaction_writer.writerow(record)
+            row_cnt += 1
+        return row_cnt
+
+    def close(self):
+        self.connection.close()
+
+
+def main():
+    """Main function"""
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("ledger", help="Ledger filled by the converter")
+    arg_parser.add_argument("outfile", help="Name of the exported CSV file")
+    arg_parser.add_argument(
+        "--from", dest="start", help="First day to export, e.g. 01.01.2024"
+    )
+    arg_parser.add_argument("--to", dest="end", help="Last day to export")
+    arg_parser.add_argument("--account", help="Only export this account")
+    command_args = arg_parser.parse_args()
+
+    if not os.path.exists(command_args.ledger):
+        print_message(f'Error: Ledger "{command_args.ledger}" does not exist', 31)
+        sys.exit(1)
+    try:
+        start = parse_date(command_args.start) if command_args.start else None
+        end = parse_date(command_args.end) if command_args.end else None
+        ledger = Ledger(command_args.ledger)
+        with open(command_args.outfile, "w", newline="") as csv_output:
+            row_cnt = ledger.export(csv_output, start, end, command_args.account)
+        ledger.close()
+    except (ValueError, OSError, sqlite3.Error) as error:
+        print_message(f"Error: {error}", 31)
+        sys.exit(1)
+    print_message(f"Success: Exported {row_cnt} transactions", 32)
+    print_message(f"Info: Result written to {command_args.outfile}", 0)
+
+
+if __name__ == "__main__":
+    main()
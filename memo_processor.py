@@ -1,4 +1,9 @@
 import re
+from collections import Counter, OrderedDict, namedtuple
+from functools import cached_property
+
+from money import Money
+from records import Typ
 
 # Regular expressions to find categories of transactions
 deposit_re = re.compile(r"LASTSCHRIFTEINR\.\s*")
@@ -17,146 +22,541 @@ capital_gain_tax_re = re.compile(r"KAPITALERTRAGSTEUER\s*")
 transfer_re = re.compile(r"UEBERWEISUNG\s*")
 fee_re = re.compile(r"ENTGELT\s*")
 
+line_break_re = re.compile(r"\n\s*")
+whitespace_re = re.compile(r"\s+")
+
+# Default number of memos a MemoCache remembers
+MEMO_CACHE_SIZE = 4096
+
+# Triggers of the classification rules: the text they look at (memo or note)
+# and either a keyword that has to be contained in it or a regex method that has
+# to match it. A RuleEngine compiles them together with RULES.
+TRIGGERS = {
+    "deposit": ("memo", deposit_re.match),
+    "sparplan": ("memo", "SPARPLAN"),
+    "vorabpauschale": ("memo", "VORABPAUSCHALE"),
+    "wertpapierabrechnung": ("memo", "WERTPAPIERABRECHNUNG"),
+    "storno": ("memo", "STORNO"),
+    "dividend": ("memo", dividend_re.search),
+    "depotentgelt": ("memo", "DEPOTENTGELT"),
+    "collect": ("memo", collect_re.match),
+    "fee": ("memo", fee_re.match),
+    "church_tax": ("memo", church_tax_re.match),
+    "soli_tax": ("memo", soli_tax_re.match),
+    "capital_gain_tax": ("memo", capital_gain_tax_re.match),
+    "transfer": ("memo", transfer_re.match),
+    "steuerausgleich": ("note", "STEUERAUSGLEICH"),
+    "note_storno": ("note", "STORNO"),
+    "verkauf": ("note", "VERKAUF"),
+    "kauf": ("note", "KAUF"),
+    "depot": ("note", "DEPOT"),
+    "depot_space": ("note", "DEPOT "),
+    "credit": ("note", credit_re.match),
+    "vertriebsfolgeprovision": ("note", "VERTRIEBSFOLGEPROVISION"),
+    "retoure": ("note", "Retoure"),
+    "steuerbelastung": ("note", "Steuerbelastung"),
+}
+
+# Classification rules in order of priority. Each rule is a name, a tuple of
+# trigger groups that all need at least one hit, and whether the transaction
+# has to be a credit. The first rule that holds wins.
+RULES = (
+    ("deposit", (("deposit",),), False),
+    ("tax_refund", (("steuerausgleich",),), False),
+    ("advance_lump_sum", (("vorabpauschale",),), False),
+    ("sell", (("wertpapierabrechnung",), ("verkauf", "depot_space")), True),
+    ("buy", (("wertpapierabrechnung",), ("kauf", "depot")), False),
+    ("dividend", (("dividend",),), False),
+    ("depot_fee", (("depotentgelt",),), False),
+    ("collection", (("collect", "fee"),), False),
+    ("credit", (("credit",),), False),
+    ("tax_charge", (("steuerbelastung",),), False),
+    ("church_tax", (("church_tax",),), False),
+    ("soli_tax", (("soli_tax",),), False),
+    ("capital_gain_tax", (("capital_gain_tax",),), False),
+    ("transfer", (("transfer",),), False),
+)
+
+
+# Number of classifications after which a RuleEngine reorders its rules
+ADAPT_INTERVAL = 1000
+
+Probe = namedtuple("Probe", "subject keyword method prefix")
+Rule = namedtuple("Rule", "name required needs_credit prefixes")
+
+
+def literal_prefix(pattern):
+    """Return the text every match of a regex pattern starts with
+
+    The prefix may be shorter than the longest such text, e.g. it is empty for
+    patterns with alternatives.
+    """
+    if "|" in pattern:
+        return ""
+    prefix = []
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if (
+            char == "\\"
+            and index + 1 < len(pattern)
+            and not pattern[index + 1].isalnum()
+        ):
+            char = pattern[index + 1]
+            index += 2
+        elif char in ".^$*+?{}[]()\\":
+            break
+        else:
+            index += 1
+        quantifier = pattern[index : index + 1]
+        if quantifier in ("*", "?", "{"):
+            break
+        prefix.append(char)
+        if quantifier == "+":
+            break
+    return "".join(prefix)
+
+
+def compile_trigger(subject, probe):
+    """Compile a trigger of TRIGGERS into a Probe
+
+    A probe has either a keyword or a regex method. The prefix is the text the
+    memo has to start with for the trigger to be found, empty if there is none.
+    """
+    if isinstance(probe, str):
+        return Probe(subject, probe, None, "")
+    prefix = ""
+    if subject == "memo" and probe.__name__ == "match":
+        prefix = literal_prefix(probe.__self__.pattern)
+    return Probe(subject, None, probe, prefix)
+
+
+def exclusive(rule, other):
+    """Check if no memo can satisfy two rules, as they need different prefixes"""
+    if rule.prefixes is None or other.prefixes is None:
+        return False
+    return not any(
+        prefix.startswith(other_prefix) or other_prefix.startswith(prefix)
+        for prefix in rule.prefixes
+        for other_prefix in other.prefixes
+    )
+
+
+class RuleEngine:
+    """Classifier compiled from the tables of triggers and rules
+
+    Classifies like trying the rules in the order of the table, but counts the
+    hits per rule and every `adapt_every` classifications tests the frequent
+    rules first. A rule only moves ahead of the rules of higher priority it
+    cannot conflict with, i.e. that need the memo to start differently. So the
+    first rule that holds in the new order is still the one of highest priority.
+    """
+
+    def __init__(self, rules=RULES, triggers=TRIGGERS, adapt_every=ADAPT_INTERVAL):
+        self.probes = {
+            name: compile_trigger(*trigger) for name, trigger in triggers.items()
+        }
+        self.rules = [
+            Rule(name, required, needs_credit, self._prefixes(required))
+            for name, required, needs_credit in rules
+        ]
+        # Rules of higher priority each rule has to stay behind
+        self.before = {
+            rule.name: {
+                other.name
+                for other in self.rules[:position]
+                if not exclusive(rule, other)
+            }
+            for position, rule in enumerate(self.rules)
+        }
+        self.order = list(self.rules)
+        self.adapt_every = adapt_every
+        self.hits = Counter()
+        # Names of the rules that held since the last reordering, counted only
+        # then to keep classify cheap
+        self.recent = []
+        self.classified = 0
+        self.rules_tested = 0
+
+    def _prefixes(self, required):
+        """Prefixes one of which a memo needs to satisfy a rule, None if any
+        memo may"""
+        for group in required:
+            prefixes = [self.probes[trigger].prefix for trigger in group]
+            if all(prefixes):
+                return prefixes
+        return None
+
+    def classify(self, triggers, is_credit):
+        """Return the name of the first rule that holds for the given triggers
+
+        Returns None if no rule holds.
+        """
+        found = None
+        for name, required, needs_credit, _ in self.order:
+            if needs_credit and not is_credit:
+                continue
+            for group in required:
+                if not any(triggers[trigger] for trigger in group):
+                    break
+            else:
+                found = name
+                break
+        recent = self.recent
+        recent.append(found)
+        if len(recent) >= self.adapt_every:
+            self.adapt()
+        return found
+
+    def _count_recent_hits(self):
+        """Add the recent hits to the totals, with the rules they took to test"""
+        positions = {rule.name: position for position, rule in enumerate(self.order)}
+        recent_hits = Counter(self.recent)
+        for name, count in recent_hits.items():
+            self.rules_tested += count * (positions.get(name, len(self.order) - 1) + 1)
+            self.classified += count
+        self.hits.update(recent_hits)
+        self.recent.clear()
+
+    def adapt(self):
+        """Order the rules by their hits as far as their conflicts allow"""
+        self._count_recent_hits()
+        order = []
+        placed = set()
+        remaining = list(self.rules)
+        while remaining:
+            ready = [rule for rule in remaining if self.before[rule.name] <= placed]
+            # max keeps the first of equally frequent rules, i.e. the table order
+            rule = max(ready, key=lambda rule: self.hits[rule.name])
+            order.append(rule)
+            placed.add(rule.name)
+            remaining.remove(rule)
+        self.order = order
+
+    def stats(self):
+        """Return the hits per rule, the current order and the average number of
+        rules tested per classification"""
+        self._count_recent_hits()
+        return {
+            "hits": {
+                name or "unknown": count for name, count in self.hits.most_common()
+            },
+            "order": [rule.name for rule in self.order],
+            "rules_tested": (
+                self.rules_tested / self.classified if self.classified else 0
+            ),
+        }
+
+
+# Rule engine of the process, shared by all classifications
+ENGINE = RuleEngine()
+
+
+class Triggers(dict):
+    """Classification triggers of a memo and its note
+
+    Maps trigger names to whether the trigger was found. A trigger is only
+    looked for the first time a rule asks for it, so a transaction pays for the
+    triggers of the rules up to the one that classifies it, each at most once.
+    The triggers are those of the rule engine of the process unless other
+    probes are given.
+    """
+
+    probes = ENGINE.probes
+
+    def __init__(self, memo, note, probes=None):
+        super().__init__()
+        self.memo = memo
+        self.note = note
+        if probes is not None:
+            self.probes = probes
+
+    def __missing__(self, name):
+        subject, keyword, method, _ = self.probes[name]
+        text = self.memo if subject == "memo" else self.note
+        if keyword is not None:
+            found = keyword in text
+        else:
+            found = method(text) is not None
+        self[name] = found
+        return found
+
+
+def classify(triggers, is_credit):
+    """Return the name of the first rule that holds for the given triggers
+
+    Classifies with the rule engine of the process. Returns None if no rule
+    holds.
+    """
+    return ENGINE.classify(triggers, is_credit)
+
+
+# Dictionary mapping abbreviated stock names to full stock names
+STOCK_NAMES = {
+    "ACATIS-GANE VAL.EV.F.UI A": "Acatis Gané Value Event Fonds",
+    "ISHS CORE DAX UCITS ETF": "iShares Core DAX UCITS ETF",
+    "ISHSIII-CORE MSCI WLD DLA": "iShares Core MSCI World UCITS ETF",
+    "CARMIGN.PATRIMOI. AEO ACC": "Carmignac Patrimoine A",
+    "THREADN.INV.-EU.S.C. RAEO": "Threadneedle European Smaller Companies",
+    "ETHNA-DEFENSIV INH. T": "Ethna-Defensiv T EUR ACC",
+}
+
+# Regular expressions to find the security fields of a transaction. The stock
+# name follows the WKN in new transaction texts. Old transaction texts have it in
+# front of the WKN, right after the DEPOT-NR.
+pieces_re = re.compile(r"MENGE\s+(\d+,?\d*)")
+wkn_re = re.compile(r"WKN\s+(\w{6})\s*/")
+isin_re = re.compile(r"WKN.*/ ([0-9a-zA-Z]*)")
+stock_name_re = re.compile(r"WKN\s*\w{6}\s*/\s*\w{12}\s*(.+?)\s*DEPOT")
+stock_name_old_re = re.compile(r"DEPOT-NR \d* (.*)\sWKN.*/.*\s")
+kapst_re = re.compile(r"KAPST\s+([\d.,]+)")
+solz_re = re.compile(r"SOLZ\s+([\d.,]+)")
+kist_re = re.compile(r"KIST\s+([\d.,]+)")
+
+MemoResult = namedtuple("MemoResult", "note out_dict warnings rule")
+MemoCacheInfo = namedtuple("MemoCacheInfo", "hits misses maxsize currsize")
+SecurityFields = namedtuple("SecurityFields", "pieces wkn isin name kapst solz kist")
+
+
+def _search(regex, text):
+    """Return the first group of the first match, an empty string if none"""
+    matches = regex.search(text)
+    return matches.group(1) if matches else ""
+
+
+def _parse_tax(regex, memo):
+    """Find a German tax amount and parse it into Money, 0 if there is none
+
+    Amounts with more than two decimals are rounded half up to cents.
+    """
+    tax_str = _search(regex, memo)
+    if not tax_str:
+        return Money(0)
+    return Money.from_german(tax_str, rounded=True)
+
+
+def extract_fields(memo, note, securities=None):
+    """Extract all security fields from a memo and its note
+
+    Returns a SecurityFields record. Text fields that were not found are empty
+    strings, tax amounts are Money and 0 if they were not found. The stock name
+    is looked up by ISIN and WKN in `securities` if a securities master is given.
+    Otherwise, or if the security is unknown, it is parsed from the note and
+    translated to a more readable string if the abbreviated version is known.
+    """
+    wkn = _search(wkn_re, memo)
+    isin = _search(isin_re, note)
+    name = securities.name(isin, wkn) if securities is not None else ""
+    if not name:
+        name = _search(stock_name_re, note) or _search(stock_name_old_re, note)
+        name = STOCK_NAMES.get(name, name)
+    return SecurityFields(
+        pieces=_search(pieces_re, memo),
+        wkn=wkn,
+        isin=isin,
+        name=name,
+        kapst=_parse_tax(kapst_re, memo),
+        solz=_parse_tax(solz_re, memo),
+        kist=_parse_tax(kist_re, memo),
+    )
+
+
+def normalize_memo(memo):
+    """Join the lines of a memo and collapse its whitespace to single spaces"""
+    return whitespace_re.sub(" ", line_break_re.sub("", memo))
+
+
+def process_memo(memo, line_no="0", is_credit=False, securities=None):
+    """Classify a memo with a new MemoProcessor
+
+    Returns a MemoResult with the note of the memo, the output dict of
+    MemoProcessor.process, the warnings as (kind, field) pairs and the name of
+    the rule that classified the memo (None if no rule did). Stock names are
+    looked up in `securities` if a securities master is given.
+    """
+    memo_processor = MemoProcessor(memo, line_no, is_credit, securities)
+    out_dict = memo_processor.process()
+    return MemoResult(
+        memo_processor.note, out_dict, memo_processor.warnings, memo_processor.rule
+    )
+
+
+class MemoCache:
+    """Bounded LRU cache in front of process_memo
+
+    Recurring memos like savings plan debits or quarterly depot fees are
+    classified only once. The warnings of a memo are part of its result, so
+    they are reported again on every hit. A cache must only be used with one
+    securities master.
+    """
+
+    def __init__(self, maxsize=MEMO_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def process(self, memo, line_no="0", is_credit=False, securities=None):
+        """Classify a memo like process_memo, reusing earlier results"""
+        key = (memo, is_credit)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            entry = process_memo(memo, line_no, is_credit, securities)
+            self._entries[key] = entry
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        else:
+            self.hits += 1
+            self._entries.move_to_end(key)
+        return entry._replace(out_dict=dict(entry.out_dict))
+
+    def cache_info(self):
+        """Return the hit and miss statistics of the cache"""
+        return MemoCacheInfo(self.hits, self.misses, self.maxsize, len(self._entries))
+
 
 class MemoProcessor:
-    def __init__(self, memo, line_no="0", is_credit=False):
+    def __init__(self, memo, line_no="0", is_credit=False, securities=None):
         self.memo = memo
-        line_breaks_removed = re.sub("\n\s*", "", memo)
-        self.note = re.sub("\s+", " ", line_breaks_removed)
+        self.note = normalize_memo(memo)
         self.line_no = str(line_no)
         self.is_credit = is_credit
+        self.securities = securities
+        self.warnings = []
+        self.rule = None
 
     def process(self):
         # Determine output values that depend on the transaction type
+        self.triggers = Triggers(self.memo, self.note)
+        self.rule = ENGINE.classify(self.triggers, self.is_credit)
+        if self.rule is None:
+            self.warn("unknown_type")
+            return {}
+        return getattr(self, "_process_" + self.rule)()
+
+    def _process_deposit(self):
+        out_dict = {}
+        if self.triggers["sparplan"]:
+            out_dict["Notiz"] = "Sparplan"
+        out_dict["Typ"] = Typ.EINLAGE
+        return out_dict
+
+    def _process_tax_refund(self):
+        out_dict = {"Notiz": self.note}
+        if self.triggers["note_storno"]:
+            out_dict["Typ"] = Typ.STEUERN
+        else:
+            out_dict["Typ"] = Typ.STEUERRUECKERSTATTUNG
+        return out_dict
+
+    def _process_advance_lump_sum(self):
+        return {
+            "Typ": Typ.STEUERN,
+            "Stück": self.find_pieces(),
+            "Steuern": self.find_taxes(),
+            "Wertpapiername": self.find_stock_name(),
+            "WKN": self.find_wkn(),
+        }
+
+    def _process_sell(self):
         out_dict = {}
         transaction_is_valid = True
-        if deposit_re.match(self.memo) is not None:
-            if self.memo.find("SPARPLAN") != -1:
-                out_dict["Notiz"] = "Sparplan"
-            out_dict["Typ"] = "Einlage"
-
-        elif "STEUERAUSGLEICH" in self.note:
-            out_dict["Notiz"] = self.note
-            if "STORNO" in self.note:
-                out_dict["Typ"] = "Steuern"
-            else:
-                out_dict["Typ"] = "Steuerrückerstattung"
-
-        elif "VORABPAUSCHALE" in self.memo:
-            out_dict["Typ"] = "Steuern"
-            out_dict["Stück"] = self.find_pieces()
-            out_dict["Steuern"] = self.find_taxes()
-            out_dict["Wertpapiername"] = self.find_stock_name()
-            out_dict["WKN"] = self.find_wkn()
-
-        elif (
-            "WERTPAPIERABRECHNUNG" in self.memo
-            and ("VERKAUF" in self.note or "DEPOT " in self.note)
-            and self.is_credit
-        ):
-            pieces = self.find_pieces()
-            if pieces == "":
-                self.print_warning("Could not find number of pieces in line ")
-                transaction_is_valid = False
-            wkn = self.find_wkn()
-            if wkn == "":
-                self.print_warning("Could not find WKN in line ")
-            # We can still use the transaction
-            isin = self.find_isin()
-            if isin == "":
-                self.print_warning("Could not find ISIN in line ")
-            # We can still use the transaction
-            name = self.find_stock_name()
-            if name == "":
-                self.print_warning("Could not find the stock name in line ")
-                transaction_is_valid = False
-            taxes = self.find_taxes()
-            if transaction_is_valid:
-                out_dict["Typ"] = "Kauf" if "STORNO" in self.memo else "Verkauf"
-                out_dict["Stück"] = pieces
-                out_dict["WKN"] = wkn
-                out_dict["ISIN"] = isin
-                out_dict["Wertpapiername"] = name
-                out_dict["Steuern"] = str(taxes).replace(".", ",")
-
-        elif "WERTPAPIERABRECHNUNG" in self.memo and (
-            "KAUF" in self.note or "DEPOT" in self.note
-        ):
-            pieces = self.find_pieces()
-            if pieces == "":
-                self.print_warning("Could not find number of pieces in line ")
-                transaction_is_valid = False
-            wkn = self.find_wkn()
-            if wkn == "":
-                self.print_warning("Could not find WKN in line ")
-            # We can still use the transaction
-            isin = self.find_isin()
-            if isin == "":
-                self.print_warning("Could not find ISIN in line ")
-            # We can still use the transaction
-            name = self.find_stock_name()
-            if name == "":
-                self.print_warning("Could not find the stock name in line ")
-                transaction_is_valid = False
-            if transaction_is_valid:
-                out_dict["Typ"] = "Kauf"
-                out_dict["Stück"] = pieces
-                out_dict["WKN"] = wkn
-                out_dict["ISIN"] = isin
-                out_dict["Wertpapiername"] = name
-
-        elif dividend_re.search(self.memo) is not None:
-            out_dict["Typ"] = "Dividende"
-            out_dict["Notiz"] = self.note
-            out_dict["Stück"] = self.find_pieces()
-            out_dict["WKN"] = self.find_wkn()
-            out_dict["ISIN"] = self.find_isin()
-            out_dict["Wertpapiername"] = self.find_stock_name()
-            out_dict["Steuern"] = self.find_taxes()
-
-        elif self.memo.find("DEPOTENTGELT") != -1:
-            out_dict["Typ"] = "Gebühren"
-            out_dict["Notiz"] = self.note
-
-        elif (collect_re.match(self.memo) is not None) or fee_re.match(
-            self.memo
-        ) is not None:
-            out_dict["Typ"] = "Entnahme"
-            out_dict["Notiz"] = "Unbekannte Abbuchung"
-
-        elif credit_re.match(self.note) is not None:
-            if "VERTRIEBSFOLGEPROVISION" in self.note:
-                out_dict["Typ"] = "Gebührenerstattung"
-                out_dict["Notiz"] = "Erstattung Vertriebsfolgeprovision"
-            elif "Retoure" in self.note:
-                out_dict["Typ"] = "Entnahme"
-                out_dict["Notiz"] = self.note
-            else:
-                out_dict["Typ"] = "Einlage"
-                out_dict["Notiz"] = self.note
+        pieces = self.find_pieces()
+        if pieces == "":
+            self.warn("missing_field", "pieces")
+            transaction_is_valid = False
+        wkn = self.find_wkn()
+        if wkn == "":
+            self.warn("missing_field", "wkn")
+        # We can still use the transaction
+        isin = self.find_isin()
+        if isin == "":
+            self.warn("missing_field", "isin")
+        # We can still use the transaction
+        name = self.find_stock_name()
+        if name == "":
+            self.warn("missing_field", "name")
+            transaction_is_valid = False
+        taxes = self.find_taxes()
+        if transaction_is_valid:
+            out_dict["Typ"] = Typ.KAUF if self.triggers["storno"] else Typ.VERKAUF
+            out_dict["Stück"] = pieces
+            out_dict["WKN"] = wkn
+            out_dict["ISIN"] = isin
+            out_dict["Wertpapiername"] = name
+            out_dict["Steuern"] = taxes
+        return out_dict
 
-        elif "Steuerbelastung" in self.note:
-            out_dict["Typ"] = "Steuern"
-            out_dict["Notiz"] = self.note
+    def _process_buy(self):
+        out_dict = {}
+        transaction_is_valid = True
+        pieces = self.find_pieces()
+        if pieces == "":
+            self.warn("missing_field", "pieces")
+            transaction_is_valid = False
+        wkn = self.find_wkn()
+        if wkn == "":
+            self.warn("missing_field", "wkn")
+        # We can still use the transaction
+        isin = self.find_isin()
+        if isin == "":
+            self.warn("missing_field", "isin")
+        # We can still use the transaction
+        name = self.find_stock_name()
+        if name == "":
+            self.warn("missing_field", "name")
+            transaction_is_valid = False
+        if transaction_is_valid:
+            out_dict["Typ"] = Typ.KAUF
+            out_dict["Stück"] = pieces
+            out_dict["WKN"] = wkn
+            out_dict["ISIN"] = isin
+            out_dict["Wertpapiername"] = name
+        return out_dict
 
-        elif church_tax_re.match(self.memo) is not None:
-            out_dict["Typ"] = "Steuern"
-            out_dict["Notiz"] = "Kirchensteuer"
+    def _process_dividend(self):
+        return {
+            "Typ": Typ.DIVIDENDE,
+            "Notiz": self.note,
+            "Stück": self.find_pieces(),
+            "WKN": self.find_wkn(),
+            "ISIN": self.find_isin(),
+            "Wertpapiername": self.find_stock_name(),
+            "Steuern": self.find_taxes(),
+        }
 
-        elif soli_tax_re.match(self.memo) is not None:
-            out_dict["Typ"] = "Steuern"
-            out_dict["Notiz"] = "Solidaritätszuschlag"
+    def _process_depot_fee(self):
+        return {"Typ": Typ.GEBUEHREN, "Notiz": self.note}
 
-        elif capital_gain_tax_re.match(self.memo) is not None:
-            out_dict["Typ"] = "Steuern"
-            out_dict["Notiz"] = "Kapitalertragsteuer"
+    def _process_collection(self):
+        return {"Typ": Typ.ENTNAHME, "Notiz": "Unbekannte Abbuchung"}
 
-        elif transfer_re.match(self.memo):
-            out_dict["Typ"] = "Entnahme"
+    def _process_credit(self):
+        if self.triggers["vertriebsfolgeprovision"]:
+            return {
+                "Typ": Typ.GEBUEHRENERSTATTUNG,
+                "Notiz": "Erstattung Vertriebsfolgeprovision",
+            }
+        elif self.triggers["retoure"]:
+            return {"Typ": Typ.ENTNAHME, "Notiz": self.note}
         else:
-            self.print_warning("Unknown transaction type in line ")
+            return {"Typ": Typ.EINLAGE, "Notiz": self.note}
 
-        return out_dict
+    def _process_tax_charge(self):
+        return {"Typ": Typ.STEUERN, "Notiz": self.note}
+
+    def _process_church_tax(self):
+        return {"Typ": Typ.STEUERN, "Notiz": "Kirchensteuer"}
+
+    def _process_soli_tax(self):
+        return {"Typ": Typ.STEUERN, "Notiz": "Solidaritätszuschlag"}
+
+    def _process_capital_gain_tax(self):
+        return {"Typ": Typ.STEUERN, "Notiz": "Kapitalertragsteuer"}
+
+    def _process_transfer(self):
+        return {"Typ": Typ.ENTNAHME}
 
     def find_pieces(self):
         """Find the number of traded stock pieces in a transaction text
@@ -164,100 +564,46 @@ class MemoProcessor:
         Returns the number of pieces as a string if the number was found and an
         empty string otherwise
         """
-        regex = r"MENGE\s+(\d+,?\d*)"
-        matches = re.search(regex, self.memo)
-        if matches:
-            return matches.group(1)
-        else:
-            return ""
+        return self.fields.pieces
 
-    def print_warning(self, text):
-        """Print an orange colored warning text to stdout"""
-        print("\033[33mWarning: " + text + self.line_no + "\033[0m")
+    def warn(self, kind, field=None):
+        """Remember a warning of a kind of diagnostic about a field"""
+        self.warnings.append((kind, field))
 
     def find_wkn(self):
         """Find the WKN in a transaction text
 
         Returns the WKN if it was found and an empty string otherwise
         """
-        regex = r"WKN\s+(\w{6})\s*/"
-        matches = re.search(regex, self.memo)
-        if matches:
-            return matches.group(1)
-        else:
-            return ""
+        return self.fields.wkn
 
     def find_isin(self):
         """Find the ISIN in a transaction text
 
         Returns the ISIN if it was found and an empty string otherwise
         """
-        regex = r"WKN.*/ ([0-9a-zA-Z]*)"
-        matches = re.search(regex, self.note)
-        if matches:
-            return matches.group(1)
-        else:
-            return ""
+        return self.fields.isin
 
     def find_stock_name(self):
         """Find and translate the stock name in a transaction text
 
         Returns the stock name if it was found and an empty string otherwise. The
-        stock name is translated to a more readable string if the abbreviated
-        version is known. If it is unknown, the abbreviated string is returned.
+        name comes from the securities master if the security is in it. Else it
+        is translated to a more readable string if the abbreviated version is
+        known. If it is unknown, the abbreviated string is returned.
         """
-        # Dictionary mapping abbreviated stock names to full stock names
-        stock_dict = {
-            "ACATIS-GANE VAL.EV.F.UI A": "Acatis Gané Value Event Fonds",
-            "ISHS CORE DAX UCITS ETF": "iShares Core DAX UCITS ETF",
-            "ISHSIII-CORE MSCI WLD DLA": "iShares Core MSCI World UCITS ETF",
-            "CARMIGN.PATRIMOI. AEO ACC": "Carmignac Patrimoine A",
-            "THREADN.INV.-EU.S.C. RAEO": "Threadneedle European Smaller Companies",
-            "ETHNA-DEFENSIV INH. T": "Ethna-Defensiv T EUR ACC",
-        }
-
-        regex = r"WKN\s*\w{6}\s*/\s*\w{12}\s*(.+?)\s*DEPOT"
-        matches = re.search(regex, self.note)
-        if matches:
-            name = matches.group(1)
-        else:
-            # Old transaction text. We have to look before the WKN
-            # The structure of the transaction has changed over time: the stock name
-            # used to be in the line before the WKN but is now in the line after the
-            # WKN. If the name contains "HANDELSTAG" we assume that we have an old
-            # transcation text.
-            regex = r"DEPOT-NR \d* (.*)\sWKN.*/.*\s"
-            matches = re.search(regex, self.note)
-            if matches:
-                name = matches.group(1)
-            else:
-                return ""
-
-        # Try to translate the abbreviated name
-        if name in stock_dict:
-            return stock_dict[name]
-        else:
-            return name
+        return self.fields.name
 
     def find_taxes(self):
         """Find tax amount in a transaction text
 
-        Looks for tax substractions and returns the total amount of taxes if there
-        are any, and 0 otherwise.
+        Looks for tax substractions and returns the total amount of taxes in
+        German format if there are any, and 0,00 otherwise.
         """
-        kap = self._extract_tax("KAPST")
-        soli = self._extract_tax("SOLZ")
-        kist = self._extract_tax("KIST")
-        taxes = kap + soli + kist
-        return str(round(taxes, 2)).replace(".", ",")
-
-    def _extract_tax(self, tax_type):
-        tax = 0
-        tax_regex = rf"{tax_type}\s+([\d.,]+)"
-
-        matches = re.search(tax_regex, self.memo)
-        if matches:
-            tax_str = matches.group(1).replace(".", "")
-            tax = float(tax_str.replace(",", "."))
-
-        return tax
+        fields = self.fields
+        return str(fields.kapst + fields.solz + fields.kist)
+
+    @cached_property
+    def fields(self):
+        """Security fields of the transaction text, extracted on first use"""
+        return extract_fields(self.memo, self.note, self.securities)
@@ -7,26 +7,221 @@ Input:  A CSV file generated by exporting transaction data from an MLP bank acco
 Output: A CSV file that can be imported by Portfolio Performance.
 """
 
-import argparse  # command line arguments parser
+# Modules only some conversions need (argparse, cProfile, pstats, the process
+# pool, tempfile, heapq, mmap, the compression modules, NumPy, the diagnostics,
+# the statistics and the transaction index) are imported where they are used,
+# which keeps the startup of small conversions short.
+import codecs
+import contextlib
 import csv
-import fileinput
-import locale
+import functools
+import io
 import os
 import re
 import sys
+from collections import Counter, deque
+from itertools import islice
+from operator import itemgetter
 
-from memo_processor import MemoProcessor
+from memo_processor import MEMO_CACHE_SIZE, MemoCache, normalize_memo, process_memo
+from money import Money
+from records import FIELD_NAMES, Transaction, Typ, make_transaction
 
 CATEGORY_TO_TYPE = {
-    "Zinseinkünfte": "Zinsen",
-    "Quellensteuern:Kapitalertragsteuer": "Steuern",
-    "Quellensteuern:Solidaritätszuschlag": "Steuern",
+    "Zinseinkünfte": Typ.ZINSEN,
+    "Quellensteuern:Kapitalertragsteuer": Typ.STEUERN,
+    "Quellensteuern:Solidaritätszuschlag": Typ.STEUERN,
 }
 
+INPUT_ENCODING = "iso-8859-1"
+# Columns of the MLP export the conversion reads. Rows are tuples of these
+# columns, starting with the columns that identify a transaction, which are
+# transaction_index.FINGERPRINT_COLUMNS.
+COLUMNS = ("Buchungstag", "Betrag", "Verwendungszweck", "Kundenreferenz", "Category")
+REQUIRED_COLUMNS = ("Buchungstag", "Betrag", "Verwendungszweck")
+AMOUNT_COLUMN = COLUMNS.index("Betrag")
+REFERENCE_COLUMN = COLUMNS.index("Kundenreferenz")
+# Number of lines at the top of an export the header is searched in
+HEADER_LINES = 20
+# Kundenreferenz of the lines with the balance, which are no transactions
+SALDO_REFERENCES = ("Anfangssaldo", "Endsaldo")
+# Extensions of compressed exports and output files
+COMPRESSED_EXTENSIONS = (".gz", ".xz", ".zip")
+# Number of bytes read from a compressed export at once
+READ_SIZE = 1 << 16
+# Number of transactions a worker process converts at once in parallel mode
+CHUNK_SIZE = 5000
+# Number of transactions sorted in memory before they are spilled to a temporary
+# file when sorting the output
+SORT_BUFFER_SIZE = 100000
+# Number of sorted temporary files merged at once when sorting the output, which
+# bounds the number of open files
+SORT_MERGE_WIDTH = 64
+# Number of functions listed by --profile
+PROFILE_LINES = 25
+
+english_number_re = re.compile(r"^-*[,\d]+\.\d{2}$")
+# English amounts as MLP exports them: digits grouped by commas without leading
+# zeros, a decimal point and two decimals. Their German format only swaps the
+# separators.
+canonical_number_re = re.compile(r"-?(?:[1-9]\d{0,2}(?:,\d{3})*|0)\.\d{2}")
+# Longest amount without sign converted with NumPy: 15 digits, 4 commas and the
+# decimal point
+NUMPY_AMOUNT_LENGTH = 20
+DIGIT, COMMA, POINT, MINUS = map(ord, "0,.-")
+# Swaps English for German thousands separator and decimal point
+GERMAN_SEPARATORS = str.maketrans(",.", ".,")
+
+
+class ConversionError(Exception):
+    """Raised when an input file cannot be converted"""
+
+
+def compression_of(path):
+    """Return the compression extension of a file name
+
+    The extension is e.g. ".gz", or an empty string if the file is not compressed.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    return extension if extension in COMPRESSED_EXTENSIONS else ""
+
+
+def strip_compression(path):
+    """Return a file name without its compression extension"""
+    return path[: -len(compression_of(path))] if compression_of(path) else path
+
+
+def stream_module(compression):
+    """Import the module of a .gz or .xz stream"""
+    if compression == ".gz":
+        import gzip
+
+        return gzip
+    import lzma
+
+    return lzma
+
 
 def opening_hook_csv(filename, mode):
-    """CSV opening hook for the fileinput.input() function."""
-    return open(filename, mode, newline="", encoding="iso-8859-1")
+    """CSV opening hook for the fileinput.input() function.
+
+    Files compressed with gzip or xz are decompressed.
+    """
+    compression = compression_of(filename)
+    if compression in (".gz", ".xz"):
+        return stream_module(compression).open(
+            filename, mode + "t", newline="", encoding=INPUT_ENCODING
+        )
+    return open(filename, mode, newline="", encoding=INPUT_ENCODING)
+
+
+@contextlib.contextmanager
+def mapped_file(input_file):
+    """Memory-map a file for reading
+
+    Yields the mmap, or the open binary file if the file is empty and cannot be
+    mapped.
+    """
+    import mmap
+
+    with open(input_file, "rb") as binary_input:
+        if os.fstat(binary_input.fileno()).st_size == 0:
+            yield binary_input
+            return
+        with mmap.mmap(binary_input.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+
+def read_chunks(binary_input, input_file, errors):
+    """Yield the bytes of a decompressing file READ_SIZE bytes at a time
+
+    The `errors` of a damaged file are raised as ConversionError.
+    """
+    try:
+        yield from iter(functools.partial(binary_input.read, READ_SIZE), b"")
+    except errors as error:
+        raise ConversionError(f'"{input_file}" is damaged: {error}') from error
+
+
+@contextlib.contextmanager
+def open_export(input_file):
+    """Open an MLP export for reading
+
+    Exports compressed with gzip (.gz) or xz (.xz) or packed into a zip file
+    (.zip) are decompressed while they are read; a zip file has to contain one
+    file. Yields an iterable of bytes chunks, or the memory-mapped file of an
+    uncompressed export. Raises ConversionError if the export is damaged.
+    """
+    compression = compression_of(input_file)
+    if not compression:
+        with mapped_file(input_file) as mapped:
+            yield mapped
+    elif compression == ".zip":
+        import zipfile
+        import zlib
+
+        try:
+            archive = zipfile.ZipFile(input_file)
+        except zipfile.BadZipFile as error:
+            raise ConversionError(f'"{input_file}" is damaged: {error}') from error
+        with archive:
+            members = [info for info in archive.infolist() if not info.is_dir()]
+            if len(members) != 1:
+                raise ConversionError(
+                    f'"{input_file}" contains {len(members)} files instead of one '
+                    f"export"
+                )
+            with archive.open(members[0]) as binary_input:
+                yield read_chunks(
+                    binary_input, input_file, (zipfile.BadZipFile, zlib.error)
+                )
+    else:
+        module = stream_module(compression)
+        if compression == ".gz":
+            import zlib
+
+            errors = (EOFError, module.BadGzipFile, zlib.error)
+        else:
+            errors = (EOFError, module.LZMAError)
+        with module.open(input_file, "rb") as binary_input:
+            yield read_chunks(binary_input, input_file, errors)
+
+
+@contextlib.contextmanager
+def open_output(output_file):
+    """Open a Portfolio Performance CSV file for writing
+
+    The file is compressed if its name ends in .gz, .xz or .zip. A zip file
+    holds one CSV file named like the zip file.
+    """
+    compression = compression_of(output_file)
+    if not compression:
+        with open(output_file, "w", newline="") as csv_output:
+            yield csv_output
+    elif compression == ".zip":
+        import zipfile
+
+        name = os.path.basename(strip_compression(output_file))
+        with zipfile.ZipFile(output_file, "w", zipfile.ZIP_DEFLATED) as archive:
+            with archive.open(name, "w") as member:
+                with io.TextIOWrapper(member, newline="") as csv_output:
+                    yield csv_output
+    else:
+        module = stream_module(compression)
+        with module.open(output_file, "wt", newline="") as csv_output:
+            yield csv_output
+
+
+def append_file(source_file, output_file):
+    """Append the bytes of a file to another file
+
+    A .gz or .xz file thus gets another compressed stream, which is read as if
+    it was part of the first one.
+    """
+    import shutil
+
+    with open(source_file, "rb") as source, open(output_file, "ab") as output:
+        shutil.copyfileobj(source, output)
 
 
 def print_message(text, color_code):
@@ -35,15 +230,94 @@ def print_message(text, color_code):
 
 
 def convert_to_german_number(number_string):
-    """Convert English number string to German format"""
-    pattern = r"^-*[,\d]+\.\d{2}$"
-    if re.match(pattern, number_string):
-        number = float(number_string.replace(",", ""))
-        locale.setlocale(locale.LC_ALL, "de_DE")
-        return locale.format_string("%.2f", number, grouping=True)
+    """Convert English number string to German format
+
+    Amounts in the format of MLP exports get their separators swapped, other
+    English amounts are converted through Money. Anything else is returned as
+    it is.
+    """
+    if canonical_number_re.fullmatch(number_string):
+        return number_string.translate(GERMAN_SEPARATORS)
+    if english_number_re.match(number_string):
+        return str(Money.from_english(number_string))
     return number_string
 
 
+def convert_to_german_numbers(number_strings):
+    """Convert a column of English number strings to German format"""
+    return list(map(convert_to_german_number, number_strings))
+
+
+@functools.lru_cache(maxsize=None)
+def load_numpy():
+    """Import NumPy on first use
+
+    Returns None if NumPy is not installed, amounts are then converted in pure
+    Python.
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+def convert_amounts(number_strings):
+    """Convert a column of English amounts to German format
+
+    Returns the German amounts and a list of flags which of them are credits.
+    The amounts are converted with NumPy if it is installed.
+    """
+    if load_numpy() is not None:
+        return _convert_amounts_numpy(number_strings)
+    german_numbers = convert_to_german_numbers(number_strings)
+    return german_numbers, [is_positive(number) for number in german_numbers]
+
+
+def _convert_amounts_numpy(number_strings):
+    numpy = load_numpy()
+    count = len(number_strings)
+    width = NUMPY_AMOUNT_LENGTH + 1
+    # One row of character codes per amount, padded with zeros
+    values = numpy.array(number_strings, dtype=f"U{width}")
+    codes = values.view(numpy.uint32).reshape(count, width)
+    lengths = numpy.fromiter(map(len, number_strings), numpy.intp, count)
+    negative = codes[:, 0] == MINUS
+    digits_and_separators = lengths - negative
+
+    # Canonical amounts are an optional minus sign, digits grouped by commas
+    # without leading zeros, a decimal point and two decimals. Counted from the
+    # end, every fourth character starting with the third is a separator.
+    from_end = (lengths - 1)[:, None] - numpy.arange(width)
+    separator = from_end % 4 == 2
+    is_digit = (codes >= DIGIT) & (codes <= DIGIT + 9)
+    expected = numpy.where(
+        separator, codes == numpy.where(from_end == 2, POINT, COMMA), is_digit
+    )
+    first = codes[numpy.arange(count), negative.view(numpy.int8)]
+    canonical = (
+        (lengths <= width)
+        & (digits_and_separators >= 4)
+        & (digits_and_separators <= NUMPY_AMOUNT_LENGTH)
+        & (digits_and_separators % 4 != 3)
+        & ((first != DIGIT) | (digits_and_separators == 4))
+        & (
+            expected | (from_end < 0) | (from_end >= digits_and_separators[:, None])
+        ).all(axis=1)
+    )
+
+    # The German format of a canonical amount swaps its separators
+    german = numpy.where(
+        codes == COMMA, POINT, numpy.where(codes == POINT, COMMA, codes)
+    )
+    german_numbers = german.view(f"U{width}").ravel().tolist()
+    is_credit = (~negative).tolist()
+    for index in numpy.flatnonzero(~canonical).tolist():
+        german_numbers[index] = convert_to_german_number(number_strings[index])
+        is_credit[index] = is_positive(german_numbers[index])
+    return german_numbers, is_credit
+
+
 def is_positive(german_number_string):
     return not german_number_string.strip().startswith("-")
 
@@ -59,111 +333,956 @@ def search_header(csv_file):
         if "Buchungstag" in line and "Betrag" in line:
             found_header = line
             break
-        if header_line_no >= 20:
-            print_message("Error: Header not found in the first 20 lines", 31)
-            sys.exit(1)
+        if header_line_no >= HEADER_LINES:
+            raise ConversionError(f"Header not found in the first {HEADER_LINES} lines")
 
     if found_header is None:
-        print_message("Error: Header not found in the file", 31)
-        sys.exit(1)
+        raise ConversionError("Header not found in the file")
 
     return found_header, header_line_no
 
 
-def process_transactions(transaction_reader, transaction_writer, header_offset):
-    """Process transactions and write to output file"""
-    rows_written = 0
-    rows_read = header_offset
+def iter_amounts(transaction_reader, convert=convert_to_german_number):
+    """Yield each row of a reader with its amount in German format and a flag
+    whether the amount is a credit
+
+    Rows that are None are passed on as (None, None, False).
+    """
     for row in transaction_reader:
+        if row is None:
+            yield None, None, False
+            continue
+        amount = convert(row[AMOUNT_COLUMN])
+        yield row, amount, is_positive(amount)
+
+
+def iter_amount_columns(
+    transaction_reader, convert=convert_amounts, chunk_size=CHUNK_SIZE
+):
+    """Like iter_amounts, converting the amounts of chunk_size rows at once"""
+    transaction_reader = iter(transaction_reader)
+    while True:
+        rows = list(islice(transaction_reader, chunk_size))
+        if not rows:
+            return
+        amounts, credits = convert(
+            [row[AMOUNT_COLUMN] for row in rows if row is not None]
+        )
+        amounts, credits = iter(amounts), iter(credits)
+        for row in rows:
+            if row is None:
+                yield None, None, False
+            else:
+                yield row, next(amounts), next(credits)
+
+
+def iter_transactions(
+    transaction_reader,
+    header_offset,
+    diagnostics=None,
+    memo_cache=None,
+    stats=None,
+    columnar=False,
+    securities=None,
+):
+    """Convert transactions one at a time
+
+    Yields one Transaction record of the Portfolio Performance CSV file per
+    row of the reader, a tuple of COLUMNS. Saldo lines are skipped, as are rows that are
+    None because a row filter dropped them. Warnings about the transactions are
+    added to `diagnostics` if a Diagnostics collector is given. Memos are
+    classified through `memo_cache` if one is given. The stages are timed and
+    the records counted in `stats` if a ConversionStats is given. With
+    `columnar` the amounts are converted a chunk at a time by convert_amounts.
+    Stock names are looked up in `securities` if a securities master is given.
+    """
+    process = memo_cache.process if memo_cache is not None else process_memo
+    if securities is not None:
+        process = functools.partial(process, securities=securities)
+    convert = convert_amounts if columnar else convert_to_german_number
+    if stats is not None:
+        transaction_reader = stats.time_iter("read", transaction_reader)
+        convert = stats.time_call("format", convert)
+        process = stats.time_process(process)
+    if columnar:
+        amounts = iter_amount_columns(transaction_reader, convert)
+    else:
+        amounts = iter_amounts(transaction_reader, convert)
+    rows_read = header_offset
+    for row, umsatz, is_credit in amounts:
         rows_read += 1
 
-        # Skip saldo lines
-        if row.get("Kundenreferenz") in ["Anfangssaldo", "Endsaldo"]:
+        if row is None:
             continue
 
-        umsatz = convert_to_german_number(row["Betrag"])
-        out_dict = {
-            "Datum": row["Buchungstag"],
-            "Wert": umsatz,
-            "Buchungswährung": "EUR",
-        }
+        date, _, subject_str, reference, category = row
 
-        subject_str = row["Verwendungszweck"]
-        memo_processor = MemoProcessor(subject_str, rows_read, is_positive(umsatz))
+        # Skip saldo lines
+        if reference in SALDO_REFERENCES:
+            continue
 
-        type = CATEGORY_TO_TYPE.get(row.get("Category"))
+        type = CATEGORY_TO_TYPE.get(category)
         if type is not None:
-            out_dict["Typ"] = type
-            out_dict["Notiz"] = memo_processor.note
+            record = Transaction(date, type, umsatz, note=normalize_memo(subject_str))
         else:
-            processed_dict = memo_processor.process()
+            note, processed_dict, memo_warnings, rule = process(
+                subject_str, rows_read, is_credit
+            )
 
-            if processed_dict == {}:
-                processed_dict["Typ"] = "Einlage" if is_positive(umsatz) else "Entnahme"
-                processed_dict["Notiz"] = memo_processor.note
+            if processed_dict:
+                record = make_transaction(date, umsatz, processed_dict)
+            else:
+                type = Typ.EINLAGE if is_credit else Typ.ENTNAHME
+                record = Transaction(date, type, umsatz, note=note)
 
-            out_dict.update(processed_dict)
+            if memo_warnings and diagnostics is not None:
+                for kind, field in memo_warnings:
+                    diagnostics.add(kind, rows_read, rule, field, note)
 
-        transaction_writer.writerow(out_dict)
+        if stats is not None:
+            stats.count(record)
+        yield record
+
+
+def process_transactions(transaction_reader, transaction_writer, header_offset):
+    """Process transactions and write them with a csv.writer to the output file"""
+    rows_written = 0
+    for record in iter_transactions(transaction_reader, header_offset):
+        transaction_writer.writerow(record)
         rows_written += 1
 
     return rows_written
 
 
+def iter_lines(chunks, encoding=INPUT_ENCODING):
+    """Split an iterable of text or bytes chunks or a memory-mapped file into
+    lines
+
+    Bytes are decoded incrementally, so chunks may end anywhere, even within a
+    character. The lines of a memory-mapped file are decoded one at a time as
+    they are reached. Lines keep their line endings, as csv.reader expects.
+    """
+    # A memory-mapped file can only be given once mmap was imported
+    mmap = sys.modules.get("mmap")
+    if mmap is not None and isinstance(chunks, mmap.mmap):
+        for line in iter(chunks.readline, b""):
+            yield line.decode(encoding)
+        return
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ""
+    for chunk in chunks:
+        if isinstance(chunk, bytes):
+            chunk = decoder.decode(chunk)
+        pending += chunk
+        lines = pending.split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def filter_rows(transaction_reader, row_filter):
+    """Replace the rows for which row_filter returns False by None"""
+    for row in transaction_reader:
+        yield row if row_filter(row) else None
+
+
+def column_projection(header):
+    """Return a function that picks COLUMNS from the fields of a row
+
+    The function returns a tuple. Columns that are not in the header and fields
+    beyond the end of a short row are None. Raises ConversionError if one of
+    REQUIRED_COLUMNS is not in the header.
+    """
+    for column in REQUIRED_COLUMNS:
+        if column not in header:
+            raise ConversionError(f'Column "{column}" not found in the header')
+    positions = [
+        header.index(column) if column in header else None for column in COLUMNS
+    ]
+
+    def project_slowly(fields):
+        count = len(fields)
+        return tuple(
+            fields[position] if position is not None and position < count else None
+            for position in positions
+        )
+
+    # Usually only columns at the end of COLUMNS are missing
+    found = len(positions)
+    while positions[found - 1] is None:
+        found -= 1
+    if None in positions[:found]:
+        return project_slowly
+    pick = itemgetter(*positions[:found])
+    width = max(positions[:found]) + 1
+    missing = (None,) * (len(positions) - found)
+
+    def project(fields):
+        if len(fields) < width:
+            return project_slowly(fields)
+        return pick(fields) + missing
+
+    return project
+
+
+def read_transactions(chunks, encoding=INPUT_ENCODING, row_filter=None, stats=None):
+    """Find the header of an MLP export and return a reader for its rows
+
+    Returns the reader, which yields one tuple of COLUMNS per row, and the line
+    offset of the header. Quoted fields may span several lines. Empty lines are
+    skipped.
+    """
+    lines = iter_lines(chunks, encoding)
+    find_header = search_header
+    if stats is not None:
+        find_header = stats.time_call("header", find_header)
+    header, header_offset = find_header(lines)
+    transaction_reader = map(
+        column_projection(header),
+        filter(None, csv.reader(lines, delimiter=";", quotechar='"')),
+    )
+    if row_filter is not None:
+        transaction_reader = filter_rows(transaction_reader, row_filter)
+    return transaction_reader, header_offset
+
+
+def convert_stream(
+    chunks,
+    encoding=INPUT_ENCODING,
+    diagnostics=None,
+    row_filter=None,
+    memo_cache=None,
+    stats=None,
+    columnar=False,
+    securities=None,
+):
+    """Convert an MLP export to Portfolio Performance records
+
+    Takes any iterable of lines or bytes chunks of the export, e.g. an open file
+    or sys.stdin.buffer, and yields one Transaction record per
+    transaction. The input is consumed lazily, so memory use does not grow with
+    the size of the export. Rows for which `row_filter` returns False are not
+    converted. With `columnar` the amounts are converted a chunk at a time,
+    with NumPy if it is installed. Stock names are looked up in `securities` if
+    a securities master is given. Raises ConversionError if there is no header.
+    """
+    transaction_reader, header_offset = read_transactions(
+        chunks, encoding, row_filter, stats
+    )
+    yield from iter_transactions(
+        transaction_reader,
+        header_offset,
+        diagnostics,
+        memo_cache,
+        stats,
+        columnar,
+        securities,
+    )
+
+
+def iter_row_chunks(transaction_reader, header_offset, chunk_size=CHUNK_SIZE):
+    """Split the rows of a reader into lists of at most chunk_size rows
+
+    Yields each chunk together with the line offset of its first row, so line
+    numbers in warnings are the same as when the rows are converted at once.
+    """
+    chunk = []
+    for row in transaction_reader:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk, header_offset
+            header_offset += chunk_size
+            chunk = []
+    if chunk:
+        yield chunk, header_offset
+
+
+def convert_chunk(
+    rows,
+    header_offset,
+    cache_size=None,
+    collect_stats=False,
+    columnar=False,
+    securities=None,
+):
+    """Convert a chunk of rows
+
+    Memos are classified through a MemoCache of cache_size entries if it is
+    given. With `columnar` the amounts are converted at once. A securities
+    master loaded from a file is opened once per worker process. Returns the
+    records, the Diagnostics, the cache statistics and, with collect_stats, a
+    ConversionStats of the chunk.
+    """
+    from conversion_stats import ConversionStats
+    from diagnostics import Diagnostics
+
+    diagnostics = Diagnostics()
+    memo_cache = MemoCache(cache_size) if cache_size else None
+    stats = ConversionStats() if collect_stats else None
+    records = list(
+        iter_transactions(
+            rows,
+            header_offset,
+            diagnostics,
+            memo_cache,
+            stats,
+            columnar,
+            securities,
+        )
+    )
+    return records, diagnostics, memo_cache and memo_cache.cache_info(), stats
+
+
+def convert_stream_parallel(
+    chunks,
+    jobs=None,
+    chunk_size=CHUNK_SIZE,
+    encoding=INPUT_ENCODING,
+    diagnostics=None,
+    row_filter=None,
+    memo_cache=None,
+    stats=None,
+    columnar=False,
+    securities=None,
+):
+    """Convert an MLP export like convert_stream, using several processes
+
+    The rows are split into chunks of chunk_size transactions that `jobs` worker
+    processes convert. The records are yielded in their original order. At most
+    two chunks per worker are in flight, so memory use stays bounded.
+    `row_filter` runs in the calling process. Each chunk gets its own cache of
+    the size of `memo_cache`, whose hit and miss counts add up the chunks. The
+    same goes for the diagnostics and statistics of the chunks.
+    """
+    cache_size = memo_cache.maxsize if memo_cache is not None else None
+    collect_stats = stats is not None
+    transaction_reader, header_offset = read_transactions(
+        chunks, encoding, row_filter, stats
+    )
+    if collect_stats:
+        transaction_reader = stats.time_iter("read", transaction_reader)
+    from concurrent.futures import ProcessPoolExecutor
+
+    jobs = jobs or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending = deque()
+        for rows, offset in iter_row_chunks(
+            transaction_reader, header_offset, chunk_size
+        ):
+            pending.append(
+                executor.submit(
+                    convert_chunk,
+                    rows,
+                    offset,
+                    cache_size,
+                    collect_stats,
+                    columnar,
+                    securities,
+                )
+            )
+            if len(pending) == 2 * jobs:
+                yield from _chunk_records(
+                    pending.popleft(), diagnostics, memo_cache, stats
+                )
+        while pending:
+            yield from _chunk_records(pending.popleft(), diagnostics, memo_cache, stats)
+
+
+def _chunk_records(future, diagnostics, memo_cache, stats):
+    records, chunk_diagnostics, cache_info, chunk_stats = future.result()
+    if diagnostics is not None:
+        diagnostics.merge(chunk_diagnostics)
+    if memo_cache is not None:
+        memo_cache.hits += cache_info.hits
+        memo_cache.misses += cache_info.misses
+    if stats is not None:
+        stats.merge(chunk_stats)
+    return records
+
+
+def write_records(records, csv_output, stats=None, header=None):
+    """Write records to a Portfolio Performance CSV file
+
+    The header is written if `header` is true, by default if the file is empty.
+    Returns the number of records. The writing is timed in `stats` if a
+    ConversionStats is given.
+    """
+    transaction_writer = csv.writer(csv_output, delimiter=";")
+    if header is None:
+        header = csv_output.tell() == 0
+    if header:
+        transaction_writer.writerow(FIELD_NAMES)
+    writerow = transaction_writer.writerow
+    if stats is not None:
+        writerow = stats.time_call("write", writerow)
+    row_cnt = 0
+    for record in records:
+        writerow(record)
+        row_cnt += 1
+    return row_cnt
+
+
+def sort_date(date):
+    """Turn a date like 05.03.2024 into 20240305, which sorts by date"""
+    return date[6:10] + date[3:5] + date[0:2]
+
+
+def record_date(record):
+    """Sort key of a record by its date"""
+    return sort_date(record.date)
+
+
+def read_account(input_file):
+    """Return the account number of the "Konto" line above the header of an MLP
+    export, or an empty string if there is none
+    """
+    with open_export(input_file) as chunks:
+        for line in islice(iter_lines(chunks), HEADER_LINES):
+            fields = line.strip().replace('"', "").split(";")
+            if "Buchungstag" in fields:
+                break
+            if fields[0] == "Konto" and len(fields) > 1:
+                return fields[1]
+    return ""
+
+
+def convert_stream_fingerprinted(chunks, account="", **options):
+    """Convert an MLP export like convert_stream, with the input of each record
+
+    Yields (key, record) pairs, where the key is `account` and the fingerprint
+    of the input row of the record (see transaction_index.fingerprint). The
+    keyword arguments are those of convert_stream except `row_filter`.
+    """
+    from transaction_index import fingerprint
+
+    fingerprints = deque()
+
+    def remember(row):
+        # Saldo lines are skipped by iter_transactions and get no record
+        if row[REFERENCE_COLUMN] not in SALDO_REFERENCES:
+            fingerprints.append((account, fingerprint(row)))
+        return True
+
+    for record in convert_stream(chunks, row_filter=remember, **options):
+        yield fingerprints.popleft(), record
+
+
+def _dated_records(stream, source, name):
+    previous = None
+    for key, record in stream:
+        date = sort_date(record.date)
+        if previous is not None and date > previous:
+            raise ConversionError(
+                f'"{name}" is not sorted by Buchungstag, newest first'
+            )
+        previous = date
+        yield date, source, key, record
+
+
+def merge_records(streams, names):
+    """Merge the records of several exports by date and drop duplicates
+
+    Every stream yields the (key, record) pairs of one export, newest first like
+    MLP exports them, as convert_stream_fingerprinted does. `names` names the
+    exports in errors. The merged records are newest first as well. A
+    transaction whose key occurs in several exports is kept as often as it
+    occurs in one of them, so identical transactions within an export are kept,
+    as are transactions of different accounts that convert to the same record.
+    Duplicates share their date, so the hash index only holds the keys of one
+    day. Raises ConversionError if an export is not sorted by date.
+    """
+    import heapq
+
+    merged = heapq.merge(
+        *(
+            _dated_records(records, source, name)
+            for source, (records, name) in enumerate(zip(streams, names))
+        ),
+        key=itemgetter(0),
+        reverse=True,
+    )
+    day = None
+    kept = Counter()
+    seen = Counter()
+    for date, source, key, record in merged:
+        if date != day:
+            day = date
+            kept.clear()
+            seen.clear()
+        seen[source, key] += 1
+        if seen[source, key] > kept[key]:
+            kept[key] += 1
+            yield record
+
+
+def sort_records(records, buffer_size=SORT_BUFFER_SIZE, merge_width=SORT_MERGE_WIDTH):
+    """Sort records by date, oldest first
+
+    Records of the same date keep their order. At most buffer_size records are
+    held in memory: larger inputs are sorted in runs of buffer_size records that
+    are spilled to temporary files and merged, at most merge_width runs at a
+    time. Raises ValueError if buffer_size is less than 1 or merge_width less
+    than 2.
+    """
+    if buffer_size < 1:
+        raise ValueError("The sort buffer must hold at least one transaction")
+    if merge_width < 2:
+        raise ValueError("At least two sorted runs have to be merged at once")
+    records = iter(records)
+    run = sorted(islice(records, buffer_size), key=record_date)
+    if len(run) < buffer_size:
+        yield from run
+        return
+    import heapq
+    import tempfile
+
+    spilled = []
+
+    def spill(sorted_records):
+        run_file = tempfile.TemporaryFile("w+", newline="", encoding="utf-8")
+        spilled.append(run_file)
+        csv.writer(run_file).writerows(sorted_records)
+        run_file.seek(0)
+        return run_file
+
+    def merge(run_files):
+        # heapq.merge prefers earlier runs on ties, which keeps the sort stable
+        return heapq.merge(
+            *(map(Transaction._make, csv.reader(run_file)) for run_file in run_files),
+            key=record_date,
+        )
+
+    def merge_to_file(run_files):
+        run_file = spill(merge(run_files))
+        for merged_file in run_files:
+            merged_file.close()
+        return run_file
+
+    try:
+        # Runs by level: merge_width runs of a level are merged into one run of
+        # the next level, so higher levels hold the earlier records
+        levels = [[]]
+        while run:
+            levels[0].append(spill(run))
+            level = 0
+            while len(levels[level]) == merge_width:
+                if level + 1 == len(levels):
+                    levels.append([])
+                levels[level + 1].append(merge_to_file(levels[level]))
+                levels[level] = []
+                level += 1
+            run = sorted(islice(records, buffer_size), key=record_date)
+        runs = [run_file for level in reversed(levels) for run_file in level]
+        while len(runs) > merge_width:
+            runs = [
+                merge_to_file(runs[start : start + merge_width])
+                for start in range(0, len(runs), merge_width)
+            ]
+        yield from merge(runs)
+    finally:
+        for run_file in spilled:
+            run_file.close()
+
+
+def merge_files(
+    input_files,
+    output_file,
+    diagnostics=None,
+    memo_cache=None,
+    stats=None,
+    columnar=False,
+    securities=None,
+    ledger=None,
+    account="",
+    sort=False,
+    sort_buffer=SORT_BUFFER_SIZE,
+):
+    """Convert several MLP exports into one Portfolio Performance CSV file
+
+    The exports are converted side by side and their transactions merged by
+    date with merge_records, so overlapping exports of one or several accounts
+    give one file without duplicates. Transactions are told apart by the account
+    of the "Konto" line of their export (see read_account). Only one transaction
+    per export, or one chunk with `columnar`, is held at a time. Warnings in
+    `diagnostics` name the export they are about. The other arguments are those
+    of convert_file. Returns the number of transactions written.
+    """
+    from diagnostics import Diagnostics
+
+    file_diagnostics = [Diagnostics() for _ in input_files]
+    with contextlib.ExitStack() as stack:
+        streams = [
+            convert_stream_fingerprinted(
+                stack.enter_context(open_export(input_file)),
+                account=read_account(input_file),
+                diagnostics=export_diagnostics,
+                memo_cache=memo_cache,
+                stats=stats,
+                columnar=columnar,
+                securities=securities,
+            )
+            for input_file, export_diagnostics in zip(input_files, file_diagnostics)
+        ]
+        csv_output = stack.enter_context(open_output(output_file))
+        records = merge_records(streams, input_files)
+        if sort:
+            records = sort_records(records, sort_buffer)
+        if ledger is not None:
+            records = ledger.add(records, account)
+        row_cnt = write_records(records, csv_output, stats, header=True)
+    if diagnostics is not None:
+        for input_file, export_diagnostics in zip(input_files, file_diagnostics):
+            diagnostics.merge(export_diagnostics, input_file)
+    if stats is not None:
+        stats.finish()
+    return row_cnt
+
+
+def batch_writer(csv_output, stats=None, header=True):
+    """Return a function that writes lists of records to a CSV file
+
+    The header is written right away if `header` is true. The writing is timed
+    in `stats` if a ConversionStats is given.
+    """
+    transaction_writer = csv.writer(csv_output, delimiter=";")
+    if header:
+        transaction_writer.writerow(FIELD_NAMES)
+    writerows = transaction_writer.writerows
+    if stats is not None:
+        writerows = stats.time_call("write", writerows)
+    return writerows
+
+
+def convert_file(
+    input_file,
+    output_file,
+    diagnostics=None,
+    jobs=1,
+    row_filter=None,
+    append=False,
+    memo_cache=None,
+    stats=None,
+    columnar=False,
+    securities=None,
+    ledger=None,
+    account="",
+    sort=False,
+    sort_buffer=SORT_BUFFER_SIZE,
+    pipeline=None,
+):
+    """Convert an MLP export file to a Portfolio Performance CSV file
+
+    Returns the number of converted transactions. With jobs other than 1 the
+    transactions are converted by that many processes (None: one per CPU); the
+    output is the same. With `append` the transactions are appended to an
+    existing output file once all of them are converted, so a failed conversion
+    leaves it as it was; zip files cannot be appended to. Warnings are collected
+    in `diagnostics` if a Diagnostics collector is given. The conversion is
+    instrumented if a ConversionStats is given as `stats`. With `columnar` the
+    amounts are converted a chunk at a time. Stock names are looked up in
+    `securities` if a securities master is given. The transactions are also
+    stored in `ledger` under `account` if a Ledger is given. With `sort` the
+    transactions are written oldest first, sorting at most `sort_buffer` of them
+    in memory at a time. With a Pipeline as `pipeline` the transactions are
+    read, converted and written by its threads; `jobs` is then ignored. An
+    uncompressed input file is memory-mapped, a compressed one is decompressed
+    while it is read (see open_export). The output file is compressed if its
+    name ends in .gz, .xz or .zip. Raises ConversionError if the input cannot be
+    converted and OSError if a file cannot be opened.
+    """
+    header = not (
+        append and os.path.exists(output_file) and os.path.getsize(output_file)
+    )
+    target_file = output_file
+    if append:
+        if compression_of(output_file) == ".zip":
+            raise ValueError(f'Cannot append to the zip file "{output_file}"')
+        # The transactions are collected in a part file next to the output
+        target_file = (
+            f"{strip_compression(output_file)}.part{compression_of(output_file)}"
+        )
+    try:
+        with open_export(input_file) as csv_input, open_output(
+            target_file
+        ) as csv_output:
+            if pipeline is not None:
+                transaction_reader, header_offset = read_transactions(
+                    csv_input, row_filter=row_filter, stats=stats
+                )
+                records = iter_transactions(
+                    pipeline.read(transaction_reader),
+                    header_offset,
+                    diagnostics,
+                    memo_cache,
+                    stats,
+                    columnar,
+                    securities,
+                )
+            elif jobs == 1:
+                records = convert_stream(
+                    csv_input,
+                    diagnostics=diagnostics,
+                    row_filter=row_filter,
+                    memo_cache=memo_cache,
+                    stats=stats,
+                    columnar=columnar,
+                    securities=securities,
+                )
+            else:
+                records = convert_stream_parallel(
+                    csv_input,
+                    jobs=jobs,
+                    diagnostics=diagnostics,
+                    row_filter=row_filter,
+                    memo_cache=memo_cache,
+                    stats=stats,
+                    columnar=columnar,
+                    securities=securities,
+                )
+            if sort:
+                records = sort_records(records, sort_buffer)
+            if ledger is not None:
+                records = ledger.add(records, account)
+            if pipeline is not None:
+                row_cnt = pipeline.write(
+                    records, batch_writer(csv_output, stats, header)
+                )
+            else:
+                row_cnt = write_records(records, csv_output, stats, header)
+        if append:
+            append_file(target_file, output_file)
+    finally:
+        if append and os.path.exists(target_file):
+            os.remove(target_file)
+    if stats is not None:
+        stats.finish()
+    return row_cnt
+
+
 def main():
     """Main function"""
+    import argparse  # command line arguments parser
+
     arg_parser = argparse.ArgumentParser()
-    arg_parser.add_argument("infile", help="Input CSV file from MLP bank")
     arg_parser.add_argument(
-        "-o", "--outfile", help="Name of the converted output CSV file"
+        "infile",
+        nargs="+",
+        help="Input CSV file from MLP bank, may be compressed (.gz, .xz, .zip); "
+        "several exports are merged by date into one output file without "
+        "duplicate transactions",
+    )
+    arg_parser.add_argument(
+        "-o",
+        "--outfile",
+        help="Name of the converted output CSV file, compressed if it ends in "
+        ".gz, .xz or .zip",
+    )
+    arg_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of processes converting the transactions (0: one per CPU)",
+    )
+    arg_parser.add_argument(
+        "-s",
+        "--state",
+        help="State file of an incremental conversion: only transactions that are "
+        "not in it are converted and appended to the output file",
+    )
+    arg_parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=MEMO_CACHE_SIZE,
+        help="Number of classified memos to remember (0: no cache)",
+    )
+    arg_parser.add_argument(
+        "--columnar",
+        action="store_true",
+        help="Convert the amounts a chunk at a time, with NumPy if it is installed",
+    )
+    arg_parser.add_argument(
+        "--sort",
+        action="store_true",
+        help="Write the transactions oldest first instead of newest first",
+    )
+    arg_parser.add_argument(
+        "--sort-buffer",
+        type=int,
+        default=SORT_BUFFER_SIZE,
+        help="Number of transactions --sort holds in memory, more are sorted in "
+        "temporary files (default: %(default)s)",
+    )
+    arg_parser.add_argument(
+        "--securities",
+        help="Securities master (CSV file or SQLite index) to look up stock names "
+        "by ISIN and WKN",
+    )
+    arg_parser.add_argument(
+        "--ledger",
+        help="SQLite ledger to store the transactions in as well, see ledger.py",
+    )
+    arg_parser.add_argument(
+        "--account",
+        default="",
+        help="Account the transactions are stored under in the ledger",
+    )
+    arg_parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Read, convert and write the transactions in separate threads, "
+        "which helps on slow file systems",
+    )
+    arg_parser.add_argument(
+        "--stats",
+        nargs="?",
+        const="text",
+        choices=["text", "json"],
+        help="Report the time per stage, rows/s, transaction types, rule hits and "
+        "slowest memos as text (default) or JSON",
+    )
+    arg_parser.add_argument(
+        "--warnings",
+        choices=["text", "json", "none"],
+        default="text",
+        help="Report the warnings about transactions as text (default), JSON or "
+        "not at all",
+    )
+    arg_parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile the conversion and print the functions with the most time",
     )
     command_args = arg_parser.parse_args()
 
-    input_file = command_args.infile
-    if not os.path.exists(input_file):
-        print_message(f'Error: Input file "{input_file}" does not exist', 31)
+    input_files = command_args.infile
+    for input_file in input_files:
+        if not os.path.exists(input_file):
+            print_message(f'Error: Input file "{input_file}" does not exist', 31)
+            sys.exit(1)
+    input_file = input_files[0]
+    if len(input_files) > 1 and (
+        command_args.jobs != 1 or command_args.state or command_args.pipeline
+    ):
+        print_message(
+            "Error: Several input files cannot be merged with --jobs, --state or "
+            "--pipeline",
+            31,
+        )
+        sys.exit(1)
+    if command_args.pipeline and command_args.jobs != 1:
+        print_message("Error: --pipeline cannot be combined with --jobs", 31)
         sys.exit(1)
 
     output_file = (
         command_args.outfile
         if command_args.outfile
-        else f"{os.path.splitext(input_file)[0]}_converted.csv"
-    )
-
-    csv_input = fileinput.input(files=input_file, mode="r", openhook=opening_hook_csv)
-    header, header_offset = search_header(csv_input)
-    transaction_reader = csv.DictReader(
-        csv_input, fieldnames=header, delimiter=";", quotechar='"'
-    )
-
-    field_names = [
-        "Datum",
-        "Typ",
-        "Wert",
-        "Buchungswährung",
-        "Steuern",
-        "Stück",
-        "ISIN",
-        "WKN",
-        "Ticker-Symbol",
-        "Wertpapiername",
-        "Notiz",
-    ]
-    csv_output = open(output_file, "w", newline="")
-    transaction_writer = csv.DictWriter(
-        csv_output, fieldnames=field_names, delimiter=";"
+        else f"{os.path.splitext(strip_compression(input_file))[0]}_converted.csv"
     )
-    transaction_writer.writeheader()
 
-    row_cnt = process_transactions(
-        transaction_reader, transaction_writer, header_offset
-    )
+    from diagnostics import Diagnostics
+
+    state_file = command_args.state
+    memo_cache = MemoCache(command_args.cache_size) if command_args.cache_size else None
+    diagnostics = Diagnostics()
+    stats = None
+    if command_args.stats:
+        from conversion_stats import ConversionStats
+
+        stats = ConversionStats()
+    profiler = None
+    if command_args.profile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+    errors = (ConversionError, ValueError, OSError)
+    if command_args.securities or command_args.ledger:
+        import sqlite3
+
+        errors += (sqlite3.Error,)
+    try:
+        securities = None
+        if command_args.securities:
+            from securities import open_securities
+
+            securities = open_securities(command_args.securities)
+        ledger = None
+        if command_args.ledger:
+            from ledger import Ledger
+
+            ledger = Ledger(command_args.ledger)
+        pipeline = None
+        if command_args.pipeline:
+            from pipeline import Pipeline
+
+            pipeline = Pipeline()
+        index = None
+        if state_file:
+            from transaction_index import TransactionIndex
+
+            index = TransactionIndex.load(state_file)
+        options = dict(
+            diagnostics=diagnostics,
+            memo_cache=memo_cache,
+            stats=stats,
+            columnar=command_args.columnar,
+            securities=securities,
+            ledger=ledger,
+            account=command_args.account,
+            sort=command_args.sort,
+            sort_buffer=command_args.sort_buffer,
+        )
+        if len(input_files) > 1:
+            convert = functools.partial(
+                merge_files, input_files, output_file, **options
+            )
+        else:
+            convert = functools.partial(
+                convert_file,
+                input_file,
+                output_file,
+                jobs=command_args.jobs or None,
+                row_filter=index.is_new if index is not None else None,
+                append=index is not None,
+                pipeline=pipeline,
+                **options,
+            )
+        row_cnt = profiler.runcall(convert) if profiler is not None else convert()
+    except errors as error:
+        print_message(f"Error: {error}", 31)
+        sys.exit(1)
+    if index is not None:
+        index.save(state_file)
 
+    if diagnostics and command_args.warnings == "text":
+        print_message(diagnostics.to_text(), 33)
+    elif command_args.warnings == "json":
+        print(diagnostics.to_json())
     print_message(f"Success: Converted {row_cnt} transactions", 32)
     print_message(f"Info: Result written to {output_file}", 0)
+    if ledger is not None:
+        print_message(
+            f"Info: {ledger.inserted} new transactions stored in {command_args.ledger}",
+            0,
+        )
+        ledger.close()
+    if pipeline is not None:
+        print_message(f"Info: {pipeline.report()}", 0)
+    if memo_cache is not None:
+        cache_info = memo_cache.cache_info()
+        print_message(
+            f"Info: Memo cache {cache_info.hits} hits, {cache_info.misses} misses",
+            0,
+        )
+    if stats is not None:
+        print(stats.to_json() if command_args.stats == "json" else stats.to_text())
+    if profiler is not None:
+        import pstats
 
-    csv_input.close()
-    csv_output.close()
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(PROFILE_LINES)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,69 @@
+"""Amounts of money in integer cents
+
+Amounts are parsed from the English format of the MLP export and the German
+format of the transaction texts straight into cents and formatted in the German
+format of Portfolio Performance, so no float rounding happens in between.
+"""
+
+
+class Money(int):
+    """Amount of money in cents
+
+    str() gives the German format, e.g. -1.234,56. Sums and differences of
+    Money are Money.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def parse(cls, text, thousands_separator, decimal_separator, rounded=False):
+        """Parse an amount with an optional minus sign and up to two decimals
+
+        With `rounded` more decimals are allowed and rounded half up to cents.
+        Raises ValueError if the text is no such amount.
+        """
+        text = text.strip()
+        units, _, decimals = (
+            text.lstrip("-")
+            .replace(thousands_separator, "")
+            .partition(decimal_separator)
+        )
+        if not (units + decimals).isdigit() or (len(decimals) > 2 and not rounded):
+            raise ValueError(f'Invalid amount "{text}"')
+        cents = int(units or "0") * 100 + int(decimals[:2].ljust(2, "0"))
+        if decimals[2:3] >= "5":
+            cents += 1
+        return cls(-cents if text.startswith("-") else cents)
+
+    @classmethod
+    def from_english(cls, text, rounded=False):
+        """Parse an amount like -1,234.56"""
+        return cls.parse(text, ",", ".", rounded)
+
+    @classmethod
+    def from_german(cls, text, rounded=False):
+        """Parse an amount like -1.234,56"""
+        return cls.parse(text, ".", ",", rounded)
+
+    def __add__(self, other):
+        if not isinstance(other, int):
+            return NotImplemented
+        return Money(int(self) + other)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if not isinstance(other, int):
+            return NotImplemented
+        return Money(int(self) - other)
+
+    def __neg__(self):
+        return Money(-int(self))
+
+    def __str__(self):
+        units, cents = divmod(abs(self), 100)
+        sign = "-" if self < 0 else ""
+        return f"{sign}{units:,}".replace(",", ".") + f",{cents:02d}"
+
+    def __repr__(self):
+        return f"Money({int(self)})"
@@ -0,0 +1,179 @@
+"""Threaded pipeline of a conversion
+
+The rows of an export are read in a reader thread, classified in the calling
+thread and written in a writer thread. The stages pass batches of rows and
+records through bounded queues, so memory stays capped however far a stage runs
+ahead, and the order of the rows is kept. The first error of any stage stops all
+of them and is raised in the calling thread.
+"""
+
+import queue
+import threading
+import time
+from itertools import islice
+
+# Number of rows or records passed between two stages at once
+PIPELINE_BATCH_SIZE = 500
+# Number of batches a queue between two stages holds
+PIPELINE_QUEUE_SIZE = 8
+# Seconds a blocked stage waits before it checks if the pipeline stopped
+POLL_INTERVAL = 0.1
+
+
+class PipelineStopped(Exception):
+    """Raised in a stage when another stage failed"""
+
+
+class StageQueue:
+    """Bounded queue between two stages that records its occupancy
+
+    The occupancy is sampled whenever a batch is put into the queue.
+    """
+
+    def __init__(self, maxsize, stop):
+        self.queue = queue.Queue(maxsize)
+        self.maxsize = maxsize
+        self.stop = stop
+        self.samples = 0
+        self.total = 0
+        self.peak = 0
+
+    def put(self, batch):
+        size = self.queue.qsize()
+        self.samples += 1
+        self.total += size
+        self.peak = max(self.peak, size)
+        while not self.stop.is_set():
+            try:
+                self.queue.put(batch, timeout=POLL_INTERVAL)
+                return
+            except queue.Full:
+                pass
+        raise PipelineStopped
+
+    def get(self):
+        while not self.stop.is_set():
+            try:
+                return self.queue.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                pass
+        raise PipelineStopped
+
+    def occupancy(self):
+        """Return the mean number of batches in the queue"""
+        return self.total / self.samples if self.samples else 0.0
+
+
+class Pipeline:
+    """Reader, classification and writer stage of one conversion
+
+    read() starts the reader thread, write() the writer thread and runs the
+    classification. An empty batch ends the rows or records.
+    """
+
+    def __init__(self, batch_size=PIPELINE_BATCH_SIZE, queue_size=PIPELINE_QUEUE_SIZE):
+        self.batch_size = batch_size
+        self.stop = threading.Event()
+        self.read_queue = StageQueue(queue_size, self.stop)
+        self.write_queue = StageQueue(queue_size, self.stop)
+        self.error = None
+        self._error_lock = threading.Lock()
+        self.threads = []
+        self.rows = 0
+        self.started = None
+        self.seconds = 0.0
+
+    def _start(self, target, *args):
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        thread.start()
+        self.threads.append(thread)
+
+    def _fail(self, error):
+        with self._error_lock:
+            if self.error is None:
+                self.error = error
+        self.stop.set()
+
+    def read(self, rows):
+        """Read an iterable of rows in the reader thread
+
+        Returns a generator of the rows for the classification stage.
+        """
+        self.started = time.perf_counter()
+        self._start(self._read, rows)
+        return self._rows()
+
+    def _read(self, rows):
+        try:
+            rows = iter(rows)
+            while True:
+                batch = list(islice(rows, self.batch_size))
+                self.read_queue.put(batch)
+                if not batch:
+                    return
+        except PipelineStopped:
+            pass
+        except BaseException as error:
+            self._fail(error)
+
+    def _rows(self):
+        while True:
+            batch = self.read_queue.get()
+            if not batch:
+                return
+            yield from batch
+
+    def write(self, records, write_batch):
+        """Classify the records and write them with write_batch in batches
+
+        The records are consumed in the calling thread, which runs the
+        classification, and write_batch is called with lists of records in the
+        writer thread. Returns the number of records. Raises the first error of
+        any stage once all stages stopped.
+        """
+        if self.started is None:
+            self.started = time.perf_counter()
+        self._start(self._write, write_batch)
+        try:
+            records = iter(records)
+            while True:
+                batch = list(islice(records, self.batch_size))
+                self.rows += len(batch)
+                self.write_queue.put(batch)
+                if not batch:
+                    break
+        except PipelineStopped:
+            pass
+        except BaseException as error:
+            self._fail(error)
+        for thread in self.threads:
+            thread.join()
+        self.seconds = time.perf_counter() - self.started
+        if self.error is not None:
+            raise self.error
+        return self.rows
+
+    def _write(self, write_batch):
+        try:
+            while True:
+                batch = self.write_queue.get()
+                if not batch:
+                    return
+                write_batch(batch)
+        except PipelineStopped:
+            pass
+        except BaseException as error:
+            self._fail(error)
+
+    def report(self):
+        """Return the throughput and the queue occupancy as a line of text"""
+        rows_per_second = self.rows / self.seconds if self.seconds else 0.0
+        queues = ", ".join(
+            f"{name} queue {stage_queue.occupancy():.1f} of {stage_queue.maxsize} "
+            f"batches on average (peak {stage_queue.peak})"
+            for name, stage_queue in (
+                ("read", self.read_queue),
+                ("write", self.write_queue),
+            )
+        )
+        return f"Pipeline {rows_per_second:,.0f} rows/s, {queues}"
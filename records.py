@@ -0,0 +1,93 @@
+"""Records of the Portfolio Performance CSV file
+
+A Transaction is a tuple of the columns of the CSV file in the order of
+FIELD_NAMES, so csv.writer writes it as it is and a kept record costs no more
+than its values.
+"""
+
+from collections import namedtuple
+from enum import Enum
+
+# Columns of the Portfolio Performance CSV file
+FIELD_NAMES = [
+    "Datum",
+    "Typ",
+    "Wert",
+    "Buchungswährung",
+    "Steuern",
+    "Stück",
+    "ISIN",
+    "WKN",
+    "Ticker-Symbol",
+    "Wertpapiername",
+    "Notiz",
+]
+FIELD_INDEX = {name: index for index, name in enumerate(FIELD_NAMES)}
+
+
+class Typ(str, Enum):
+    """Transaction types of Portfolio Performance
+
+    The members are strings that compare, hash and print like their values.
+    """
+
+    __str__ = str.__str__
+    __hash__ = str.__hash__
+
+    EINLAGE = "Einlage"
+    ENTNAHME = "Entnahme"
+    KAUF = "Kauf"
+    VERKAUF = "Verkauf"
+    DIVIDENDE = "Dividende"
+    ZINSEN = "Zinsen"
+    STEUERN = "Steuern"
+    STEUERRUECKERSTATTUNG = "Steuerrückerstattung"
+    GEBUEHREN = "Gebühren"
+    GEBUEHRENERSTATTUNG = "Gebührenerstattung"
+
+
+class Transaction(
+    namedtuple(
+        "Transaction",
+        "date type amount currency taxes pieces isin wkn ticker name note",
+        defaults=("EUR", "", "", "", "", "", "", ""),
+    )
+):
+    """Transaction of the Portfolio Performance CSV file
+
+    The fields are the columns of FIELD_NAMES. Besides by attribute and position,
+    a column can be read by its name like from a dict, e.g. record["Typ"].
+    """
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            key = FIELD_INDEX[key]
+        return tuple.__getitem__(self, key)
+
+    def as_dict(self):
+        """Return the record as a dict keyed by FIELD_NAMES"""
+        return dict(zip(FIELD_NAMES, self))
+
+
+def make_transaction(date, amount, fields):
+    """Create a Transaction of a date, an amount and the dict of the other columns
+
+    `fields` is keyed by FIELD_NAMES like the dicts of MemoProcessor.process.
+    Missing columns are empty.
+    """
+    get = fields.get
+    return Transaction(
+        date,
+        get("Typ", ""),
+        amount,
+        "EUR",
+        get("Steuern", ""),
+        get("Stück", ""),
+        get("ISIN", ""),
+        get("WKN", ""),
+        "",
+        get("Wertpapiername", ""),
+        get("Notiz", ""),
+    )
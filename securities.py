@@ -0,0 +1,181 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""Securities master to resolve WKNs and ISINs to names
+
+Input:  A CSV file with the columns ISIN, WKN and Name (semicolon separated,
+        UTF-8), or an SQLite index built from such a file.
+Output: The names of securities by ISIN or WKN.
+
+A CSV file is loaded into dicts keyed by ISIN and WKN. For very large lists of
+instruments the CSV file can be turned into a read-only SQLite index once, which
+is then queried on demand through a bounded cache instead of being loaded.
+
+Usage: python securities.py master.csv master.db
+"""
+
+import argparse
+import csv
+import functools
+import os
+import sqlite3
+import sys
+from urllib.request import pathname2url
+
+from mlp_to_portfolio_performance_converter import print_message
+
+MASTER_COLUMNS = ("ISIN", "WKN", "Name")
+# Number of lookups a SecuritiesIndex remembers
+SECURITY_CACHE_SIZE = 4096
+SQLITE_MAGIC = b"SQLite format 3\x00"
+
+
+def read_master(path):
+    """Read the (ISIN, WKN, name) rows of a securities master CSV file
+
+    Raises ValueError if a column is missing.
+    """
+    with open(path, newline="", encoding="utf-8-sig") as master_file:
+        reader = csv.DictReader(master_file, delimiter=";")
+        missing = [
+            name for name in MASTER_COLUMNS if name not in (reader.fieldnames or [])
+        ]
+        if missing:
+            raise ValueError(f'Column "{missing[0]}" not found in "{path}"')
+        for row in reader:
+            yield row["ISIN"].strip(), row["WKN"].strip(), row["Name"].strip()
+
+
+class SecuritiesMaster:
+    """Securities master held in memory, indexed by ISIN and WKN"""
+
+    def __init__(self, by_isin=None, by_wkn=None, path=None):
+        self.by_isin = by_isin or {}
+        self.by_wkn = by_wkn or {}
+        self.path = path
+
+    @classmethod
+    def from_rows(cls, rows, path=None):
+        """Index (ISIN, WKN, name) rows"""
+        master = cls(path=path)
+        for isin, wkn, name in rows:
+            if isin:
+                master.by_isin[isin] = name
+            if wkn:
+                master.by_wkn[wkn] = name
+        return master
+
+    @classmethod
+    def load(cls, path):
+        """Load a securities master CSV file"""
+        return cls.from_rows(read_master(path), path)
+
+    def name(self, isin="", wkn=""):
+        """Return the name of a security by ISIN or else WKN, empty if unknown"""
+        return self.by_isin.get(isin) or self.by_wkn.get(wkn, "")
+
+    def __len__(self):
+        return max(len(self.by_isin), len(self.by_wkn))
+
+    def __reduce__(self):
+        # A master loaded from a file is sent to worker processes by name
+        if self.path is not None:
+            return open_securities, (self.path,)
+        return SecuritiesMaster, (self.by_isin, self.by_wkn)
+
+
+class SecuritiesIndex:
+    """Securities master in a read-only SQLite index built by build_index
+
+    Lookups go through an LRU cache of cache_size entries.
+    """
+
+    def __init__(self, path, cache_size=SECURITY_CACHE_SIZE):
+        self.path = path
+        uri = f"file:{pathname2url(os.path.abspath(path))}?mode=ro"
+        self.connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        self.name = functools.lru_cache(maxsize=cache_size)(self._name)
+
+    def _name(self, isin="", wkn=""):
+        """Return the name of a security by ISIN or else WKN, empty if unknown"""
+        row = None
+        if isin:
+            row = self.connection.execute(
+                "SELECT name FROM securities WHERE isin = ?", (isin,)
+            ).fetchone()
+        if row is None and wkn:
+            row = self.connection.execute(
+                "SELECT name FROM securities WHERE wkn = ?", (wkn,)
+            ).fetchone()
+        return row[0] if row else ""
+
+    def cache_info(self):
+        """Return the hit and miss statistics of the lookup cache"""
+        return self.name.cache_info()
+
+    def __len__(self):
+        return self.connection.execute("SELECT count(*) FROM securities").fetchone()[0]
+
+    def __reduce__(self):
+        return open_securities, (self.path,)
+
+
+def build_index(master_file, index_file):
+    """Build an SQLite index of a securities master CSV file
+
+    Returns the number of securities. The index replaces index_file only once it
+    is complete.
+    """
+    temp_file = index_file + ".tmp"
+    if os.path.exists(temp_file):
+        os.remove(temp_file)
+    connection = sqlite3.connect(temp_file)
+    try:
+        with connection:
+            connection.execute(
+                "CREATE TABLE securities (isin TEXT, wkn TEXT, name TEXT)"
+            )
+            connection.executemany(
+                "INSERT INTO securities VALUES (?, ?, ?)", read_master(master_file)
+            )
+            connection.execute("CREATE INDEX securities_isin ON securities (isin)")
+            connection.execute("CREATE INDEX securities_wkn ON securities (wkn)")
+        count = connection.execute("SELECT count(*) FROM securities").fetchone()[0]
+    finally:
+        connection.close()
+    os.replace(temp_file, index_file)
+    return count
+
+
+@functools.lru_cache(maxsize=None)
+def open_securities(path):
+    """Open a securities master, once per process
+
+    Returns a SecuritiesIndex for an SQLite index and a SecuritiesMaster for a
+    CSV file. Raises OSError if the file cannot be read and ValueError if it is
+    no securities master.
+    """
+    with open(path, "rb") as master_file:
+        magic = master_file.read(len(SQLITE_MAGIC))
+    if magic == SQLITE_MAGIC:
+        return SecuritiesIndex(path)
+    return SecuritiesMaster.load(path)
+
+
+def main():
+    """Main function"""
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("infile", help="Securities master CSV file")
+    arg_parser.add_argument("outfile", help="SQLite index to build")
+    command_args = arg_parser.parse_args()
+    try:
+        count = build_index(command_args.infile, command_args.outfile)
+    except (OSError, ValueError, UnicodeError) as error:
+        print_message(f"Error: {error}", 31)
+        sys.exit(1)
+    print_message(f"Success: Indexed {count} securities", 32)
+    print_message(f"Info: Index written to {command_args.outfile}", 0)
+
+
+if __name__ == "__main__":
+    main()
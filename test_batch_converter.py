@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import batch_converter
+from test_mlp_to_portfolio_performance_converter import SAMPLE_EXPORT
+
+
+class TestBatchConverter(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.dir = self.temp_dir.name
+
+    def write_file(self, name, content):
+        path = os.path.join(self.dir, name)
+        with open(path, "wb") as file:
+            file.write(content)
+        return path
+
+    def test_collect_input_files(self):
+        first = self.write_file("a.csv", SAMPLE_EXPORT)
+        second = self.write_file("b.csv", SAMPLE_EXPORT)
+        third = self.write_file("c.csv.gz", b"")
+        self.write_file("a_converted.csv", b"")
+        self.write_file("a_converted.csv.xz", b"")
+        self.write_file("notes.txt", b"")
+        self.assertEqual(
+            batch_converter.collect_input_files([self.dir]), [first, second, third]
+        )
+        self.assertEqual(
+            batch_converter.output_file_for(third),
+            os.path.join(self.dir, "c_converted.csv"),
+        )
+        self.assertEqual(
+            batch_converter.collect_input_files([os.path.join(self.dir, "b*"), first]),
+            [first, second],
+        )
+
+    @patch("builtins.print")
+    def test_convert_files(self, mock_print):
+        good = self.write_file("good.csv", SAMPLE_EXPORT)
+        bad = self.write_file("bad.csv", b"no header here\n")
+        missing = os.path.join(self.dir, "missing.csv")
+
+        results = batch_converter.convert_files([good, bad, missing], jobs=2)
+
+        self.assertEqual(
+            [result.status for result in results], ["success", "failure", "failure"]
+        )
+        self.assertEqual(results[0].rows, 2)
+        self.assertEqual(results[1].error, "Header not found in the file")
+        with open(results[0].output_file, encoding="utf-8") as converted:
+            self.assertEqual(len(converted.readlines()), 3)
+
+    @patch("builtins.print")
+    def test_convert_files_malformed(self, mock_print):
+        good = self.write_file("a.csv", SAMPLE_EXPORT)
+        short_row = b'"01.03.2024";"01.03.2024"\n'
+        malformed = self.write_file("b.csv", SAMPLE_EXPORT + short_row)
+
+        results = batch_converter.convert_files([good, malformed], jobs=2)
+
+        self.assertEqual([result.status for result in results], ["success", "failure"])
+        self.assertTrue(results[1].error)
+        self.assertFalse(os.path.exists(results[1].output_file))
+
+    @patch("builtins.print")
+    def test_convert_files_merged(self, mock_print):
+        first = self.write_file("a.csv", SAMPLE_EXPORT)
+        second = self.write_file("b.csv", SAMPLE_EXPORT)
+        merged = os.path.join(self.dir, "merged.csv")
+
+        results = batch_converter.convert_files([first, second], merged_output=merged)
+
+        self.assertEqual([result.output_file for result in results], [merged] * 2)
+        with open(merged, encoding="utf-8") as converted:
+            lines = converted.readlines()
+        self.assertEqual(len(lines), 5)
+        self.assertTrue(lines[0].startswith("Datum;Typ;"))
+        self.assertEqual(lines[1:3], lines[3:5])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+from unittest.mock import patch
+
+import benchmark
+import mlp_to_portfolio_performance_converter as mppc
+from diagnostics import Diagnostics
+from memo_processor import MemoProcessor
+
+# Transaction type each template is converted to
+EXPECTED_TYPES = {
+    "deposit": "Einlage",
+    "tax_refund": "Steuerrückerstattung",
+    "advance_lump_sum": "Steuern",
+    "sell": "Verkauf",
+    "sell_old": "Verkauf",
+    "buy": "Kauf",
+    "buy_old": "Kauf",
+    "dividend": "Dividende",
+    "dividend_old": "Dividende",
+    "depot_fee": "Gebühren",
+    "collection": "Entnahme",
+    "credit": "Gebührenerstattung",
+    "tax_charge": "Steuern",
+    "church_tax": "Steuern",
+    "soli_tax": "Steuern",
+    "capital_gain_tax": "Steuern",
+    "transfer": "Entnahme",
+}
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_generate_export_is_deterministic(self):
+        self.assertEqual(
+            list(benchmark.generate_export(50, seed=3)),
+            list(benchmark.generate_export(50, seed=3)),
+        )
+        self.assertNotEqual(
+            list(benchmark.generate_export(50, seed=3)),
+            list(benchmark.generate_export(50, seed=4)),
+        )
+
+    def test_templates_convert_without_warnings(self):
+        self.assertEqual(set(benchmark.TEMPLATES), set(EXPECTED_TYPES))
+        for name, expected_type in EXPECTED_TYPES.items():
+            with self.subTest(template=name):
+                row = next(benchmark.generate_transactions(1, mix={name: 1}))
+                processor = MemoProcessor(
+                    row["Verwendungszweck"], 1, not row["Betrag"].startswith("-")
+                )
+                self.assertEqual(processor.process()["Typ"], expected_type)
+                self.assertEqual(processor.warnings, [])
+
+    def test_generated_export_converts(self):
+        diagnostics = Diagnostics()
+        records = list(
+            mppc.convert_stream(benchmark.generate_export(200), diagnostics=diagnostics)
+        )
+        self.assertEqual(len(records), 200)
+        self.assertEqual(len(diagnostics), 0)
+
+    def test_run_benchmarks(self):
+        results = list(benchmark.run_benchmarks([20]))
+        self.assertEqual([result[0] for result in results], benchmark.BENCHMARKS)
+        for name, size, seconds, rate, peak in results:
+            self.assertEqual(size, 20)
+            self.assertGreater(rate, 0)
+
+    def test_run_startup_benchmark(self):
+        results = list(benchmark.run_startup_benchmark(runs=1))
+        self.assertEqual(
+            [result[0] for result in results], ["python", "import", "script", "zipapp"]
+        )
+        for name, median, fastest in results:
+            self.assertGreater(median, 0)
+            self.assertLessEqual(fastest, median)
+
+    def test_converter_defers_imports(self):
+        self.assertEqual(benchmark.eager_imports(), [])
+        with patch.object(benchmark, "eager_imports", return_value=["json"]):
+            with self.assertRaisesRegex(RuntimeError, "json"):
+                list(benchmark.run_startup_benchmark(runs=1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+import zipfile
+
+from benchmark import write_export
+from build_zipapp import MODULES, build_zipapp
+
+
+class TestBuildZipapp(unittest.TestCase):
+    def test_build_zipapp(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            target = build_zipapp(os.path.join(temp_dir, "converter.pyz"))
+            with zipfile.ZipFile(target) as archive:
+                names = set(archive.namelist())
+            for module in MODULES:
+                self.assertIn(module + ".py", names)
+                self.assertIn(module + ".pyc", names)
+
+            export_file = os.path.join(temp_dir, "export.csv")
+            output_file = os.path.join(temp_dir, "export_converted.csv")
+            write_export(export_file, 5)
+            result = subprocess.run(
+                [sys.executable, target, export_file, "-o", output_file],
+                capture_output=True,
+                text=True,
+            )
+            self.assertEqual(result.returncode, 0, result.stderr)
+            self.assertIn("Converted 5 transactions", result.stdout)
+            self.assertTrue(os.path.exists(output_file))
+
+
+if __name__ == "__main__":
+    unittest.main()
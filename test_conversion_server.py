@@ -0,0 +1,139 @@
+import asyncio
+import json
+import unittest
+
+import conversion_server
+from conversion_server import ConversionServer, convert_upload
+from test_mlp_to_portfolio_performance_converter import SAMPLE_EXPORT
+
+
+async def request(port, method, target, body=b""):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    head = f"{method} {target} HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n"
+    writer.write(head.encode("latin-1") + body)
+    await writer.drain()
+    response = await asyncio.wait_for(reader.read(), 10)
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    headers = dict(line.split(": ", 1) for line in lines[1:])
+    return int(lines[0].split()[1]), headers, body
+
+
+class TestConversionServer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = ConversionServer(jobs=1, max_queue=0, max_body=4096)
+        self.addCleanup(self.server.close)
+        self.listener = await self.server.serve(port=0)
+        self.port = self.listener.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.listener.close()
+        await self.listener.wait_closed()
+
+    async def test_convert(self):
+        status, headers, body = await request(
+            self.port, "POST", "/convert", SAMPLE_EXPORT
+        )
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["X-Transactions"], "2")
+        self.assertEqual(headers["X-Warnings"], "0")
+        self.assertEqual(headers["X-Queue-Depth"], "0")
+        self.assertIn("X-Latency-Seconds", headers)
+        self.assertEqual(body, convert_upload(SAMPLE_EXPORT)[0])
+
+    async def test_invalid_export(self):
+        status, _, body = await request(self.port, "POST", "/convert", b"no export")
+        self.assertEqual(status, 422)
+        self.assertEqual(json.loads(body), {"error": "Header not found in the file"})
+
+    async def test_malformed_export(self):
+        short_row = b'"01.03.2024";"01.03.2024"\n'
+        status, _, body = await request(
+            self.port, "POST", "/convert", SAMPLE_EXPORT + short_row
+        )
+        self.assertEqual(status, 422)
+        self.assertIn("error", json.loads(body))
+
+    async def test_broken_workers(self):
+        for process in list(self.server.executor._processes.values()):
+            process.kill()
+        status, _, body = await request(self.port, "POST", "/convert", SAMPLE_EXPORT)
+        self.assertEqual(status, 500)
+        self.assertIn("error", json.loads(body))
+        status, _, _ = await request(self.port, "POST", "/convert", SAMPLE_EXPORT)
+        self.assertEqual(status, 200)
+
+    async def test_rejections(self):
+        self.assertEqual((await request(self.port, "GET", "/"))[0], 404)
+        self.assertEqual((await request(self.port, "GET", "/convert"))[0], 405)
+        too_large = b"x" * 5000
+        self.assertEqual(
+            (await request(self.port, "POST", "/convert", too_large))[0], 413
+        )
+        self.assertEqual((await request(self.port, "PUT", "/stats"))[0], 404)
+
+    async def test_rejects_when_queue_is_full(self):
+        await self.server.slots.acquire()
+        self.server.running += 1
+        status, headers, _ = await request(self.port, "POST", "/convert", SAMPLE_EXPORT)
+        self.server.running -= 1
+        self.server.slots.release()
+        self.assertEqual(status, 503)
+        self.assertEqual(headers["Retry-After"], "1")
+
+    async def test_rejects_slow_uploads_before_reading_them(self):
+        head = f"POST /convert HTTP/1.1\r\nContent-Length: {len(SAMPLE_EXPORT)}\r\n\r\n"
+        uploads = []
+        for _ in range(3):
+            reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+            self.addCleanup(writer.close)
+            writer.write(head.encode("latin-1"))
+            await writer.drain()
+            uploads.append((reader, writer))
+        # The first upload takes the only place, the others are rejected
+        # although their bodies were never sent
+        for reader, _ in uploads[1:]:
+            response = await asyncio.wait_for(reader.read(), 10)
+            self.assertTrue(response.startswith(b"HTTP/1.1 503 "))
+        self.assertEqual(self.server.waiting, 1)
+        reader, writer = uploads[0]
+        writer.write(SAMPLE_EXPORT)
+        response = await asyncio.wait_for(reader.read(), 10)
+        self.assertTrue(response.startswith(b"HTTP/1.1 200 "))
+        self.assertEqual(self.server.waiting, 0)
+
+    async def test_releases_place_of_incomplete_upload(self):
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        writer.write(b"POST /convert HTTP/1.1\r\nContent-Length: 100\r\n\r\nshort")
+        writer.write_eof()
+        response = await asyncio.wait_for(reader.read(), 10)
+        writer.close()
+        self.assertTrue(response.startswith(b"HTTP/1.1 400 "))
+        self.assertEqual(self.server.waiting, 0)
+        status, _, _ = await request(self.port, "POST", "/convert", SAMPLE_EXPORT)
+        self.assertEqual(status, 200)
+
+    async def test_stats(self):
+        await request(self.port, "POST", "/convert", SAMPLE_EXPORT)
+        await request(self.port, "GET", "/")
+        status, _, body = await request(self.port, "GET", "/stats")
+        self.assertEqual(status, 200)
+        stats = json.loads(body)
+        self.assertEqual(stats["requests"], 2)
+        self.assertEqual(stats["statuses"], {"200": 1, "404": 1})
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertGreater(stats["latency_seconds"]["max"], 0)
+
+
+class TestPercentile(unittest.TestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(conversion_server.percentile(values, 0.5), 51)
+        self.assertEqual(conversion_server.percentile(values, 0.99), 100)
+        self.assertEqual(conversion_server.percentile(values, 1), 100)
+        self.assertIsNone(conversion_server.percentile([], 0.5))
+
+
+if __name__ == "__main__":
+    unittest.main()
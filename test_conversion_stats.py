@@ -0,0 +1,60 @@
+import json
+import unittest
+from unittest.mock import patch
+
+import mlp_to_portfolio_performance_converter as mppc
+from conversion_stats import ConversionStats
+from memo_processor import process_memo
+from test_mlp_to_portfolio_performance_converter import SAMPLE_EXPORT
+
+
+class TestConversionStats(unittest.TestCase):
+    def test_time_iter_and_time_call(self):
+        stats = ConversionStats()
+        self.assertEqual(list(stats.time_iter("read", [1, 2])), [1, 2])
+        self.assertEqual(stats.time_call("format", str.upper)("a"), "A")
+        self.assertGreater(stats.stage_seconds["read"], 0)
+        self.assertGreater(stats.stage_seconds["format"], 0)
+
+    def test_time_process_keeps_slowest_memos(self):
+        stats = ConversionStats(slowest_memos=2)
+        process = stats.time_process(process_memo)
+        memos = ["KIRCHENSTEUER", "UEBERWEISUNG", "KIRCHENSTEUER"]
+        for line_no, memo in enumerate(memos):
+            self.assertEqual(process(memo, line_no), process_memo(memo, line_no))
+        self.assertEqual(stats.rules, {"church_tax": 2, "transfer": 1})
+        self.assertEqual(len(stats.slowest), 2)
+
+    def test_merge(self):
+        stats = ConversionStats()
+        other = ConversionStats()
+        other.count({"Typ": "Kauf"})
+        other.rules["buy"] += 1
+        stats.count({"Typ": "Kauf"})
+        stats.merge(other)
+        self.assertEqual(stats.rows, 2)
+        self.assertEqual(stats.types, {"Kauf": 2})
+        self.assertEqual(stats.rules, {"buy": 1})
+
+    def test_convert_stream_stats(self):
+        stats = ConversionStats()
+        records = list(mppc.convert_stream([SAMPLE_EXPORT], stats=stats))
+        stats.finish()
+        self.assertEqual(stats.rows, len(records))
+        self.assertEqual(stats.types, {"Kauf": 1, "Einlage": 1})
+        self.assertEqual(stats.rules, {"buy": 1, "deposit": 1})
+        self.assertEqual(sorted(memo[1] for memo in stats.slowest), [6, 7])
+        result = json.loads(stats.to_json())
+        self.assertEqual(result["rows"], 2)
+        self.assertIn("Slowest memos:", stats.to_text())
+
+    @patch("builtins.print")
+    def test_convert_stream_parallel_stats(self, mock_print):
+        stats = ConversionStats()
+        list(mppc.convert_stream_parallel([SAMPLE_EXPORT], jobs=2, stats=stats))
+        self.assertEqual(stats.types, {"Kauf": 1, "Einlage": 1})
+        self.assertEqual(stats.rules, {"buy": 1, "deposit": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import json
+import unittest
+
+from diagnostics import Diagnostic, Diagnostics, message
+
+
+class TestDiagnostics(unittest.TestCase):
+    def test_add_deduplicates(self):
+        diagnostics = Diagnostics()
+        diagnostics.add("missing_field", 5, "buy", "wkn", "WERTPAPIERABRECHNUNG")
+        diagnostics.add("unknown_type", 6, memo="UNBEKANNT")
+        diagnostics.add("missing_field", "9", "buy", "wkn", "WERTPAPIERABRECHNUNG")
+        self.assertEqual(len(diagnostics), 3)
+        self.assertEqual(diagnostics.counts, {"missing_field": 2, "unknown_type": 1})
+        self.assertEqual(
+            diagnostics.records(),
+            [
+                Diagnostic(
+                    "missing_field", "buy", "wkn", "WERTPAPIERABRECHNUNG", [5, 9]
+                ),
+                Diagnostic("unknown_type", None, None, "UNBEKANNT", [6]),
+            ],
+        )
+
+    def test_merge(self):
+        diagnostics = Diagnostics()
+        other = Diagnostics()
+        diagnostics.add("unknown_type", 1, memo="A")
+        other.add("unknown_type", 2, memo="B")
+        other.add("unknown_type", 3, memo="A")
+        diagnostics.merge(other)
+        self.assertEqual(
+            [record.lines for record in diagnostics.records()], [[1, 3], [2]]
+        )
+        self.assertEqual(diagnostics.counts, {"unknown_type": 3})
+
+    def test_merge_file(self):
+        diagnostics = Diagnostics()
+        other = Diagnostics()
+        diagnostics.add("unknown_type", 1, memo="A")
+        other.add("unknown_type", 1, memo="A")
+        diagnostics.merge(other, "b.csv")
+        self.assertEqual(
+            diagnostics.records(),
+            [
+                Diagnostic("unknown_type", None, None, "A", [1]),
+                Diagnostic("unknown_type", None, None, "A", [1], "b.csv"),
+            ],
+        )
+        self.assertEqual(
+            diagnostics.to_text().split("\n")[1],
+            "Warning: Unknown transaction type in line 1 of b.csv: A",
+        )
+
+    def test_message(self):
+        self.assertEqual(message("unknown_type"), "Unknown transaction type")
+        self.assertEqual(
+            message("missing_field", "pieces"), "Could not find number of pieces"
+        )
+
+    def test_to_text(self):
+        diagnostics = Diagnostics()
+        diagnostics.add("unknown_type", 4, memo="UNBEKANNT")
+        for line_no in range(12):
+            diagnostics.add("missing_field", line_no, "sell", "isin")
+        self.assertEqual(
+            diagnostics.to_text().split("\n"),
+            [
+                "Warning: Unknown transaction type in line 4: UNBEKANNT",
+                "Warning: Could not find ISIN in lines 0, 1, 2, 3, 4, 5, 6, 7, 8, 9 "
+                "and 2 more",
+            ],
+        )
+
+    def test_to_json(self):
+        diagnostics = Diagnostics()
+        diagnostics.add("unknown_type", 4, memo="UNBEKANNT")
+        report = json.loads(diagnostics.to_json())
+        self.assertEqual(report["total"], 1)
+        self.assertEqual(report["counts"], {"unknown_type": 1})
+        self.assertEqual(
+            report["diagnostics"][0]["message"], "Unknown transaction type"
+        )
+        self.assertEqual(report["diagnostics"][0]["lines"], [4])
+
+
+if __name__ == "__main__":
+    unittest.main()
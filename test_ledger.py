@@ -0,0 +1,78 @@
+import io
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import ledger
+import mlp_to_portfolio_performance_converter as mppc
+from ledger import Ledger
+from records import Transaction, Typ
+from test_mlp_to_portfolio_performance_converter import SAMPLE_EXPORT
+
+RECORDS = [
+    Transaction("31.12.2023", Typ.EINLAGE, "100,00", note="Sparplan"),
+    Transaction("05.03.2024", Typ.KAUF, "-54,30", isin="IE00BQ3D6V05"),
+    Transaction("05.03.2024", Typ.KAUF, "-54,30", isin="IE00BQ3D6V05"),
+]
+
+
+class TestLedger(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.temp_dir = temp_dir.name
+        self.ledger = Ledger(os.path.join(self.temp_dir, "ledger.db"))
+        self.addCleanup(self.ledger.close)
+
+    def test_add_deduplicates_overlaps(self):
+        self.assertEqual(list(self.ledger.add(RECORDS, batch_size=2)), RECORDS)
+        self.assertEqual(self.ledger.inserted, 3)
+        list(self.ledger.add(RECORDS[1:] + [RECORDS[1]]))
+        self.assertEqual(self.ledger.inserted, 1)
+        list(self.ledger.add(RECORDS, account="other"))
+        self.assertEqual(self.ledger.inserted, 3)
+        self.assertEqual(len(list(self.ledger.transactions(account=""))), 4)
+
+    def test_transactions_of_date_range(self):
+        list(self.ledger.add(RECORDS))
+        self.assertEqual(list(self.ledger.transactions()), RECORDS)
+        self.assertEqual(
+            list(self.ledger.transactions("2024-01-01", "2024-03-05")), RECORDS[1:]
+        )
+        self.assertEqual(list(self.ledger.transactions(end="2024-03-04")), RECORDS[:1])
+
+    def test_export(self):
+        list(self.ledger.add(RECORDS))
+        output = io.StringIO(newline="")
+        self.assertEqual(self.ledger.export(output, start="2024-01-01"), 2)
+        lines = output.getvalue().split("\r\n")
+        self.assertEqual(lines[0], ";".join(mppc.FIELD_NAMES))
+        self.assertEqual(lines[1], "05.03.2024;Kauf;-54,30;EUR;;;IE00BQ3D6V05;;;;")
+
+    def test_parse_date(self):
+        self.assertEqual(ledger.parse_date("05.03.2024"), "2024-03-05")
+        with self.assertRaises(ValueError):
+            ledger.parse_date("2024-03-05")
+
+    def test_converter_fills_ledger(self):
+        input_file = os.path.join(self.temp_dir, "export.csv")
+        output_file = os.path.join(self.temp_dir, "export_converted.csv")
+        export_file = os.path.join(self.temp_dir, "ledger_export.csv")
+        with open(input_file, "wb") as export:
+            export.write(SAMPLE_EXPORT)
+        mppc.convert_file(input_file, output_file, ledger=self.ledger)
+        self.assertEqual(self.ledger.inserted, 2)
+        argv = ["ledger.py", self.ledger.path, export_file, "--from", "01.03.2024"]
+        with patch.object(sys, "argv", argv), patch("builtins.print"):
+            ledger.main()
+        with open(output_file) as converted, open(export_file) as exported:
+            self.assertEqual(
+                sorted(exported.read().splitlines()),
+                sorted(converted.read().splitlines()),
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
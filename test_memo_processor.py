@@ -1,6 +1,82 @@
+import re
 import unittest
+from unittest.mock import patch
 
-from memo_processor import MemoProcessor
+import benchmark
+import memo_processor
+from memo_processor import (
+    MemoCache,
+    MemoProcessor,
+    RuleEngine,
+    Triggers,
+    classify,
+    extract_fields,
+    literal_prefix,
+    process_memo,
+)
+
+
+def cascade_rule(memo, is_credit):
+    """Reference copy of the former if/elif cascade of MemoProcessor.process"""
+    note = re.sub(r"\s+", " ", re.sub(r"\n\s*", "", memo))
+    if memo_processor.deposit_re.match(memo) is not None:
+        return "deposit"
+    elif "STEUERAUSGLEICH" in note:
+        return "tax_refund"
+    elif "VORABPAUSCHALE" in memo:
+        return "advance_lump_sum"
+    elif (
+        "WERTPAPIERABRECHNUNG" in memo
+        and ("VERKAUF" in note or "DEPOT " in note)
+        and is_credit
+    ):
+        return "sell"
+    elif "WERTPAPIERABRECHNUNG" in memo and ("KAUF" in note or "DEPOT" in note):
+        return "buy"
+    elif memo_processor.dividend_re.search(memo) is not None:
+        return "dividend"
+    elif memo.find("DEPOTENTGELT") != -1:
+        return "depot_fee"
+    elif (memo_processor.collect_re.match(memo) is not None) or (
+        memo_processor.fee_re.match(memo) is not None
+    ):
+        return "collection"
+    elif memo_processor.credit_re.match(note) is not None:
+        return "credit"
+    elif "Steuerbelastung" in note:
+        return "tax_charge"
+    elif memo_processor.church_tax_re.match(memo) is not None:
+        return "church_tax"
+    elif memo_processor.soli_tax_re.match(memo) is not None:
+        return "soli_tax"
+    elif memo_processor.capital_gain_tax_re.match(memo) is not None:
+        return "capital_gain_tax"
+    elif memo_processor.transfer_re.match(memo):
+        return "transfer"
+    return None
+
+
+# Transaction texts that sit on the borders between rules. The classification is
+# tested on them, the memos of the tests below and the benchmark templates.
+BORDER_MEMOS = [
+    "LASTSCHRIFTEINR. SPARPLAN 2802474",
+    "LASTSCHRIFTEINR. WERTPAPIERABRECHNUNG VERKAUF",
+    "EINZUGSERMAECHTIGUNG TELEKOM",
+    "ENTGELT KONTOFUEHRUNG",
+    "KIRCHENSTEUER",
+    "SOLIDARITAETSZUSCHLAG",
+    "KAPITALERTRAGSTEUER",
+    "UEBERWEISUNG MIETE",
+    "SAMMELBUCHUNG",
+    "X SAMMELBUCHUNG",
+    "GUTSCHRIFT STEUER\n    AUSGLEICH",
+    "WERTPAPIERABRECHNUNG\nVER\n  KAUF",
+    "WERTPAPIERABRECHNUNGDEPOT",
+    "WERTPAPIERABRECHNUNG DEPOTENTGELT",
+    "  UEBERWEISUNG",
+    "Unbekannter Umsatz",
+    "",
+]
 
 
 class TestMemoProcessor(unittest.TestCase):
@@ -287,7 +363,7 @@ class TestMemoProcessor(unittest.TestCase):
             KIST 2,00-
             """)
         result = processor.find_taxes()
-        self.assertEqual(result, "17,0")
+        self.assertEqual(result, "17,00")
 
     def test_find_taxes_with_thousand_separator(self):
         processor = MemoProcessor("""
@@ -296,7 +372,148 @@ class TestMemoProcessor(unittest.TestCase):
             KIST 2.000,00-
             """)
         result = processor.find_taxes()
-        self.assertEqual(result, "17000,0")
+        self.assertEqual(result, "17.000,00")
+
+    def test_find_taxes_with_more_than_two_decimals(self):
+        processor = MemoProcessor("""
+            KAPST 1,975
+            SOLZ 0,104
+            """)
+        result = processor.find_taxes()
+        self.assertEqual(result, "2,08")
+
+    def test_extract_fields(self):
+        memo = (
+            "VORABPAUSCHALEINVESTMENTFONDSWKN   A1H6XK / LU0552385295MORGAN        "
+            "STAN.I-GL.OPP.ADLDEPOTNR.:         8507908370MENGE 8,8780KAPST        1,97SOLZ 0,"
+            "11KIST                  0,16ABRECHN.NR. 51264614230"
+        )
+        processor = MemoProcessor(memo)
+        result = extract_fields(processor.memo, processor.note)
+        self.assertEqual(result.pieces, "8,8780")
+        self.assertEqual(result.wkn, "A1H6XK")
+        self.assertEqual(result.isin, "LU0552385295MORGAN")
+        self.assertEqual(result.name, "MORGAN STAN.I-GL.OPP.ADL")
+        self.assertEqual((result.kapst, result.solz, result.kist), (197, 11, 16))
+
+    def test_extract_fields_without_fields(self):
+        result = extract_fields("UEBERWEISUNG", "UEBERWEISUNG")
+        self.assertEqual(result, ("", "", "", "", 0, 0, 0))
+
+
+class TestMemoCache(unittest.TestCase):
+    def test_hits_and_misses(self):
+        cache = MemoCache(maxsize=2)
+        first = cache.process("LASTSCHRIFTEINR. SPARPLAN", 1, True)
+        second = cache.process("LASTSCHRIFTEINR. SPARPLAN", 2, True)
+        cache.process("LASTSCHRIFTEINR. SPARPLAN", 3, False)
+        self.assertEqual(first, process_memo("LASTSCHRIFTEINR. SPARPLAN", 1, True))
+        self.assertEqual(second, first)
+        self.assertIsNot(second.out_dict, first.out_dict)
+        self.assertEqual(first.rule, "deposit")
+        self.assertEqual(tuple(cache.cache_info()), (1, 2, 2, 2))
+
+    def test_evicts_least_recently_used(self):
+        cache = MemoCache(maxsize=2)
+        cache.process("KIRCHENSTEUER")
+        cache.process("KAPITALERTRAGSTEUER")
+        cache.process("KIRCHENSTEUER")
+        cache.process("UEBERWEISUNG")
+        cache.process("KIRCHENSTEUER")
+        cache.process("KAPITALERTRAGSTEUER")
+        self.assertEqual(tuple(cache.cache_info()), (2, 4, 2, 2))
+
+    @patch("builtins.print")
+    def test_warnings_on_hit(self, mock_print):
+        cache = MemoCache()
+        cache.process("Unbekannt", 7)
+        result = cache.process("Unbekannt", 9)
+        self.assertEqual(result.out_dict, {})
+        self.assertEqual(result.warnings, [("unknown_type", None)])
+        self.assertIsNone(result.rule)
+        mock_print.assert_not_called()
+
+
+def recorded_memos(test_case):
+    """Return the memos the tests of a TestCase classify, as they are given"""
+    memos = []
+
+    class RecordingProcessor(MemoProcessor):
+        def __init__(self, memo, *args, **kwargs):
+            memos.append(memo)
+            super().__init__(memo, *args, **kwargs)
+
+    tests = unittest.defaultTestLoader.loadTestsFromTestCase(test_case)
+    with patch.dict(globals(), MemoProcessor=RecordingProcessor):
+        with patch.object(memo_processor, "MemoProcessor", RecordingProcessor):
+            tests.run(unittest.TestResult())
+    return memos
+
+
+def build_corpus():
+    """Return the memos of TestMemoProcessor and TestMemoCache, one memo per
+    benchmark template and BORDER_MEMOS, each once
+    """
+    templates = [
+        next(benchmark.generate_transactions(1, mix={name: 1}))["Verwendungszweck"]
+        for name in benchmark.TEMPLATES
+    ]
+    memos = recorded_memos(TestMemoProcessor) + recorded_memos(TestMemoCache)
+    return list(dict.fromkeys(memos + templates + BORDER_MEMOS))
+
+
+class TestClassification(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.corpus = build_corpus()
+
+    def test_corpus_has_the_memos_of_the_tests(self):
+        self.assertGreaterEqual(len(self.corpus), 26 + len(benchmark.TEMPLATES))
+
+    def test_matches_cascade_on_corpus(self):
+        for memo in self.corpus:
+            for is_credit in (True, False):
+                with self.subTest(memo=memo, is_credit=is_credit):
+                    note = re.sub(r"\s+", " ", re.sub(r"\n\s*", "", memo))
+                    self.assertEqual(
+                        classify(Triggers(memo, note), is_credit),
+                        cascade_rule(memo, is_credit),
+                    )
+
+    def test_triggers_are_looked_for_on_demand(self):
+        triggers = Triggers("UEBERWEISUNG", "VERKAUF DEPOT ")
+        self.assertEqual(triggers, {})
+        self.assertEqual(classify(triggers, False), "transfer")
+        self.assertNotIn("kauf", triggers)
+        self.assertTrue(triggers["kauf"] and triggers["depot_space"])
+        self.assertFalse(triggers["storno"])
+
+    def test_literal_prefix(self):
+        self.assertEqual(literal_prefix(r"LASTSCHRIFTEINR\.\s*"), "LASTSCHRIFTEINR.")
+        self.assertEqual(literal_prefix(r"SOLIDARIT\S+TSZUSCHLAG"), "SOLIDARIT")
+        self.assertEqual(literal_prefix(r"AB?C"), "A")
+        self.assertEqual(literal_prefix(r"AB+C"), "AB")
+        self.assertEqual(literal_prefix(r"GUTSCHRIFT|.+ERSTATTUNG"), "")
+
+    def test_engine_reorders_exclusive_rules(self):
+        engine = RuleEngine(adapt_every=4)
+        for _ in range(4):
+            engine.classify(Triggers("UEBERWEISUNG", "UEBERWEISUNG"), False)
+        order = engine.stats()["order"]
+        self.assertEqual(
+            order[-5:],
+            ["tax_charge", "transfer", "church_tax", "soli_tax", "capital_gain_tax"],
+        )
+        self.assertEqual(engine.stats()["hits"], {"transfer": 4})
+        self.assertEqual(engine.stats()["rules_tested"], 14)
+        for memo in self.corpus:
+            for is_credit in (True, False):
+                with self.subTest(memo=memo, is_credit=is_credit):
+                    note = re.sub(r"\s+", " ", re.sub(r"\n\s*", "", memo))
+                    self.assertEqual(
+                        engine.classify(Triggers(memo, note), is_credit),
+                        cascade_rule(memo, is_credit),
+                    )
 
 
 if __name__ == "__main__":
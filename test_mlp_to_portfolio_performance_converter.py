@@ -1,7 +1,30 @@
 import unittest
 from unittest.mock import patch, mock_open
 import mlp_to_portfolio_performance_converter as mppc
+from diagnostics import Diagnostic, Diagnostics
+import gzip
+import lzma
+import os
 import sys
+import tempfile
+import zipfile
+
+SAMPLE_EXPORT = """\
+"Umsatzanzeige";"MLP Banking"
+"Konto";"8507908370"
+
+"Buchungstag";"Valuta";"Auftraggeber/Zahlungsempfänger";"Verwendungszweck";"Kundenreferenz";"Betrag";"Währung"
+"31.03.2024";"31.03.2024";"";"";"Endsaldo";"2,345.67";"EUR"
+"05.03.2024";"07.03.2024";"MLP Banking AG";"EFFEKTEN
+WERTPAPIERABRECHNUNG
+KAUF
+WKN A12GPB / IE00BQ3D6V05
+COMGEST GROWTH ASIA DLAC
+DEPOTNR.:      8505581964
+MENGE              0,9070";"";"-54.30";"EUR"
+"01.03.2024";"01.03.2024";"Max Müller";"LASTSCHRIFTEINR. SPARPLAN";"";"1,200.00";"EUR"
+"01.01.2024";"01.01.2024";"";"";"Anfangssaldo";"1,200.00";"EUR"
+""".encode("iso-8859-1")
 
 
 class TestMppc(unittest.TestCase):
@@ -23,6 +46,60 @@ class TestMppc(unittest.TestCase):
         self.assertEqual(mppc.convert_to_german_number("600,00"), "600,00")
         self.assertEqual(mppc.convert_to_german_number("-600.00"), "-600,00")
         self.assertEqual(mppc.convert_to_german_number("-99.87"), "-99,87")
+        self.assertEqual(
+            mppc.convert_to_german_number("-1,234,567.89"), "-1.234.567,89"
+        )
+        self.assertEqual(mppc.convert_to_german_number("01,0000.10"), "10.000,10")
+        self.assertEqual(
+            mppc.convert_to_german_number("90,071,992,547,409.93"),
+            "90.071.992.547.409,93",
+        )
+
+    def test_convert_to_german_numbers(self):
+        self.assertEqual(
+            mppc.convert_to_german_numbers(["1,000.00", "600,00", "-0.50"]),
+            ["1.000,00", "600,00", "-0,50"],
+        )
+
+    def test_convert_amounts(self):
+        numbers = ["1,000.00", "-0.00", "12.34", "1000.00", "600,00", "-1,234.56"]
+        expected = (
+            ["1.000,00", "-0,00", "12,34", "1.000,00", "600,00", "-1.234,56"],
+            [True, False, True, True, True, False],
+        )
+        self.assertEqual(mppc.convert_amounts(numbers), expected)
+        with patch.object(mppc, "load_numpy", return_value=None):
+            self.assertEqual(mppc.convert_amounts(numbers), expected)
+
+    @unittest.skipIf(mppc.load_numpy() is None, "NumPy is not installed")
+    def test_convert_amounts_numpy(self):
+        numbers = [
+            "0.05",
+            "-12,345,678,901,234.56",
+            "1,234,567,890,123.45",
+            "01.00",
+            ",123.00",
+            "1,23.00",
+            "1.0,0",
+            "1.00\n",
+            "",
+            "Betrag",
+        ]
+        self.assertEqual(
+            mppc._convert_amounts_numpy(numbers),
+            (
+                [mppc.convert_to_german_number(number) for number in numbers],
+                [not number.startswith("-") for number in numbers],
+            ),
+        )
+
+    @unittest.skipIf(mppc.load_numpy() is None, "NumPy is not installed")
+    def test_load_numpy_before_2_0(self):
+        # numpy.strings only exists in NumPy 2.0 and later
+        mppc.load_numpy.cache_clear()
+        self.addCleanup(mppc.load_numpy.cache_clear)
+        with patch.dict(sys.modules, {"numpy.strings": None}):
+            self.assertIsNotNone(mppc.load_numpy())
 
     def test_is_string_of_positive_number(self):
         self.assertTrue(mppc.is_positive("1.000,00"))
@@ -32,21 +109,393 @@ class TestMppc(unittest.TestCase):
         self.assertFalse(mppc.is_positive("  -99,99"))
 
     def test_search_header(self):
-        with patch("builtins.print") as mock_print:
-            with self.assertRaises(SystemExit):
-                mppc.search_header(["test"] * 21)
-            mock_print.assert_called_once_with(
-                "\033[31mError: Header not found in the first 20 lines\033[0m"
-            )
+        with self.assertRaisesRegex(
+            mppc.ConversionError, "Header not found in the first 20 lines"
+        ):
+            mppc.search_header(["test"] * 21)
 
-        header, line_no = mppc.search_header(["Buchungstag;Umsatz"])
-        self.assertEqual(header, ["Buchungstag", "Umsatz"])
+        with self.assertRaisesRegex(mppc.ConversionError, "Header not found"):
+            mppc.search_header(["test"] * 2)
+
+        header, line_no = mppc.search_header(["Buchungstag;Betrag"])
+        self.assertEqual(header, ["Buchungstag", "Betrag"])
         self.assertEqual(line_no, 1)
 
-        header, line_no = mppc.search_header(["test"] * 2 + ["Buchungstag;Umsatz"])
-        self.assertEqual(header, ["Buchungstag", "Umsatz"])
+        header, line_no = mppc.search_header(["test"] * 2 + ["Buchungstag;Betrag"])
+        self.assertEqual(header, ["Buchungstag", "Betrag"])
         self.assertEqual(line_no, 3)
 
+    def test_convert_stream(self):
+        records = list(mppc.convert_stream([SAMPLE_EXPORT]))
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0]["Typ"], "Kauf")
+        self.assertEqual(records[0]["Wert"], "-54,30")
+        self.assertEqual(records[0]["WKN"], "A12GPB")
+        self.assertEqual(records[0]["Stück"], "0,9070")
+        self.assertEqual(records[1]["Typ"], "Einlage")
+        self.assertEqual(records[1]["Notiz"], "Sparplan")
+
+    def test_convert_stream_chunks(self):
+        chunks = [SAMPLE_EXPORT[i : i + 7] for i in range(0, len(SAMPLE_EXPORT), 7)]
+        self.assertEqual(
+            list(mppc.convert_stream(chunks)),
+            list(mppc.convert_stream([SAMPLE_EXPORT])),
+        )
+
+    def test_convert_stream_lines(self):
+        lines = SAMPLE_EXPORT.decode("iso-8859-1").splitlines(keepends=True)
+        self.assertEqual(
+            list(mppc.convert_stream(lines)),
+            list(mppc.convert_stream([SAMPLE_EXPORT])),
+        )
+
+    def test_convert_stream_columnar(self):
+        export = SAMPLE_EXPORT + SAMPLE_EXPORT.split(b"\n", 4)[4] * 3
+        credits = lambda row: not row[1].startswith("-")
+        columnar = list(
+            mppc.convert_stream([export], row_filter=credits, columnar=True)
+        )
+        self.assertEqual(
+            columnar, list(mppc.convert_stream([export], row_filter=credits))
+        )
+        self.assertLess(len(columnar), len(list(mppc.convert_stream([export]))))
+
+    def test_convert_stream_memo_cache(self):
+        export = SAMPLE_EXPORT + SAMPLE_EXPORT.split(b"\n", 4)[4]
+        memo_cache = mppc.MemoCache()
+        self.assertEqual(
+            list(mppc.convert_stream([export], memo_cache=memo_cache)),
+            list(mppc.convert_stream([export])),
+        )
+        self.assertEqual((memo_cache.hits, memo_cache.misses), (2, 2))
+
+    def test_convert_stream_parallel(self):
+        body = SAMPLE_EXPORT.split(b"\n", 4)[4]
+        unknown = b'"01.01.2024";"";"";"UNBEKANNT";"";"1.00";"EUR"\n'
+        export = SAMPLE_EXPORT + body * 20 + unknown
+        serial_diagnostics = Diagnostics()
+        parallel_diagnostics = Diagnostics()
+        serial = list(mppc.convert_stream([export], diagnostics=serial_diagnostics))
+        parallel = list(
+            mppc.convert_stream_parallel(
+                [export], jobs=2, chunk_size=3, diagnostics=parallel_diagnostics
+            )
+        )
+        self.assertEqual(parallel, serial)
+        self.assertEqual(parallel_diagnostics.records(), serial_diagnostics.records())
+        self.assertEqual(
+            serial_diagnostics.records(),
+            [Diagnostic("unknown_type", None, None, "UNBEKANNT", [89])],
+        )
+
+    def test_iter_row_chunks(self):
+        self.assertEqual(
+            list(mppc.iter_row_chunks(range(5), 10, chunk_size=2)),
+            [([0, 1], 10), ([2, 3], 12), ([4], 14)],
+        )
+
+    def test_iter_lines(self):
+        self.assertEqual(
+            list(mppc.iter_lines([b"a;\xe4", b"\nb", "c\n", b"d"])),
+            ["a;ä\n", "bc\n", "d"],
+        )
+
+    def test_read_transactions(self):
+        transaction_reader, header_offset = mppc.read_transactions([SAMPLE_EXPORT])
+        rows = list(transaction_reader)
+        self.assertEqual(header_offset, 4)
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[0], ("31.03.2024", "2,345.67", "", "Endsaldo", None))
+        self.assertEqual(rows[1][:2], ("05.03.2024", "-54.30"))
+        self.assertTrue(rows[1][2].startswith("EFFEKTEN\nWERTPAPIERABRECHNUNG"))
+        self.assertTrue(rows[1][2].endswith("MENGE              0,9070"))
+
+    def test_column_projection(self):
+        header = ["Category", "Betrag", "Verwendungszweck", "Buchungstag"]
+        project = mppc.column_projection(header)
+        self.assertEqual(
+            project(["Zinsen", "1.00", "ZINS", "01.01.2024"]),
+            ("01.01.2024", "1.00", "ZINS", None, "Zinsen"),
+        )
+        self.assertEqual(
+            project(["Zinsen", "1.00"]), (None, "1.00", None, None, "Zinsen")
+        )
+        project = mppc.column_projection(header[1:] + ["Kundenreferenz"])
+        self.assertEqual(
+            project(["1.00", "ZINS", "01.01.2024", "Endsaldo"]),
+            ("01.01.2024", "1.00", "ZINS", "Endsaldo", None),
+        )
+        self.assertEqual(
+            project(["1.00", "ZINS", "01.01.2024"]),
+            ("01.01.2024", "1.00", "ZINS", None, None),
+        )
+        with self.assertRaisesRegex(mppc.ConversionError, "Verwendungszweck"):
+            mppc.column_projection(["Buchungstag", "Betrag"])
+
+    def test_convert_file_mapped(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_file = os.path.join(temp_dir, "export.csv")
+            output_file = os.path.join(temp_dir, "export_converted.csv")
+            with open(input_file, "wb") as export:
+                export.write(SAMPLE_EXPORT.replace(b"\n", b"\r\n"))
+            self.assertEqual(mppc.convert_file(input_file, output_file), 2)
+            with open(output_file, encoding="utf-8") as converted:
+                self.assertIn("Sparplan", converted.read())
+            open(input_file, "wb").close()
+            with self.assertRaisesRegex(mppc.ConversionError, "Header not found"):
+                mppc.convert_file(input_file, output_file)
+
+    def test_convert_file_append_failed(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_file = os.path.join(temp_dir, "export.csv")
+            output_file = os.path.join(temp_dir, "history.csv")
+            with open(input_file, "wb") as export:
+                export.write(SAMPLE_EXPORT)
+            mppc.convert_file(input_file, output_file, append=True)
+            with open(output_file, "rb") as converted:
+                before = converted.read()
+
+            rows = []
+
+            def fail_after_two_rows(row):
+                rows.append(row)
+                if len(rows) > 2:
+                    raise mppc.ConversionError("interrupted")
+                return True
+
+            with self.assertRaises(mppc.ConversionError):
+                mppc.convert_file(
+                    input_file,
+                    output_file,
+                    row_filter=fail_after_two_rows,
+                    append=True,
+                )
+            with open(output_file, "rb") as converted:
+                self.assertEqual(converted.read(), before)
+            self.assertEqual(
+                sorted(os.listdir(temp_dir)), ["export.csv", "history.csv"]
+            )
+
+    def test_convert_file_compressed(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            plain_input = os.path.join(temp_dir, "export.csv")
+            with open(plain_input, "wb") as export:
+                export.write(SAMPLE_EXPORT)
+            with gzip.open(plain_input + ".gz", "wb") as export:
+                export.write(SAMPLE_EXPORT)
+            with lzma.open(plain_input + ".xz", "wb") as export:
+                export.write(SAMPLE_EXPORT)
+            with zipfile.ZipFile(plain_input + ".zip", "w") as archive:
+                archive.writestr("Umsaetze.csv", SAMPLE_EXPORT)
+            expected_file = os.path.join(temp_dir, "expected.csv")
+            mppc.convert_file(plain_input, expected_file)
+            with open(expected_file, "rb") as expected_output:
+                expected = expected_output.read()
+
+            for extension in (".gz", ".xz", ".zip"):
+                with self.subTest(extension=extension):
+                    output_file = os.path.join(temp_dir, "output.csv" + extension)
+                    self.assertEqual(
+                        mppc.convert_file(plain_input + extension, output_file), 2
+                    )
+                    with mppc.open_export(output_file) as chunks:
+                        self.assertEqual(b"".join(chunks), expected)
+
+            output_file = os.path.join(temp_dir, "appended.csv.gz")
+            mppc.convert_file(plain_input + ".gz", output_file, append=True)
+            mppc.convert_file(plain_input + ".gz", output_file, append=True)
+            with gzip.open(output_file, "rb") as converted:
+                self.assertEqual(
+                    converted.read(), expected + expected.split(b"\n", 1)[1]
+                )
+            with self.assertRaises(ValueError):
+                mppc.convert_file(plain_input, output_file[:-3] + ".zip", append=True)
+
+    def test_open_export_damaged(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            truncated = os.path.join(temp_dir, "truncated.csv.gz")
+            with open(truncated, "wb") as export:
+                export.write(gzip.compress(SAMPLE_EXPORT)[:-20])
+            with self.assertRaisesRegex(mppc.ConversionError, "damaged"):
+                with mppc.open_export(truncated) as chunks:
+                    list(chunks)
+            empty_zip = os.path.join(temp_dir, "empty.zip")
+            zipfile.ZipFile(empty_zip, "w").close()
+            with self.assertRaisesRegex(mppc.ConversionError, "0 files"):
+                with mppc.open_export(empty_zip):
+                    pass
+
+    def test_strip_compression(self):
+        self.assertEqual(mppc.strip_compression("a/Umsaetze.csv.GZ"), "a/Umsaetze.csv")
+        self.assertEqual(mppc.strip_compression("Umsaetze.csv"), "Umsaetze.csv")
+
+    def test_merge_records(self):
+        newer = SAMPLE_EXPORT.replace(b"05.03.2024", b"15.03.2024")
+        plan = b'"01.03.2024";"01.03.2024";"Max";"LASTSCHRIFTEINR. SPARPLAN";"";"1.00";"EUR"\n'
+        double = SAMPLE_EXPORT.replace(b'"01.01.2024"', plan * 2 + b'"01.01.2024"', 1)
+        merged = list(
+            mppc.merge_records(
+                [
+                    mppc.convert_stream_fingerprinted([double]),
+                    mppc.convert_stream_fingerprinted([newer]),
+                ],
+                ["double.csv", "newer.csv"],
+            )
+        )
+        self.assertEqual(
+            [(record.date, record.amount) for record in merged],
+            [
+                ("15.03.2024", "-54,30"),
+                ("05.03.2024", "-54,30"),
+                ("01.03.2024", "1.200,00"),
+                ("01.03.2024", "1,00"),
+                ("01.03.2024", "1,00"),
+            ],
+        )
+        unsorted = SAMPLE_EXPORT.replace(b"01.03.2024", b"21.03.2024")
+        with self.assertRaisesRegex(mppc.ConversionError, "unsorted.csv"):
+            list(
+                mppc.merge_records(
+                    [mppc.convert_stream_fingerprinted([unsorted])], ["unsorted.csv"]
+                )
+            )
+
+    def test_merge_files(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_files = []
+            for day in ("05", "15"):
+                input_file = os.path.join(temp_dir, f"{day}.csv")
+                with open(input_file, "wb") as export:
+                    export.write(
+                        SAMPLE_EXPORT.replace(b"05.03.", f"{day}.03.".encode())
+                    )
+                input_files.append(input_file)
+            output_file = os.path.join(temp_dir, "merged.csv")
+            self.assertEqual(mppc.merge_files(input_files, output_file), 3)
+            with open(output_file, encoding="utf-8") as merged:
+                lines = merged.read().splitlines()
+            self.assertEqual(
+                [line[:10] for line in lines[1:]],
+                ["15.03.2024", "05.03.2024", "01.03.2024"],
+            )
+
+    def test_merge_files_of_two_accounts(self):
+        header = SAMPLE_EXPORT.split(b"\n", 4)[3] + b"\n"
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_files = []
+            for reference in ("A1", "B2"):
+                input_file = os.path.join(temp_dir, f"{reference}.csv")
+                with open(input_file, "wb") as export:
+                    export.write(header)
+                    for memo, amount in (
+                        ("LASTSCHRIFTEINR. SPARPLAN", "100.00"),
+                        ("UEBERWEISUNG", "-500.00"),
+                    ):
+                        export.write(
+                            f'"01.03.2024";"01.03.2024";"";"{memo}";"{reference}";'
+                            f'"{amount}";"EUR"\n'.encode()
+                        )
+                input_files.append(input_file)
+            output_file = os.path.join(temp_dir, "merged.csv")
+            for columnar in (False, True):
+                with self.subTest(columnar=columnar):
+                    self.assertEqual(
+                        mppc.merge_files(
+                            input_files + input_files[:1],
+                            output_file,
+                            columnar=columnar,
+                        ),
+                        4,
+                    )
+                    with open(output_file, encoding="utf-8") as merged:
+                        types = [line.split(";")[1] for line in merged][1:]
+                    self.assertEqual(sorted(types), ["Einlage"] * 2 + ["Entnahme"] * 2)
+
+    def test_merge_files_of_two_konto_lines(self):
+        header = SAMPLE_EXPORT.split(b"\n", 4)[3] + b"\n"
+        rows = (
+            b'"01.03.2024";"01.03.2024";"";"UEBERWEISUNG MIETE";"";"-500.00";"EUR"\n'
+            b'"01.03.2024";"01.03.2024";"";"UNBEKANNT";"";"1.00";"EUR"\n'
+        )
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_files = []
+            for account in ("111", "222"):
+                input_file = os.path.join(temp_dir, f"{account}.csv")
+                with open(input_file, "wb") as export:
+                    export.write(f'"Konto";"{account}"\n\n'.encode() + header + rows)
+                input_files.append(input_file)
+            self.assertEqual(mppc.read_account(input_files[0]), "111")
+            output_file = os.path.join(temp_dir, "merged.csv")
+            diagnostics = Diagnostics()
+            self.assertEqual(
+                mppc.merge_files(
+                    input_files + input_files[:1], output_file, diagnostics
+                ),
+                4,
+            )
+            self.assertEqual(
+                [(record.file, record.lines) for record in diagnostics.records()],
+                [(input_files[0], [5, 5]), (input_files[1], [5])],
+            )
+            self.assertIn(f"lines 5, 5 of {input_files[0]}", diagnostics.to_text())
+
+    def test_sort_records(self):
+        records = [
+            mppc.Transaction(date, mppc.Typ.EINLAGE, f"{number},00")
+            for number, date in enumerate(
+                ["05.03.2024", "01.03.2024", "05.03.2024", "31.12.2023", "01.03.2024"]
+            )
+        ]
+        for buffer_size in (1, 2, 5, 10):
+            with self.subTest(buffer_size=buffer_size):
+                self.assertEqual(
+                    list(mppc.sort_records(records, buffer_size)),
+                    [records[3], records[1], records[4], records[0], records[2]],
+                )
+        with self.assertRaises(ValueError):
+            list(mppc.sort_records(records, 0))
+
+    def test_sort_records_merge_width(self):
+        records = [
+            mppc.Transaction(f"{day:02d}.03.2024", mppc.Typ.EINLAGE, f"{number},00")
+            for number, day in enumerate([5, 1, 5, 3, 1, 2, 4, 3, 5, 1] * 5)
+        ]
+        expected = sorted(records, key=mppc.record_date)
+        temporary_file = tempfile.TemporaryFile
+
+        def open_run_file(*args, **kwargs):
+            run_files.append(temporary_file(*args, **kwargs))
+            open_files.append(sum(not run_file.closed for run_file in run_files))
+            return run_files[-1]
+
+        for merge_width in (2, 3):
+            run_files = []
+            open_files = []
+            with self.subTest(merge_width=merge_width), patch.object(
+                tempfile, "TemporaryFile", open_run_file
+            ):
+                self.assertEqual(
+                    list(mppc.sort_records(records, 1, merge_width)), expected
+                )
+                # Of the 50 runs fewer than merge_width per level are open at once
+                self.assertLessEqual(max(open_files), 10)
+                self.assertTrue(all(run_file.closed for run_file in run_files))
+        with self.assertRaises(ValueError):
+            list(mppc.sort_records(records, 1, 1))
+
+    def test_convert_file_sorted(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_file = os.path.join(temp_dir, "export.csv")
+            output_file = os.path.join(temp_dir, "export_converted.csv")
+            with open(input_file, "wb") as export:
+                export.write(SAMPLE_EXPORT)
+            mppc.convert_file(input_file, output_file, sort=True, sort_buffer=1)
+            with open(output_file, encoding="utf-8") as converted:
+                lines = converted.read().splitlines()
+            self.assertEqual(
+                [line[:10] for line in lines[1:]], ["01.03.2024", "05.03.2024"]
+            )
+
     @patch("os.path.exists", return_value=False)
     @patch("builtins.print")
     def test_main_file_not_exists(self, mock_print, mock_exists):
@@ -57,6 +506,23 @@ class TestMppc(unittest.TestCase):
                 '\033[31mError: Input file "input.csv" does not exist\033[0m'
             )
 
+    @patch("builtins.print")
+    def test_main_corrupt_ledger(self, mock_print):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_file = os.path.join(temp_dir, "export.csv")
+            ledger_file = os.path.join(temp_dir, "ledger.db")
+            with open(input_file, "wb") as export:
+                export.write(SAMPLE_EXPORT)
+            with open(ledger_file, "wb") as ledger:
+                ledger.write(b"no database" * 100)
+            argv = ["mlpc.py", input_file, "--ledger", ledger_file]
+            with patch.object(sys, "argv", argv):
+                with self.assertRaises(SystemExit):
+                    mppc.main()
+        mock_print.assert_called_once_with(
+            "\033[31mError: file is not a database\033[0m"
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
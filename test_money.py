@@ -0,0 +1,42 @@
+import unittest
+
+from money import Money
+
+
+class TestMoney(unittest.TestCase):
+    def test_from_english(self):
+        self.assertEqual(Money.from_english("1,234.56"), 123456)
+        self.assertEqual(Money.from_english("-0.50"), -50)
+        self.assertEqual(Money.from_english(" 12.5\n"), 1250)
+        self.assertEqual(Money.from_english("7"), 700)
+
+    def test_from_german(self):
+        self.assertEqual(Money.from_german("10.000,00"), 1000000)
+        self.assertEqual(Money.from_german("0,16"), 16)
+
+    def test_invalid(self):
+        for text in ("", "-", "abc", "1.234", "1.2.3", "0.001"):
+            with self.subTest(text=text), self.assertRaises(ValueError):
+                Money.from_english(text)
+
+    def test_rounded(self):
+        self.assertEqual(Money.from_german("1,975", rounded=True), 198)
+        self.assertEqual(Money.from_german("-1,974", rounded=True), -197)
+        self.assertEqual(Money.from_english("0.995", rounded=True), 100)
+
+    def test_str(self):
+        self.assertEqual(str(Money(0)), "0,00")
+        self.assertEqual(str(Money(5)), "0,05")
+        self.assertEqual(str(Money(-123456)), "-1.234,56")
+        self.assertEqual(str(Money(123456789012)), "1.234.567.890,12")
+
+    def test_arithmetic(self):
+        taxes = sum(map(Money.from_german, ["0,10", "0,20", "0,70"]), Money(0))
+        self.assertIsInstance(taxes, Money)
+        self.assertEqual(str(taxes), "1,00")
+        self.assertEqual(str(Money(100) - 250), "-1,50")
+        self.assertEqual(str(-Money(100)), "-1,00")
+
+
+if __name__ == "__main__":
+    unittest.main()
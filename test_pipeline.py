@@ -0,0 +1,73 @@
+import os
+import tempfile
+import unittest
+
+import mlp_to_portfolio_performance_converter as mppc
+from pipeline import Pipeline
+from test_mlp_to_portfolio_performance_converter import SAMPLE_EXPORT
+
+
+def failing_rows(count):
+    yield from range(count)
+    raise ValueError("bad row")
+
+
+class TestPipeline(unittest.TestCase):
+    def test_order_is_kept(self):
+        pipeline = Pipeline(batch_size=3, queue_size=2)
+        written = []
+        rows = pipeline.read(range(100))
+        self.assertEqual(pipeline.write((row * 2 for row in rows), written.extend), 100)
+        self.assertEqual(written, list(range(0, 200, 2)))
+        self.assertLessEqual(pipeline.read_queue.peak, 2)
+        self.assertRegex(pipeline.report(), r"rows/s, read queue .* write queue")
+
+    def test_reader_error(self):
+        pipeline = Pipeline(batch_size=2, queue_size=1)
+        written = []
+        with self.assertRaisesRegex(ValueError, "bad row"):
+            pipeline.write(pipeline.read(failing_rows(10)), written.extend)
+        self.assertEqual(written, list(range(len(written))))
+        self.assertFalse(any(thread.is_alive() for thread in pipeline.threads))
+
+    def test_writer_error(self):
+        pipeline = Pipeline(batch_size=2, queue_size=1)
+
+        def write_batch(batch):
+            raise OSError("disk full")
+
+        with self.assertRaisesRegex(OSError, "disk full"):
+            pipeline.write(pipeline.read(range(1000)), write_batch)
+        self.assertFalse(any(thread.is_alive() for thread in pipeline.threads))
+
+    def test_classification_error(self):
+        pipeline = Pipeline(batch_size=2, queue_size=1)
+
+        def classify(rows):
+            for row in rows:
+                if row == 50:
+                    raise mppc.ConversionError("bad memo")
+                yield row
+
+        with self.assertRaisesRegex(mppc.ConversionError, "bad memo"):
+            pipeline.write(classify(pipeline.read(range(1000))), list)
+        self.assertFalse(any(thread.is_alive() for thread in pipeline.threads))
+
+    def test_convert_file(self):
+        export = SAMPLE_EXPORT + SAMPLE_EXPORT.split(b"\n", 4)[4] * 50
+        with tempfile.TemporaryDirectory() as temp_dir:
+            input_file = os.path.join(temp_dir, "export.csv")
+            with open(input_file, "wb") as export_file:
+                export_file.write(export)
+            outputs = []
+            for pipeline in (None, Pipeline(batch_size=7, queue_size=2)):
+                output_file = os.path.join(temp_dir, f"{len(outputs)}.csv")
+                mppc.convert_file(input_file, output_file, pipeline=pipeline)
+                with open(output_file, "rb") as converted:
+                    outputs.append(converted.read())
+            self.assertEqual(outputs[0], outputs[1])
+            self.assertEqual(pipeline.rows, 102)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import csv
+import io
+import pickle
+import unittest
+
+from records import FIELD_NAMES, Transaction, Typ, make_transaction
+
+
+class TestTyp(unittest.TestCase):
+    def test_behaves_like_its_value(self):
+        self.assertEqual(Typ.KAUF, "Kauf")
+        self.assertEqual(str(Typ.GEBUEHREN), "Gebühren")
+        self.assertEqual(f"{Typ.EINLAGE}", "Einlage")
+        self.assertEqual({"Kauf": 1}[Typ.KAUF], 1)
+        self.assertIs(Typ("Steuern"), Typ.STEUERN)
+
+
+class TestTransaction(unittest.TestCase):
+    def test_fields(self):
+        record = Transaction("01.03.2024", Typ.EINLAGE, "1.200,00", note="Sparplan")
+        self.assertEqual(len(record), len(FIELD_NAMES))
+        self.assertEqual(record["Typ"], "Einlage")
+        self.assertEqual(record["Buchungswährung"], "EUR")
+        self.assertEqual(record[2], "1.200,00")
+        self.assertEqual(record.note, "Sparplan")
+        self.assertEqual(record.as_dict()["Notiz"], "Sparplan")
+        self.assertEqual(pickle.loads(pickle.dumps(record)), record)
+
+    def test_make_transaction(self):
+        record = make_transaction(
+            "05.03.2024",
+            "-54,30",
+            {"Typ": Typ.KAUF, "Stück": "0,9070", "WKN": "A12GPB"},
+        )
+        self.assertEqual(
+            record,
+            (
+                "05.03.2024",
+                "Kauf",
+                "-54,30",
+                "EUR",
+                "",
+                "0,9070",
+                "",
+                "A12GPB",
+                "",
+                "",
+                "",
+            ),
+        )
+
+    def test_written_in_field_order(self):
+        output = io.StringIO()
+        csv.writer(output, delimiter=";").writerow(
+            Transaction("01.01.2024", Typ.ZINSEN, "1,00")
+        )
+        self.assertEqual(output.getvalue(), "01.01.2024;Zinsen;1,00;EUR;;;;;;;\r\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import pickle
+import tempfile
+import unittest
+
+import mlp_to_portfolio_performance_converter as mppc
+from conversion_stats import ConversionStats
+from memo_processor import extract_fields
+from securities import (
+    SecuritiesIndex,
+    SecuritiesMaster,
+    build_index,
+    open_securities,
+)
+from test_mlp_to_portfolio_performance_converter import SAMPLE_EXPORT
+
+MASTER = """\
+ISIN;WKN;Name
+IE00BQ3D6V05;A12GPB;Comgest Growth Asia USD Acc
+LU0323578657;A0M430;Flossbach von Storch Multiple Opportunities R
+"""
+
+
+class TestSecurities(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.master_file = os.path.join(temp_dir.name, "master.csv")
+        self.index_file = os.path.join(temp_dir.name, "master.db")
+        with open(self.master_file, "w", encoding="utf-8") as master:
+            master.write(MASTER)
+
+    def test_master(self):
+        master = SecuritiesMaster.load(self.master_file)
+        self.assertEqual(len(master), 2)
+        self.assertEqual(master.name("IE00BQ3D6V05"), "Comgest Growth Asia USD Acc")
+        self.assertEqual(
+            master.name("", "A0M430"), "Flossbach von Storch Multiple Opportunities R"
+        )
+        self.assertEqual(master.name("DE0000000000", "XXXXXX"), "")
+
+    def test_missing_column(self):
+        with open(self.master_file, "w", encoding="utf-8") as master:
+            master.write("ISIN;Name\n")
+        with self.assertRaisesRegex(ValueError, 'Column "WKN" not found'):
+            SecuritiesMaster.load(self.master_file)
+
+    def test_index(self):
+        self.assertEqual(build_index(self.master_file, self.index_file), 2)
+        index = SecuritiesIndex(self.index_file)
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.name("", "A12GPB"), "Comgest Growth Asia USD Acc")
+        self.assertEqual(index.name("", "A12GPB"), "Comgest Growth Asia USD Acc")
+        self.assertEqual(index.name("LU0000000000"), "")
+        self.assertEqual(index.cache_info().hits, 1)
+
+    def test_open_securities(self):
+        build_index(self.master_file, self.index_file)
+        self.assertIsInstance(open_securities(self.master_file), SecuritiesMaster)
+        index = open_securities(self.index_file)
+        self.assertIsInstance(index, SecuritiesIndex)
+        self.assertIs(pickle.loads(pickle.dumps(index)), index)
+
+    def test_extract_fields(self):
+        master = SecuritiesMaster.from_rows([("", "A12GPB", "Comgest Asia")])
+        note = "WKN A12GPB / IE00BQ3D6V05 COMGEST GROWTH ASIA DLAC DEPOTNR.: 1"
+        self.assertEqual(extract_fields(note, note, master).name, "Comgest Asia")
+        self.assertEqual(extract_fields(note, note).name, "COMGEST GROWTH ASIA DLAC")
+
+    def test_convert_stream(self):
+        build_index(self.master_file, self.index_file)
+        for securities in (
+            SecuritiesMaster.load(self.master_file),
+            open_securities(self.index_file),
+        ):
+            with self.subTest(securities=type(securities).__name__):
+                records = list(
+                    mppc.convert_stream([SAMPLE_EXPORT], securities=securities)
+                )
+                self.assertEqual(
+                    records[0]["Wertpapiername"], "Comgest Growth Asia USD Acc"
+                )
+                parallel = mppc.convert_stream_parallel(
+                    [SAMPLE_EXPORT], jobs=2, chunk_size=1, securities=securities
+                )
+                self.assertEqual(list(parallel), records)
+
+    def test_convert_stream_with_stats(self):
+        securities = SecuritiesMaster.load(self.master_file)
+        for memo_cache in (None, mppc.MemoCache()):
+            with self.subTest(memo_cache=memo_cache):
+                stats = ConversionStats()
+                records = list(
+                    mppc.convert_stream(
+                        [SAMPLE_EXPORT],
+                        memo_cache=memo_cache,
+                        stats=stats,
+                        securities=securities,
+                    )
+                )
+                self.assertEqual(
+                    records[0]["Wertpapiername"], "Comgest Growth Asia USD Acc"
+                )
+                self.assertEqual(stats.rules["buy"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import mlp_to_portfolio_performance_converter as mppc
+from test_mlp_to_portfolio_performance_converter import SAMPLE_EXPORT
+from transaction_index import FINGERPRINT_COLUMNS, TransactionIndex, fingerprint
+
+ROW = ("01.03.2024", "1,200.00", "LASTSCHRIFTEINR. SPARPLAN", "", None)
+
+
+class TestTransactionIndex(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.state_file = os.path.join(self.temp_dir.name, "state.json")
+
+    def test_rows_start_with_fingerprint_columns(self):
+        self.assertEqual(mppc.COLUMNS[: len(FINGERPRINT_COLUMNS)], FINGERPRINT_COLUMNS)
+
+    def test_fingerprint_ignores_other_columns(self):
+        self.assertEqual(fingerprint(ROW), fingerprint(ROW[:4] + ("Zinsen",)))
+        self.assertNotEqual(
+            fingerprint(ROW), fingerprint(ROW[:1] + ("1.00",) + ROW[2:])
+        )
+
+    def test_is_new_counts_equal_rows(self):
+        index = TransactionIndex()
+        self.assertTrue(index.is_new(ROW))
+        self.assertTrue(index.is_new(ROW))
+        index.save(self.state_file)
+
+        index = TransactionIndex.load(self.state_file)
+        self.assertFalse(index.is_new(ROW))
+        self.assertFalse(index.is_new(ROW))
+        self.assertTrue(index.is_new(ROW))
+
+    def test_load_missing_state_file(self):
+        index = TransactionIndex.load(self.state_file)
+        self.assertTrue(index.is_new(ROW))
+
+    @patch("builtins.print")
+    def test_incremental_conversion(self, mock_print):
+        input_file = os.path.join(self.temp_dir.name, "Umsaetze.csv")
+        output_file = os.path.join(self.temp_dir.name, "Umsaetze_converted.csv")
+        with open(input_file, "wb") as file:
+            file.write(SAMPLE_EXPORT)
+
+        for expected_rows in (2, 0):
+            index = TransactionIndex.load(self.state_file)
+            rows = mppc.convert_file(
+                input_file, output_file, row_filter=index.is_new, append=True
+            )
+            index.save(self.state_file)
+            self.assertEqual(rows, expected_rows)
+
+        with open(output_file, encoding="utf-8") as converted:
+            self.assertEqual(len(converted.readlines()), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
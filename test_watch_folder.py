@@ -0,0 +1,139 @@
+import gzip
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+import watch_folder
+from test_mlp_to_portfolio_performance_converter import SAMPLE_EXPORT
+from watch_folder import FolderWatcher
+
+
+class TestFolderWatcher(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.inbox = temp_dir.name
+        self.watcher = FolderWatcher(self.inbox, settle_time=5)
+
+    def drop(self, name, data=SAMPLE_EXPORT, age=60):
+        path = os.path.join(self.inbox, name)
+        with open(path, "wb") as export:
+            export.write(data)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_converts_settled_exports(self):
+        self.drop("export.csv")
+        self.drop("notes.txt")
+        self.drop("fresh.csv", age=0)
+        self.assertEqual(self.watcher.run_once(), [])
+        results = self.watcher.run_once()
+        self.assertEqual([result.status for result in results], ["success"])
+        self.assertEqual(results[0].rows, 2)
+        self.assertTrue(
+            os.path.exists(
+                os.path.join(self.inbox, "converted", "export_converted.csv")
+            )
+        )
+        self.assertTrue(os.path.exists(os.path.join(self.inbox, "done", "export.csv")))
+        self.assertEqual(
+            sorted(self.watcher.seen), ["fresh.csv"], "fresh export is still waiting"
+        )
+        results = self.watcher.run_once(now=time.time() + 10)
+        self.assertEqual(
+            [result.input_file for result in results],
+            [os.path.join(self.inbox, "fresh.csv")],
+        )
+
+    def test_converts_compressed_exports(self):
+        self.drop("export.csv.gz", gzip.compress(SAMPLE_EXPORT))
+        self.drop("old_converted.csv.gz", gzip.compress(SAMPLE_EXPORT))
+        self.watcher.run_once()
+        results = self.watcher.run_once()
+        self.assertEqual([result.status for result in results], ["success"])
+        self.assertEqual(results[0].rows, 2)
+        self.assertEqual(
+            os.listdir(os.path.join(self.inbox, "converted")),
+            ["export_converted.csv"],
+        )
+        self.assertTrue(
+            os.path.exists(os.path.join(self.inbox, "done", "export.csv.gz"))
+        )
+
+    def test_waits_while_export_changes(self):
+        self.drop("export.csv", SAMPLE_EXPORT[:100])
+        self.assertEqual(self.watcher.scan(), [])
+        self.drop("export.csv", SAMPLE_EXPORT, age=50)
+        self.assertEqual(self.watcher.scan(), [])
+        self.assertEqual(self.watcher.scan(), ["export.csv"])
+
+    def test_moves_failed_exports(self):
+        self.drop("broken.csv", b"no export")
+        self.watcher.run_once()
+        results = self.watcher.run_once()
+        self.assertEqual([result.status for result in results], ["failure"])
+        self.assertTrue(
+            os.path.exists(os.path.join(self.inbox, "failed", "broken.csv"))
+        )
+        self.assertEqual(os.listdir(os.path.join(self.inbox, "converted")), [])
+
+    def test_keeps_going_after_malformed_export(self):
+        short_row = b'"01.03.2024";"01.03.2024"\n'
+        self.drop("a.csv", SAMPLE_EXPORT + short_row)
+        self.drop("b.csv")
+        self.watcher.run_once()
+        results = self.watcher.run_once()
+        self.assertEqual([result.status for result in results], ["failure", "success"])
+        self.assertTrue(os.path.exists(os.path.join(self.inbox, "failed", "a.csv")))
+        self.assertEqual(
+            os.listdir(os.path.join(self.inbox, "converted")), ["b_converted.csv"]
+        )
+
+    @patch("builtins.print")
+    def test_watch_survives_scan_errors(self, mock_print):
+        scans = iter([OSError("inbox gone"), []])
+
+        def run_once():
+            result = next(scans)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        with patch.object(self.watcher, "run_once", run_once), patch(
+            "time.sleep", side_effect=[None, KeyboardInterrupt]
+        ):
+            with self.assertRaises(KeyboardInterrupt):
+                self.watcher.watch()
+        self.assertIn("inbox gone", mock_print.call_args_list[0].args[0])
+
+    def test_unchanged_inbox_is_not_listed(self):
+        self.drop("export.csv")
+        self.drop("fresh.csv", age=0)
+        self.watcher.scan()
+        mtime = time.time() - 60
+        os.utime(self.inbox, (mtime, mtime))
+        self.watcher.scan()
+        with patch.object(watch_folder.os, "scandir", side_effect=AssertionError):
+            self.assertEqual(self.watcher.scan(), ["export.csv"])
+            self.assertEqual(
+                self.watcher.scan(now=time.time() + 10), ["export.csv", "fresh.csv"]
+            )
+
+    def test_unique_path(self):
+        self.drop("export.csv")
+        self.drop("export-1.csv")
+        self.assertEqual(
+            watch_folder.unique_path(self.inbox, "export.csv"),
+            os.path.join(self.inbox, "export-2.csv"),
+        )
+        self.assertEqual(
+            watch_folder.unique_path(self.inbox, "new.csv"),
+            os.path.join(self.inbox, "new.csv"),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
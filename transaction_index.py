@@ -0,0 +1,63 @@
+"""Index of already converted transactions for incremental conversion
+
+The index maps a fingerprint of every converted transaction to the number of
+times it occurred in one export. Identical transactions within one export (e.g.
+two equal savings plan debits on the same day) are therefore told apart from
+transactions that show up again in an overlapping export.
+"""
+
+import hashlib
+import json
+import os
+from collections import Counter
+
+# Columns of the MLP export that identify a transaction
+FINGERPRINT_COLUMNS = ("Buchungstag", "Betrag", "Verwendungszweck", "Kundenreferenz")
+STATE_VERSION = 1
+
+
+def fingerprint(row):
+    """Return a short hash of the identifying columns of an input row
+
+    The row is a tuple that starts with the values of FINGERPRINT_COLUMNS.
+    """
+    key = "\x1f".join(value or "" for value in row[: len(FINGERPRINT_COLUMNS)])
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=12).hexdigest()
+
+
+class TransactionIndex:
+    def __init__(self, known=None):
+        self.known = Counter(known or {})
+        self.seen = Counter()
+
+    @classmethod
+    def load(cls, state_file):
+        """Load the index from a state file, an empty index if there is none"""
+        if not os.path.exists(state_file):
+            return cls()
+        with open(state_file, encoding="utf-8") as file:
+            state = json.load(file)
+        if state.get("version") != STATE_VERSION:
+            raise ValueError(f'Unsupported state file version in "{state_file}"')
+        return cls(state["fingerprints"])
+
+    def save(self, state_file):
+        """Merge the rows seen in this run into the index and write it"""
+        for key, count in self.seen.items():
+            if count > self.known[key]:
+                self.known[key] = count
+        self.seen.clear()
+        temp_file = state_file + ".tmp"
+        with open(temp_file, "w", encoding="utf-8") as file:
+            json.dump(
+                {"version": STATE_VERSION, "fingerprints": self.known},
+                file,
+                separators=(",", ":"),
+            )
+        os.replace(temp_file, state_file)
+
+    def is_new(self, row):
+        """Check if an input row was not converted before and remember it"""
+        key = fingerprint(row)
+        self.seen[key] += 1
+        return self.seen[key] > self.known[key]
@@ -0,0 +1,211 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+
+"""Watch folder converter for MLP exports
+
+Input:  MLP exports dropped into an inbox directory.
+Output: The converted CSV files in an output directory. Each export is moved to
+        a done directory, or a failed directory if it cannot be converted.
+
+The inbox is scanned every few seconds. A scan only lists the inbox if the
+directory changed, otherwise it just checks the exports that are not ready yet,
+so a crowded inbox does not slow it down. An export is ready once its
+modification time and size did not change between two scans and it is older
+than the settle time, i.e. it is fully written. Files are never read for that.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import time
+
+from batch_converter import convert_one, is_export, output_file_for, print_summary
+from mlp_to_portfolio_performance_converter import print_message
+
+# Seconds between two scans
+POLL_INTERVAL = 2
+# Seconds an export has to be unchanged before it is converted
+SETTLE_TIME = 5
+# Seconds after which a directory modification time is trusted, as file systems
+# store it with a limited resolution (two seconds on FAT)
+MTIME_SLACK = 2
+
+
+def signature(stat_result):
+    """Modification time and size of a file, which change while it is written"""
+    return stat_result.st_mtime_ns, stat_result.st_size
+
+
+def unique_path(directory, name):
+    """Path of a file name in a directory that does not overwrite a file"""
+    stem, extension = os.path.splitext(name)
+    path = os.path.join(directory, name)
+    counter = 1
+    while os.path.exists(path):
+        path = os.path.join(directory, f"{stem}-{counter}{extension}")
+        counter += 1
+    return path
+
+
+class FolderWatcher:
+    """Convert the exports arriving in an inbox directory
+
+    `seen` maps the exports of the last scan to their signature, `handled` the
+    exports that were converted but could not be moved out of the inbox. They
+    are converted again only once they change.
+    """
+
+    def __init__(
+        self,
+        inbox,
+        output_dir=None,
+        done_dir=None,
+        failed_dir=None,
+        settle_time=SETTLE_TIME,
+    ):
+        self.inbox = inbox
+        self.output_dir = output_dir or os.path.join(inbox, "converted")
+        self.done_dir = done_dir or os.path.join(inbox, "done")
+        self.failed_dir = failed_dir or os.path.join(inbox, "failed")
+        self.settle_time = settle_time
+        self.seen = {}
+        self.handled = {}
+        self.inbox_mtime = None
+        for directory in (self.output_dir, self.done_dir, self.failed_dir):
+            os.makedirs(directory, exist_ok=True)
+
+    def scan(self, now=None):
+        """Return the names of the exports that are ready, in sorted order"""
+        now = time.time() if now is None else now
+        inbox_mtime = os.stat(self.inbox).st_mtime_ns
+        if inbox_mtime == self.inbox_mtime and now - inbox_mtime / 1e9 > MTIME_SLACK:
+            current = dict(self.handled)
+            current.update(self._stat_waiting())
+        else:
+            current = {
+                entry.name: signature(entry.stat())
+                for entry in os.scandir(self.inbox)
+                if is_export(entry.name) and entry.is_file()
+            }
+            self.inbox_mtime = inbox_mtime
+        settled_ns = (now - self.settle_time) * 1e9
+        ready = [
+            name
+            for name, file_signature in current.items()
+            if self.seen.get(name) == file_signature
+            and file_signature[0] <= settled_ns
+            and self.handled.get(name) != file_signature
+        ]
+        self.seen = current
+        self.handled = {
+            name: file_signature
+            for name, file_signature in self.handled.items()
+            if name in current
+        }
+        return sorted(ready)
+
+    def _stat_waiting(self):
+        """Signatures of the exports that are not handled yet, without listing"""
+        for name, file_signature in self.seen.items():
+            if self.handled.get(name) == file_signature:
+                continue
+            try:
+                yield name, signature(os.stat(os.path.join(self.inbox, name)))
+            except FileNotFoundError:
+                pass
+
+    def convert(self, name):
+        """Convert an export of the inbox and move it out of the inbox
+
+        Returns a FileResult. Any error of the conversion makes it a failure,
+        which moves the export to the failed directory and leaves no output
+        file.
+        """
+        input_file = os.path.join(self.inbox, name)
+        output_file = unique_path(self.output_dir, output_file_for(name))
+        result = convert_one(input_file, output_file)
+        if result.status == "failure":
+            if os.path.exists(output_file):
+                os.remove(output_file)
+            target_dir = self.failed_dir
+        else:
+            target_dir = self.done_dir
+        try:
+            shutil.move(input_file, unique_path(target_dir, name))
+        except OSError as error:
+            print_message(f'Error: Could not move "{input_file}": {error}', 31)
+            self.handled[name] = self.seen[name]
+        else:
+            del self.seen[name]
+        return result
+
+    def run_once(self, now=None):
+        """Scan the inbox once and convert the exports that are ready
+
+        Returns one FileResult per converted export.
+        """
+        return [self.convert(name) for name in self.scan(now)]
+
+    def watch(self, interval=POLL_INTERVAL):
+        """Scan the inbox every `interval` seconds until interrupted"""
+        while True:
+            try:
+                results = self.run_once()
+            except OSError as error:
+                print_message(f'Error: Could not scan "{self.inbox}": {error}', 31)
+            else:
+                if results:
+                    print_summary(results)
+            time.sleep(interval)
+
+
+def main():
+    """Main function"""
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("inbox", help="Directory the MLP exports arrive in")
+    arg_parser.add_argument(
+        "-o", "--outdir", help="Directory of the converted files (default: converted)"
+    )
+    arg_parser.add_argument(
+        "--done", help="Directory converted exports are moved to (default: done)"
+    )
+    arg_parser.add_argument(
+        "--failed",
+        help="Directory exports that cannot be converted are moved to "
+        "(default: failed)",
+    )
+    arg_parser.add_argument(
+        "--interval",
+        type=float,
+        default=POLL_INTERVAL,
+        help="Seconds between two scans of the inbox (default: %(default)s)",
+    )
+    arg_parser.add_argument(
+        "--settle-time",
+        type=float,
+        default=SETTLE_TIME,
+        help="Seconds an export has to be unchanged before it is converted "
+        "(default: %(default)s)",
+    )
+    command_args = arg_parser.parse_args()
+
+    if not os.path.isdir(command_args.inbox):
+        print_message(f'Error: Inbox "{command_args.inbox}" is not a directory', 31)
+        sys.exit(1)
+    watcher = FolderWatcher(
+        command_args.inbox,
+        command_args.outdir,
+        command_args.done,
+        command_args.failed,
+        command_args.settle_time,
+    )
+    print_message(f"Info: Watching {command_args.inbox}", 0)
+    try:
+        watcher.watch(command_args.interval)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()